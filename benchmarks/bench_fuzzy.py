@@ -0,0 +1,77 @@
+"""
+Benchmark of finding the closest match among thousands of names.
+
+Compares comparing a misspelt name with every candidate using the full edit
+distance, comparing with every candidate using the distance with early
+cutoff, and asking a BK-tree built over the candidates.
+
+Run from the project root with: python -m benchmarks.bench_fuzzy
+"""
+
+import random
+import string
+import time
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from mrfreeze.lib.fuzzy import BKTree
+from mrfreeze.lib.fuzzy import closest
+from mrfreeze.lib.fuzzy import edit_distance
+
+NAMES = 5000
+QUERIES = 200
+
+Match = Optional[Tuple[str, int]]
+
+
+def make_names(rng: random.Random) -> List[str]:
+    """Create names that look a bit like ink names."""
+    words = [ "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(400) ]
+    return list({ " ".join(rng.sample(words, rng.randint(2, 3))) for _ in range(NAMES) })
+
+
+def misspell(rng: random.Random, name: str) -> str:
+    """Change a random character of a name."""
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def brute_force(names: List[str], query: str) -> Match:
+    """Compare with every name, the way default.get_closest_match used to."""
+    best = min(names, key=lambda name: edit_distance(name, query))
+    return best, edit_distance(best, query)
+
+
+def timed(func: Callable[[str], Match], queries: List[str]) -> Tuple[float, List[Match]]:
+    """Return the average seconds per query and the results."""
+    start = time.perf_counter()
+    results = [ func(query) for query in queries ]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main() -> None:
+    """Run all three over the same misspelt names."""
+    rng = random.Random(0)
+    names = make_names(rng)
+    queries = [ misspell(rng, rng.choice(names)) for _ in range(QUERIES) ]
+
+    start = time.perf_counter()
+    tree = BKTree(names)
+    print(f"built a BK-tree of {len(tree)} names in {time.perf_counter() - start:.2f} s")
+
+    full, expected = timed(lambda query: brute_force(names, query), queries)
+    cutoff, by_cutoff = timed(lambda query: closest(names, query), queries)
+    indexed, by_tree = timed(lambda query: tree.closest(query, max_distance=2), queries)
+
+    # Ties may be broken differently, but the distances must be the same.
+    assert [ match[1] for match in by_cutoff ] == [ match[1] for match in expected ]
+    assert [ match and match[1] for match in by_tree ] == [ match[1] for match in expected ]
+
+    for label, seconds in (("full scan", full), ("cutoff scan", cutoff), ("BK-tree", indexed)):
+        print(f"{label:>12}: {seconds * 1000:8.2f} ms per query ({full / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
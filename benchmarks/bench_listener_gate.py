@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of the per-message listener gate.
+
+Every message goes through MrFreeze.listener_block_check before a listener does
+anything else. This compares checking freeze and a feature mute with one
+lookup each through the settings tables against the single lookup in the
+muted features bitmask.
+
+Run from the project root with: python -m benchmarks.bench_listener_gate
+"""
+
+import logging
+import tempfile
+import timeit
+from typing import Any
+from typing import NamedTuple
+
+from mrfreeze.bot import MrFreeze
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.database.settings import Settings
+
+SERVERS = 1000
+CALLS = 200_000
+
+
+class Server(NamedTuple):
+    """Stand-in for a discord Guild."""
+
+    id: int
+    name: str
+
+
+class Message(NamedTuple):
+    """Stand-in for a discord Message."""
+
+    guild: Server
+
+
+class Bot(NamedTuple):
+    """Stand-in for the bot, holding only the settings."""
+
+    settings: Settings
+
+
+def table_gate(bot: Any, message: Message) -> bool:
+    """The old gate: freeze mute and inkcyclopedia mute looked up separately."""
+    server = message.guild
+    if server and bot.settings.freeze_mutes.get(server):
+        return True
+    return bool(server and bot.settings.inkcyclopedia.get(server))
+
+
+def main() -> None:
+    """Fill a settings database, then time both gates on messages from all servers."""
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(f"{tmp}/settings.db")
+        servers = [ Server(i, f"server {i}") for i in range(SERVERS) ]
+        for server in servers[::3]:
+            settings.toggle_inkcyclopedia_mute(server)
+        for server in servers[::7]:
+            settings.toggle_freeze_mute(server)
+
+        bot = Bot(settings)
+        messages = [ Message(servers[i % SERVERS]) for i in range(CALLS) ]
+        feature = MutedFeature.INKCYCLOPEDIA
+
+        def run_tables() -> None:
+            for message in messages:
+                table_gate(bot, message)
+
+        def run_bitmask() -> None:
+            for message in messages:
+                MrFreeze.listener_block_check(bot, message, feature)
+
+        for name, func in (("tables", run_tables), ("bitmask", run_bitmask)):
+            best = min(timeit.repeat(func, number=1, repeat=5))
+            print(f"{name:>8}: {best / CALLS * 1e9:7.1f} ns per message")
+
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark of the shared message pre-processing.
+
+Compares handling a stream of gateway messages the old way, where the bot
+and every on_message listener built their own context and did their own
+checks, against MrFreeze.on_message, which builds the context and the
+MessageFacts once and only calls the listeners whose filters match.
+
+Run from the project root with: python -m benchmarks.bench_message_pipeline
+"""
+
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any
+from typing import List
+
+from discord.ext import commands
+
+from mrfreeze.bot import MrFreeze
+from mrfreeze.cogs.command_log import CommandLogger
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.cogs.temp_converter import TemperatureConverter
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import MutedFeature
+
+MESSAGES = 50_000
+
+# Roughly what a busy chat looks like, most messages are neither commands nor temperatures.
+CORPUS = [
+    "has anyone tried the new lamy safari colours?",
+    "lol",
+    "that nib looks amazing, is it a fine or an extra fine?",
+    "I just got my first pilot custom 74 :)",
+    "it's about 30 c here today, way too hot",
+    "the ink dried in like 10 seconds on that paper",
+    "good morning everyone",
+    "!bench",
+    "does anyone know where to get sailor inks in europe?",
+    "I have 15 pens inked right now, send help",
+    "{} is what my code looks like",
+    "what's the difference between a converter and a cartridge?",
+]
+
+
+async def noop(ctx: Any) -> None:
+    """Do nothing, this is the only command used in the benchmark."""
+    pass
+
+
+async def old_pipeline(bot: MrFreeze, cogs: List[Any], message: Any) -> None:
+    """Process a message like the bot and the three on_message listeners used to."""
+    logger, temperature, ink = cogs
+
+    # Bot.process_commands
+    if not message.author.bot:
+        ctx = await bot.get_context(message)
+        await bot.invoke(ctx)
+
+    # CommandLogger.on_message
+    if not message.author.bot:
+        ctx = await bot.get_context(message)
+        ctx.command is not None
+
+    # TemperatureConverter.on_message
+    if not message.author.bot and not bot.listener_block_check(message, MutedFeature.TEMPCONVERTER):
+        ctx = await bot.get_context(message)
+        if temperature.parse_request(ctx):
+            await message.channel.send("")
+
+    # Inkcyclopedia.on_message
+    if not bot.listener_block_check(message, MutedFeature.INKCYCLOPEDIA):
+        ink.bracketmatch.findall(message.content)
+
+
+async def run(bot: MrFreeze, cogs: List[Any], messages: List[Any]) -> None:
+    """Time both ways of processing the messages."""
+    # Run the listeners right away rather than as tasks, so that all their work is timed.
+    scheduled: List[Any] = list()
+    bot._schedule_event = lambda callback, event_name, facts: scheduled.append(callback(facts))
+
+    start = time.perf_counter()
+    for message in messages:
+        await old_pipeline(bot, cogs, message)
+    old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        await bot.on_message(message)
+        for listener in scheduled:
+            await listener
+        scheduled.clear()
+    new = time.perf_counter() - start
+
+    for name, seconds in (("separate", old), ("shared", new)):
+        print(f"{name:>9}: {len(messages) / seconds:9.0f} messages/s ({seconds / len(messages) * 1e6:.1f} us each)")
+
+
+async def send(*args: Any, **kwargs: Any) -> None:
+    """Pretend to send a message."""
+    pass
+
+
+def make_message(content: str, guild: Any) -> Any:
+    """Create a stand-in for a discord Message."""
+    author = SimpleNamespace(id=1, bot=False, name="user", discriminator="0001", mention="@user")
+    channel = SimpleNamespace(name="general", send=send)
+    return SimpleNamespace(content=content, author=author, guild=guild, channel=channel, _state=None)
+
+
+def main() -> None:
+    """Set up a bot with the message listening cogs in a temporary directory and run the benchmark."""
+    logging.disable(logging.CRITICAL)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            bot = MrFreeze(command_prefix=["!"], loop=loop)
+            bot._connection.user = SimpleNamespace(id=0)
+            bot.add_command(commands.Command(noop, name="bench"))
+
+            cogs = [ CommandLogger(bot), TemperatureConverter(bot), Inkcyclopedia(bot) ]
+            for cog in cogs:
+                bot.add_cog(cog)
+
+            guild = SimpleNamespace(id=1, name="server")
+
+            random.seed(0)
+            messages = [ make_message(random.choice(CORPUS), guild) for _ in range(MESSAGES) ]
+            loop.run_until_complete(run(bot, cogs, messages))
+            loop.close()
+        finally:
+            connections.close_all()
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
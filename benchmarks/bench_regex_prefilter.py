@@ -0,0 +1,112 @@
+"""
+Benchmark of the temperature and ink request scanning.
+
+Runs the temperature converter's statement parsing and the Inkcyclopedia's
+{ink request} matching over a chat corpus, once the way it used to be done
+(regexes looked up and run on every message) and once with the precompiled
+regexes behind the cheap digit and curly bracket pre-filters.
+
+Run from the project root with: python -m benchmarks.bench_regex_prefilter
+"""
+
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any
+from typing import Callable
+from typing import List
+
+from mrfreeze.cogs import temp_converter
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.cogs.temp_converter import TemperatureConverter
+
+MESSAGES = 200_000
+
+# Chat from a fountain pen server. Few messages have digits, even fewer are temperatures or ink requests.
+CORPUS = [
+    "good morning everyone!",
+    "morning :)",
+    "lol",
+    "that's a gorgeous pen, where did you get it?",
+    "I think it was on sale at the local stationery shop",
+    "has anyone tried the new lamy safari colours?",
+    "the nib on mine is super scratchy, might have to smooth it",
+    "micromesh works wonders",
+    "does anyone know a good shimmer ink that doesn't clog?",
+    "{diamine shimmertastic blue lightning} is pretty nice",
+    "I'm looking at {sailor yama-dori} vs {pilot iroshizuku kon-peki}",
+    "it's 35 c here today and my pens are leaking everywhere",
+    "we had -20 c last night, ink froze in the car",
+    "what is 451 f in celsius?",
+    "I have 15 pens inked right now, send help",
+    "only 3 for me, trying to keep it under control",
+    "the converter on the 74 is tiny",
+    "nice handwriting!",
+    "thanks! been practicing for a while",
+    "the paper feathers like crazy with that ink though",
+    "try tomoe river, nothing feathers on that",
+    "tomoe river is great but it takes forever to dry",
+    "ha, true",
+    "anyone going to the pen show next month?",
+    "I wish, it's way too far away for me",
+    "just ordered a twsbi eco, first piston filler!",
+    "welcome to the rabbit hole",
+    "I paid $30 for it, worth every penny",
+    "my cat knocked over an ink bottle onto the carpet",
+    "oh no, which ink?",
+    "baystate blue :(",
+    "rip carpet",
+    "lmao",
+    "is it normal for a new pen to skip a bit?",
+    "give it a flush with some water and a drop of dish soap",
+    "the grind on this nib is amazing",
+    "what size is it?",
+    "medium, but it writes more like a broad",
+    "japanese fine is so much thinner than western fine",
+    "yeah my pilot F is like a european EF",
+]
+
+
+def before(inks: Inkcyclopedia, ctx: Any) -> None:
+    """Scan a message the way the listeners used to."""
+    text = ctx.message.content
+    statement = re.search(temp_converter.statement_regex, text, re.IGNORECASE)
+    if statement:
+        re.search(temp_converter.find_force_convert, text, re.IGNORECASE)
+    inks.bracketmatch.findall(text)
+
+
+def after(converter: TemperatureConverter, inks: Inkcyclopedia, ctx: Any) -> None:
+    """Scan a message with the pre-filters."""
+    converter.parse_request(ctx)
+    inks.find_requests(ctx.message.content)
+
+
+def rate(func: Callable[[Any], None], messages: List[Any]) -> float:
+    """Return the number of messages per second func gets through, best of three."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main() -> None:
+    """Run both versions over the corpus."""
+    converter = TemperatureConverter(None)
+    inks = Inkcyclopedia(None)
+
+    random.seed(0)
+    messages = [ SimpleNamespace(message=SimpleNamespace(content=random.choice(CORPUS))) for _ in range(MESSAGES) ]
+
+    old = rate(lambda ctx: before(inks, ctx), messages)
+    new = rate(lambda ctx: after(converter, inks, ctx), messages)
+    print(f" before: {old:10.0f} messages/s")
+    print(f"  after: {new:10.0f} messages/s ({new / old:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of resolving !region arguments.
+
+Compares the way set_region and region_cmd used to find the region, looping
+over every alias of every region and every spelling of Antarctica, against
+the precompiled RegionResolver, over a large synthetic corpus of inputs.
+Besides the speed, it reports how many inputs each resolves to the region
+the input was made from. The old way never handled typos, and short aliases
+matched inside other words, e.g. "na" in "argentina".
+
+Run from the project root with: python -m benchmarks.bench_region_resolver
+"""
+
+import random
+import time
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from mrfreeze.lib.region import antarctica_spellings
+from mrfreeze.lib.region import regional_aliases
+from mrfreeze.lib.region import resolver
+
+INPUTS = 100_000
+
+FILLER = [ "i", "live", "in", "the", "from", "near", "south", "of", "please", "thanks", "lol", "currently" ]
+
+
+def old_resolve(text: str) -> Optional[str]:
+    """Find the region the way region_cmd and set_region used to."""
+    args = tuple(text.split())
+    for variant in antarctica_spellings:
+        if variant in args:
+            return "Antarctica"
+
+    all_args = " ".join(args)
+    for region in regional_aliases:
+        for alias in regional_aliases[region]:
+            if alias in all_args:
+                return region
+    return None
+
+
+def new_resolve(text: str) -> Optional[str]:
+    """Find the region with the resolver."""
+    match = resolver.resolve(text)
+    return None if match is None else match.region
+
+
+def make_input(rng: random.Random) -> Tuple[str, Optional[str]]:
+    """Create something a user might type after !region, and the region they meant."""
+    aliases = [ (alias, region) for region, names in regional_aliases.items() for alias in names ]
+    kind = rng.random()
+    if kind < 0.7:
+        alias, region = rng.choice(aliases)
+    elif kind < 0.8:
+        alias, region = rng.choice(antarctica_spellings), "Antarctica"
+    elif kind < 0.95:
+        # A typo in an alias long enough for typos to be recognisable: a missing letter.
+        alias, region = rng.choice([ (alias, region) for alias, region in aliases if len(alias) >= 6 ])
+        i = rng.randrange(len(alias))
+        alias = alias[:i] + alias[i + 1:]
+    else:
+        alias, region = "narnia", None
+
+    words = rng.sample(FILLER, rng.randint(0, 4)) + [ alias ]
+    rng.shuffle(words)
+    return " ".join(words), region
+
+
+def rate(func: Callable[[str], Optional[str]], inputs: List[str]) -> float:
+    """Return the number of inputs per second func gets through."""
+    start = time.perf_counter()
+    for text in inputs:
+        func(text)
+    return len(inputs) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Run both over the corpus, and count how many inputs they resolve correctly."""
+    rng = random.Random(0)
+    corpus = [ make_input(rng) for _ in range(INPUTS) ]
+    inputs = [ text for text, _ in corpus ]
+
+    for label, func in (("before", old_resolve), ("after", new_resolve)):
+        speed = rate(func, inputs)
+        correct = sum(1 for text, region in corpus if func(text) == region)
+        print(f"{label:>7}: {speed:10.0f} inputs/s, {correct / len(corpus):.1%} resolved correctly")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,14 +25,20 @@ from discord import Message
 from discord import Role
 from discord import TextChannel
 from discord.ext import commands
+from discord.ext.commands import Cog
 from discord.ext.commands import Context
 
 # Importing MrFreeze submodules
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import MutedFeature
 from mrfreeze.database.settings import Settings
 from mrfreeze.lib import colors
 from mrfreeze.lib import dbfunctions
 from mrfreeze.lib import greeting
 from mrfreeze.lib import time
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import MessagePipeline
 from mrfreeze.lib.checks import MuteCheckFailure
 
 
@@ -62,6 +68,9 @@ class MrFreeze(commands.Bot):
         # Dict in which to save all the background tasks.
         self.bg_tasks: Dict[str, Awaitable] = dict()
 
+        # Listeners subscribed to the shared message pre-processing, see on_message.
+        self.message_pipeline = MessagePipeline()
+
         # Setting up imported functions so they can be accessed by all cogs
         self.logger.debug("Linking imported functions as own methods")
         self.extract_time = time.extract_time
@@ -79,8 +88,10 @@ class MrFreeze(commands.Bot):
         self.servers_prefix = "config/servers"
         self.path_setup(self.servers_prefix, "Servers prefix")
 
+        # Changed settings are written to the database in batches, see close for the final flush,
+        # and the settings of each server are loaded on the reader threads in on_ready, or once first needed.
         self.logger.debug("Instantiating Settings module")
-        self.settings = Settings()
+        self.settings = Settings(write_behind=True, lazy=True)
 
         # Add the mute check
         self.logger.debug("Adding self mute check")
@@ -97,13 +108,54 @@ class MrFreeze(commands.Bot):
 
         return True
 
-    def listener_block_check(self, message: Union[Message, Member, TextChannel]) -> bool:
-        """Return True if non-private message and freeze is muted on this server."""
+    def listener_block_check(
+            self,
+            message: Union[Message, Member, TextChannel],
+            feature: int = MutedFeature.FREEZE) -> bool:
+        """
+        Return True if non-private message and freeze is muted on this server.
+
+        Listeners for features which can be muted separately pass their MutedFeature,
+        and are then blocked if either freeze or that feature is muted.
+        """
         server = message.guild
-        return bool(server and self.settings.is_freeze_muted(server))
+        return bool(server and self.settings.muted_features(server) & (MutedFeature.FREEZE | feature))
+
+    async def on_message(self, message: Message) -> None:
+        """
+        Build the context and MessageFacts of a message once, then hand them out.
+
+        The facts go to every message listener whose filters they pass, and the
+        context is used for processing commands, just like process_commands does.
+        """
+        ctx = None if message.author.bot else await self.get_context(message)
+        muted = self.settings.muted_features(message.guild) if message.guild else 0
+        facts = MessageFacts(message, ctx, muted)
+
+        # Listeners run as separate tasks, with errors handled like those of regular events.
+        for callback in self.message_pipeline.matching(facts):
+            self._schedule_event(callback, "message_listener", facts)
+
+        if ctx is not None:
+            await self.invoke(ctx)
+
+    def add_cog(self, cog: Cog) -> None:
+        """Add a cog, subscribing its message listeners to the message pre-processing."""
+        super().add_cog(cog)
+        self.message_pipeline.subscribe_cog(cog)
+
+    def remove_cog(self, name: str) -> None:
+        """Remove a cog along with its message listeners."""
+        cog = self.get_cog(name)
+        super().remove_cog(name)
+        if cog is not None:
+            self.message_pipeline.unsubscribe_cog(cog)
 
     async def on_ready(self) -> None:
         """Set the bot up, print some greeting messages and stuff."""
+        # Lazily loaded settings would otherwise be loaded one server at a time on first use.
+        await self.settings.preload(self.guilds)
+
         # Greeting (printed to console)
         greetmsg = greeting.bot_greeting(self)
         for line in greetmsg:
@@ -122,6 +174,37 @@ class MrFreeze(commands.Bot):
         # Signal to the terminal that the bot is ready.
         self.logger.info(f"{colors.WHITE_B}READY WHEN YOU ARE CAP'N!{colors.RESET}")
 
+    async def on_guild_join(self, guild: Guild) -> None:
+        """Load the settings of a server we were just added to."""
+        await self.settings.preload([ guild ])
+
+    async def close(self) -> None:
+        """Log out from discord, close the cogs, then finish queued database work and close all connections."""
+        await super().close()
+        await self.close_cogs()
+        await self.settings.close()
+        self.logger.info("Closing database connections")
+        await self.loop.run_in_executor(None, executor.shutdown)
+        connections.close_all()
+
+    async def close_cogs(self) -> None:
+        """
+        Close every cog which has a close() coroutine, one at a time.
+
+        Cogs with work queued for the database close() it rather than
+        leaving it to cog_unload, which is only called when they're
+        unloaded and can't wait for anything.
+        """
+        for name, cog in list(self.cogs.items()):
+            close = getattr(cog, "close", None)
+            if close is None:
+                continue
+
+            try:
+                await close()
+            except Exception as e:
+                self.logger.error(f"Failed to close {name}: {e!r}")
+
     def path_setup(self, path: str, trivial_name: str) -> None:
         """Create various directories which the bot needs."""
         if os.path.isdir(path):
@@ -29,7 +29,7 @@ from mrfreeze.lib.banish import templates as banish_templates
 from mrfreeze.lib.banish import time_settings
 from mrfreeze.lib.banish import unauthorized_banish
 from mrfreeze.lib.banish.roulette import roulette
-from mrfreeze.lib.banish.unbanish_loop import unbanish_loop
+from mrfreeze.lib.banish.unbanish_loop import UnbanishScheduler
 
 mute_templates: banish_templates.TemplateEngine
 template_engine = banish_templates.TemplateEngine()
@@ -65,20 +65,36 @@ class BanishAndRegion(Cog):
 
         self.coginfo = CogInfo(self)
 
-        mute_db.create_table(self.bot)
+        mute_db.create_table(self.bot, self.logger)
+        mute_db.load_index(self.bot, self.logger)
+        self.unbanish_scheduler = UnbanishScheduler(self.coginfo)
+
+        # When the cog is reloaded on_ready has already fired, so the scheduler is started here.
+        if self.bot.is_ready():
+            self.bot.add_bg_task(self.unbanish_scheduler.run(), "unbanish")
+
+    def cog_unload(self) -> None:
+        """Stop the unbanish scheduler, a reloaded cog starts a new one."""
+        scheduler_task = self.bot.bg_tasks.get("unbanish")
+        if scheduler_task is not None:
+            scheduler_task.cancel()
+
+        self.unbanish_scheduler.stop()
 
     @Cog.listener()
     async def on_ready(self) -> None:
         """
         Once ready, do some setup for all servers.
 
-        This is mostly stuff pertaining to banishes and regions, such as setting up the periodic
-        unbanish and indexing all the servers' regional roles.
+        This is mostly stuff pertaining to banishes and regions, such as starting the unbanish
+        scheduler and indexing all the servers' regional roles.
         """
-        for server in self.bot.guilds:
-            # Add unbanish loop to bot
-            self.bot.add_bg_task(unbanish_loop(server, self.coginfo), f'unbanish@{server.id}')
+        # on_ready also fires on reconnects, only start the scheduler once.
+        scheduler_task = self.bot.bg_tasks.get("unbanish")
+        if scheduler_task is None or scheduler_task.done():
+            self.bot.add_bg_task(self.unbanish_scheduler.run(), "unbanish")
 
+        for server in self.bot.guilds:
             # Construct region dict
             self.regions[server.id] = dict()
             for region_name in region.regional_aliases.keys():
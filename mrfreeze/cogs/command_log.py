@@ -1,11 +1,12 @@
 """Cog for logging all issued commands."""
 import logging
 
-from discord import Message
 from discord.ext.commands import Cog
 
 from mrfreeze.bot import MrFreeze
 from mrfreeze.lib import colors
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import message_listener
 
 
 def setup(bot: MrFreeze) -> None:
@@ -21,14 +22,11 @@ class CommandLogger(Cog):
         self.bot = bot
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    @Cog.listener()
-    async def on_message(self, message: Message) -> None:
-        """Check if a message is a command, and log if it is."""
-        if message.author.bot:
-            return
-
-        ctx = await self.bot.get_context(message)
-        if ctx.command is not None:
+    @message_listener(commands=True)
+    async def on_message(self, facts: MessageFacts) -> None:
+        """Log every command."""
+        message, ctx = facts.message, facts.ctx
+        if ctx is not None:
             author = message.author
             name = f"{colors.YELLOW}{author.name}#{author.discriminator}"
             command = f"{colors.CYAN_B}{ctx.prefix}{ctx.invoked_with}"
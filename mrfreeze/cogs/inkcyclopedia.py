@@ -1,20 +1,34 @@
 """Cog for handling ink lookups via thisisverytricky's ink API."""
+import asyncio
 import logging
+import os
 import re
+from typing import Dict
 from typing import List
 from typing import Optional
 from typing import Pattern
-from typing import Set
+from typing import Tuple
 
 import discord
-from discord import Message
 from discord.ext.commands import Cog
+from discord.ext.commands import check
 from discord.ext.commands import Context
 from discord.ext.commands import command
 
 from mrfreeze.bot import MrFreeze
-
-import requests
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.lib import checks
+from mrfreeze.lib.inkcyclopedia.batcher import InkBatcher
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitOpenError
+from mrfreeze.lib.inkcyclopedia.cache import InkCache
+from mrfreeze.lib.inkcyclopedia.catalogue import InkCatalogue
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+from mrfreeze.lib.inkcyclopedia.ink import normalise
+from mrfreeze.lib.inkcyclopedia.persistent_cache import PersistentInkCache
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import message_listener
 
 
 def setup(bot: MrFreeze) -> None:
@@ -22,63 +36,174 @@ def setup(bot: MrFreeze) -> None:
     bot.add_cog(Inkcyclopedia(bot))
 
 
-class Ink:
-    """A class used to store information pertaining to an ink entry."""
-
-    id:         Optional[str]
-    name:       Optional[str]
-    url:        Optional[str]
-    submitter:  Optional[str]
-    alternates: List[str]
-    review:     Optional[str]
-
-    def __init__(self) -> None:
-        self.id = None
-        self.name = None
-        self.url = None
-        self.submitter = None
-        self.alternates = list()
-        self.review = None
-
-
 class Inkcyclopedia(Cog):
     """Type an ink inside {curly brackets} and I'll tell you what it looks like."""
 
     def __init__(self, bot: MrFreeze) -> None:
         self.bot: MrFreeze = bot
-        self.inkydb: Set[Ink] = set()
         self.url: str = "https://system-inks-api.us-e2.cloudhub.io/api/inks"
         self.bracketmatch: Pattern = re.compile(r"[{]([\w\-\s]+)[}]")
+        self.client = InkClient(self.url)
+        self.cache = InkCache()
+        self.batcher = InkBatcher(self.client)
 
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.catalogue = InkCatalogue(self.logger)
+        self.catalogue_file = "config/inks.json"
+        self.sync_interval = 24 * 60 * 60
+        self.inkydb = PersistentInkCache(self.logger)
+        self.refresh_interval = 60
 
-    async def search_inks(self, inks: List[str]) -> List[Ink]:
-        """Search for the listed inks in the Inkcyclopedia, return a list of inks."""
-        try:
-            response = requests.post(f"{self.url}/search", json=inks).json()["found"]
-        except Exception:
-            return []
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        """Start keeping the local ink catalogue and stored lookups up to date."""
+        # on_ready also fires on reconnects, only start the tasks once.
+        for name, task in (("ink_catalogue", self.sync_catalogue), ("ink_refresh", self.refresh_lookups)):
+            running = self.bot.bg_tasks.get(name)
+            if running is None or running.done():
+                self.bot.add_bg_task(task(), name)
+
+    async def sync_catalogue(self) -> None:
+        """
+        Set up the local ink catalogue, then sync it with the API every sync_interval seconds.
+
+        If the catalogue is empty it's first seeded from catalogue_file, if there is one.
+        """
+        if not await executor.write(self.catalogue.create_tables):
+            return
+
+        if not self.catalogue.size and os.path.isfile(self.catalogue_file):
+            await self.catalogue.import_file(self.catalogue_file)
+
+        while True:
+            await self.catalogue.sync(self.client)
+            await asyncio.sleep(self.sync_interval)
 
-        result: List[Ink] = list()
-        for ink in response:
-            body = response[ink]
+    async def refresh_lookups(self) -> None:
+        """Refresh stale stored lookups from the API every refresh_interval seconds."""
+        if not await executor.write(self.inkydb.create_table):
+            return
+
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh_stale()
+
+    async def refresh_stale(self) -> int:
+        """Look up the most recently used stale stored lookups in the API again, return how many were refreshed."""
+        names = await self.inkydb.stale()
+        if not names:
+            return 0
 
-            if "fullName" in body and "primaryImage" in body:
-                ink = Ink()
-                ink.id = body.get("id")
-                ink.name = body.get("fullName")
-                ink.url = body.get("primaryImage")
-                ink.submitter = body.get("submittedBy")
-                ink.review = body.get("reviewLink")
+        try:
+            results = await self.batcher.lookup(names)
+        except Exception as e:
+            self.logger.warning(f"Refreshing stored ink lookups failed: {e!r}")
+            return 0
+
+        for name, ink in results.items():
+            self.cache.put(name, ink)
+            self.inkydb.save(name, ink)
+        return len(results)
+
+    def cog_unload(self) -> None:
+        """Close the cog when it's unloaded, the bot closes its cogs itself when shutting down."""
+        if self.bot is not None:
+            self.bot.add_bg_task(self.close(), "ink_close")
+
+    async def close(self) -> None:
+        """
+        Stop the background tasks, write stored lookups to disk and close the Ink API client's connections.
+
+        Failures are logged rather than raised, so one of them can't keep the others open.
+        """
+        if self.bot is not None:
+            for name in ("ink_catalogue", "ink_refresh"):
+                task = self.bot.bg_tasks.get(name)
+                if task is not None:
+                    task.cancel()
+
+        closing = [ self.inkydb.close(), self.close_client() ]
+        for result in await asyncio.gather(*closing, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.logger.error(f"Failed to close the Inkcyclopedia: {result!r}")
+
+    async def close_client(self) -> None:
+        """Cancel the lookups in progress, then close the Ink API client's connections."""
+        await self.batcher.close()
+        if self.client.session is not None:
+            await self.client.close()
+
+    def find_requests(self, content: str) -> List[str]:
+        """Find all {ink requests} in a message, without running the regex on messages without a {."""
+        if content.find("{") == -1:
+            return list()
+        return self.bracketmatch.findall(content)
 
-                alternates = body.get("alternateImages")
-                if alternates:
-                    ink.alternates = alternates
+    async def search_inks(self, inks: List[str]) -> List[Ink]:
+        """
+        Search for the listed inks in the Inkcyclopedia, return a list of inks.
+
+        Inks which have been looked up recently are answered from the cache,
+        then the local catalogue and the lookups stored on disk are searched.
+        Only inks which can't be found locally are looked up in the API.
+        Concurrent lookups share their requests to the API, see InkBatcher.
+        """
+        names = list(dict.fromkeys([ normalise(ink) for ink in inks ]))
+        found: Dict[str, Ink] = dict()
+        missing: List[str] = list()
+
+        for name in names:
+            cached, ink = self.cache.get(name)
+            if not cached:
+                cached, ink = await self.lookup_local(name)
+                if not cached:
+                    missing.append(name)
+                    continue
+
+            if ink is not None:
+                found[name] = ink
+
+        if missing:
+            try:
+                results = await self.batcher.lookup(missing)
+            except CircuitOpenError:
+                results = dict()
+            except Exception as e:
+                self.logger.warning(f"Ink lookup failed: {e!r}")
+                results = dict()
+
+            for name, ink in results.items():
+                self.cache.put(name, ink)
+                self.inkydb.save(name, ink)
+                if ink is not None:
+                    found[name] = ink
+
+        return [ found[name] for name in names if name in found ]
+
+    async def lookup_local(self, name: str) -> Tuple[bool, Optional[Ink]]:
+        """
+        Look up a normalised ink name in the local catalogue and the stored lookups, warming the cache.
+
+        Returns whether the name was found locally, and the ink if the API knew it.
+        Stale stored lookups are kept in the cache until the next refresh.
+        """
+        try:
+            ink = await self.catalogue.lookup_async(name)
+            if ink is not None:
+                self.cache.put(name, ink)
+                return True, ink
 
-                if ink.name and ink.url:
-                    result.append(ink)
+            stored = await self.inkydb.load(name)
+        except Exception as e:
+            self.logger.warning(f"Local ink lookup failed: {e!r}")
+            return False, None
 
-        return result
+        if stored is None:
+            return False, None
+
+        expires_in = self.inkydb.expires_in(stored)
+        self.cache.put(name, stored.ink, expires_in if expires_in > 0 else self.refresh_interval)
+        return True, stored.ink
 
     def get_mute_status(self, ctx: Context, is_muted: bool) -> str:
         """Check if inkcyclopedia is enabled for this server."""
@@ -131,7 +256,7 @@ class Inkcyclopedia(Cog):
 
         elif args[0].lower() == "on":
             if is_muted:
-                self.bot.settings.toggle_inkcyclopedia_mute(ctx.guild)
+                await self.bot.settings.toggle_inkcyclopedia_mute_async(ctx.guild)
                 is_muted_after = bool(self.bot.settings.is_inkcyclopedia_muted(ctx.guild))
                 msg = self.get_changed_status(ctx, is_muted, is_muted_after, False)
             else:
@@ -141,12 +266,12 @@ class Inkcyclopedia(Cog):
             if is_muted:
                 msg = self.get_changed_status(ctx, is_muted, is_muted, True)
             else:
-                self.bot.settings.toggle_inkcyclopedia_mute(ctx.guild)
+                await self.bot.settings.toggle_inkcyclopedia_mute_async(ctx.guild)
                 is_muted_after = bool(self.bot.settings.is_inkcyclopedia_muted(ctx.guild))
                 msg = self.get_changed_status(ctx, is_muted, is_muted_after, True)
 
         elif args[0].lower() == "toggle":
-            self.bot.settings.toggle_inkcyclopedia_mute(ctx.guild)
+            await self.bot.settings.toggle_inkcyclopedia_mute_async(ctx.guild)
             is_muted_after = bool(self.bot.settings.is_inkcyclopedia_muted(ctx.guild))
             msg = self.get_changed_status(ctx, is_muted, is_muted_after, not is_muted)
 
@@ -156,18 +281,54 @@ class Inkcyclopedia(Cog):
         if msg:
             await ctx.send(msg)
 
-    @Cog.listener()
-    async def on_message(self, message: Message) -> None:
+    def stats_embed(self) -> discord.Embed:
+        """Describe the state of the Ink API circuit breaker and the caches."""
+        breaker = self.client.breaker.stats()
+        cache = self.cache.stats()
+
+        def ms(seconds: Optional[float]) -> str:
+            return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+        state = breaker.state
+        if breaker.retry_in is not None:
+            state += f", probing in {breaker.retry_in:.0f} s"
+
+        embed = discord.Embed()
+        embed.title = "Inkcyclopedia"
+        embed.add_field(name="Ink API", value=state, inline=False)
+        embed.add_field(
+            name="Recent requests",
+            value=(
+                f"{breaker.requests} requests, {breaker.error_rate:.0%} failed\n"
+                f"{breaker.consecutive_failures} failures in a row\n"
+                f"{breaker.rejected} lookups skipped while open"))
+        embed.add_field(
+            name="Latency",
+            value=(
+                f"median {ms(breaker.median_latency)}\n"
+                f"95th percentile {ms(breaker.p95_latency)}\n"
+                f"timeout {ms(breaker.timeout)}"))
+        embed.add_field(
+            name="Cache",
+            value=(
+                f"{cache.size} inks, {cache.hits} hits, {cache.misses} misses\n"
+                f"{self.catalogue.size} inks in catalogue"))
+        return embed
+
+    @command(name="inkstats", aliases=[ "inkybotstats" ])
+    @check(checks.is_owner_or_mod)
+    async def inkstats_command(self, ctx: Context) -> None:
+        """Show the state of the Ink API and the Inkcyclopedia's caches."""
+        await ctx.send(embed=self.stats_embed())
+
+    @message_listener(blocked_by=MutedFeature.FREEZE | MutedFeature.INKCYCLOPEDIA, has_brace=True)
+    async def on_message(self, facts: MessageFacts) -> None:
         """Read every message, detect requests for ink pictures."""
-        if self.bot.listener_block_check(message):
-            return
-        elif message.guild and self.bot.settings.is_inkcyclopedia_muted(message.guild):
-            return
-
-        matches: List[str] = self.bracketmatch.findall(message.content)
+        message = facts.message
+        matches = self.find_requests(message.content)
 
-        # Stop the function if message was sent by a bot or contains no matches
-        if message.author.bot or not matches:
+        # Stop the function if message contains no matches
+        if not matches:
             return
 
         results: List[Ink] = await self.search_inks(matches)
@@ -29,6 +29,16 @@ from mrfreeze.lib.colors import RESET
 from mrfreeze.lib.colors import WHITE
 from mrfreeze.lib.colors import WHITE_B
 from mrfreeze.lib.colors import YELLOW_B
+from mrfreeze.lib.purge import Purge
+from mrfreeze.lib.purge import PurgeProgress
+from mrfreeze.lib.purge import parse_purge_args
+
+# Most messages looked through by !purge and !superpurge.
+PURGE_LIMIT = 1000
+SUPERPURGE_LIMIT = 10_000
+
+# Seconds between updates of a purge's progress report.
+PURGE_PROGRESS_INTERVAL = 3.0
 
 
 def setup(bot: MrFreeze) -> None:
@@ -36,6 +46,27 @@ def setup(bot: MrFreeze) -> None:
     bot.add_cog(Moderation(bot))
 
 
+def describe_purge(progress: PurgeProgress) -> str:
+    """Describe the progress of a purge."""
+    if progress.error is not None:
+        state = "Purge failed"
+    elif progress.cancelled:
+        state = "Purge cancelled"
+    elif progress.done:
+        state = "Purge complete"
+    else:
+        state = "Purging"
+
+    report = f"`{state}: deleted {progress.deleted} of {progress.scanned} messages looked through"
+    if progress.old_waiting and (progress.done or progress.cancelled):
+        report += f", {progress.old_waiting} older than two weeks left behind"
+    elif progress.old_waiting:
+        report += f", {progress.old_waiting} older than two weeks still to go"
+    if progress.failed:
+        report += f", {progress.failed} couldn't be deleted"
+    return report + f" ({progress.elapsed:.0f}s).`"
+
+
 class Moderation(Cog):
     """
     Cog for commands pertaining to moderation.
@@ -47,6 +78,9 @@ class Moderation(Cog):
         self.bot = bot
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # The purge running in each channel.
+        self.purges: Dict[int, Purge] = dict()
+
     def extract_reason(self, reason: str) -> Optional[str]:
         """Return anything mentioned after the list of mentions."""
         output = reason
@@ -85,7 +119,7 @@ class Moderation(Cog):
             return
 
         # Toggle mute
-        self.bot.settings.toggle_freeze_mute(ctx.guild)
+        await self.bot.settings.toggle_freeze_mute_async(ctx.guild)
 
         # Check if freeze is now muted and respond accordingly
         is_muted = self.bot.settings.is_freeze_muted(ctx.guild)
@@ -106,7 +140,7 @@ class Moderation(Cog):
         new_channel = "something"
 
         old_cid = self.bot.settings.get_trash_channel(ctx.guild)
-        result = self.bot.settings.set_trash_channel(channel)
+        result = await self.bot.settings.set_trash_channel_async(channel)
         new_cid = self.bot.settings.get_trash_channel(ctx.guild)
 
         try:
@@ -135,7 +169,7 @@ class Moderation(Cog):
         new_channel = "something"
 
         old_cid = self.bot.settings.get_mute_channel(ctx.guild)
-        result = self.bot.settings.set_mute_channel(channel)
+        result = await self.bot.settings.set_mute_channel_async(channel)
         new_cid = self.bot.settings.get_mute_channel(ctx.guild)
 
         try:
@@ -657,12 +691,15 @@ class Moderation(Cog):
     @check(checks.is_mod)
     async def _purge(self, ctx: Context, *args: str) -> None:
         """
-        Delete a certain number of posts all at once.
+        Delete lots of posts all at once.
 
-        This function will remove the last X number of posts in the channel.
+        This function will remove the last X number of posts in the channel,
+        or the posts of the last so and so long, see parse_purge_args.
         Features:
         - If message contains mentions, it will only delete messages by the people mentioned.
-        - Limit is 100 messages.
+        - If message contains a /regex/, it will only delete messages matching it.
+        - Limit is 1000 messages, or 10 000 for superpurge.
+        - Reports its progress as it goes, !purge stop cancels it.
         - Also deletes message which called the function.
         """
         # Delete the message containing the purge command.
@@ -671,101 +708,98 @@ class Moderation(Cog):
         except Exception:
             pass
 
-        # We'll use the first number we can find in the arguments.
-        # We'll also parse negative numbers so the error message will be better
-        delete_no = 0
-        for arg in args:
-            if arg.isdigit() or (arg[0] == "-" and arg[1:].isdigit()):
-                delete_no = int(arg)
-                break
+        running = self.purges.get(ctx.channel.id)
+        if args and args[0].lower() in ("stop", "cancel"):
+            if running is not None:
+                running.cancel()
+            else:
+                await ctx.send(f"{ctx.author.mention} There's no purge to stop here.")
+            return
+
+        if running is not None:
+            await ctx.send(f"{ctx.author.mention} One Great Purge at a time, please. Use `!purge stop` to stop it.")
+            return
+
+        try:
+            purge_filter = parse_purge_args(args, [ member.id for member in ctx.message.mentions ])
+        except re.error as e:
+            await ctx.send(f"{ctx.author.mention} I don't understand that regex: {e}")
+            return
 
-        if delete_no <= 0:
+        max_scan = SUPERPURGE_LIMIT if ctx.invoked_with == "superpurge" else PURGE_LIMIT
+        delete_no = purge_filter.limit
+
+        if delete_no is not None and delete_no <= 0:
             reply = f"{ctx.author.mention} You want me to delete {delete_no} messages? Good joke."
             await ctx.send(reply)
-            delete_no = 0
-
-        elif delete_no > 100 and ctx.invoked_with != "superpurge":
-            # For big deletes we post a warning message for a few seconds before deleting.
-            message = await ctx.send("`Purge overload detected, engaging safety protocols.`")
-            await asyncio.sleep(1)
-
-            new_message = message.content + "\n`Purge size successfully contained to 100 messages`"
-            await message.edit(content=new_message)
-            await asyncio.sleep(1)
-
-            new_message = message.content + "\n`Charging phasers...`"
-            await message.edit(content=new_message)
-            await asyncio.sleep(1)
-
-            oldmessage = f"{message.content}\n"
-
-            countdown = 3
-            while countdown > 0:
-                if countdown == 0:
-                    break
-
-                new_message = oldmessage + f"`Phaser at full charge in... {countdown}`"
-                await message.edit(content=new_message)
-                countdown -= 1
-                await asyncio.sleep(1)
-
-            delete_no = 101
-
-        def check_func(message: Message) -> bool:
-            """
-            Determine which messages to keep/delete.
-
-            False means don't delete, True means delete.
-            - Don't delete pinned messages.
-            - If there are no mentions in the original message, delete.
-            - If the author is in the list of mentions, delete it.
-            - Also delete if there are no mentions.
-            """
-            author = message.author
-            mentions = ctx.message.mentions
-            no_mentions = (len(mentions) == 0)
-
-            if message.pinned:
-                return False
-            elif no_mentions:
-                return True
-            elif author in mentions:
-                return True
-            else:
-                return False
+            return
+
+        if delete_no is None and purge_filter.after is None:
+            reply = f"{ctx.author.mention} How many messages, or how far back? Try `!purge 500` or `!purge 2h`."
+            await ctx.send(reply)
+            return
+
+        contained = ""
+        if delete_no is None or delete_no > max_scan:
+            purge_filter = purge_filter._replace(limit=max_scan)
+            if delete_no is not None:
+                contained = f"`Purge overload detected, purge size contained to {max_scan} messages.`\n"
+
+        purge = Purge(ctx.channel, purge_filter, before=ctx.message)
+        self.purges[ctx.channel.id] = purge
+        status = await ctx.send(contained + describe_purge(purge.progress()))
+        task = asyncio.ensure_future(purge.run())
 
         try:
-            await ctx.channel.purge(limit=delete_no, check=check_func)
+            # Report the progress every few seconds until the purge is done.
+            while not task.done():
+                await asyncio.wait([ task ], timeout=PURGE_PROGRESS_INTERVAL)
+                try:
+                    await status.edit(content=contained + describe_purge(purge.progress()))
+                except discord.HTTPException:
+                    pass
+
+            progress = task.result()
 
         except discord.Forbidden:
-            status  = f"{RED_B}!purge failed{CYAN} in "
-            status += f"{CYAN_B}#{ctx.channel.name}{YELLOW_B} @ {CYAN_B}{ctx.guild.name}"
-            status += f"{RED_B} (Forbidden){RESET}"
-            self.logger.error(status)
+            status_log  = f"{RED_B}!purge failed{CYAN} in "
+            status_log += f"{CYAN_B}#{ctx.channel.name}{YELLOW_B} @ {CYAN_B}{ctx.guild.name}"
+            status_log += f"{RED_B} (Forbidden){RESET}"
+            self.logger.error(status_log)
 
-            reply  = f"{ctx.author.mention} An error occured, it seems I'm lacking the"
+            reply  = f"{ctx.author.mention} An error occured, it seems I'm lacking the "
             reply += "privilegies to carry out your Great Purge."
             await ctx.send(reply)
 
         except discord.HTTPException:
-            status  = f"{RED_B}!purge failed{CYAN} in "
-            status += f"{CYAN_B}#{ctx.channel.name}{YELLOW_B} @ {CYAN_B}{ctx.guild.name}"
-            status += f"{RED_B} (HTTP Exception){RESET}"
-            self.logger.error(status)
+            status_log  = f"{RED_B}!purge failed{CYAN} in "
+            status_log += f"{CYAN_B}#{ctx.channel.name}{YELLOW_B} @ {CYAN_B}{ctx.guild.name}"
+            status_log += f"{RED_B} (HTTP Exception){RESET}"
+            self.logger.error(status_log)
 
             reply  = f"{ctx.author.mention} An error occured, it seems my HTTP sockets are "
             reply += "glitching out and thus I couldn't carry out your Great Purge."
             await ctx.send(reply)
 
         except Exception as e:
-            status  = f"{RED_B}!purge failed{CYAN} in {CYAN_B}#{ctx.channel.name}"
-            status += f"{YELLOW_B} @ {CYAN_B}{ctx.guild.name}{RED_B}\n({e}){RESET}"
-            self.logger.error(status)
+            status_log  = f"{RED_B}!purge failed{CYAN} in {CYAN_B}#{ctx.channel.name}"
+            status_log += f"{YELLOW_B} @ {CYAN_B}{ctx.guild.name}{RED_B}\n({e}){RESET}"
+            self.logger.error(status_log)
 
             reply  = f"{ctx.author.mention} Something went wrong with your Great Purge "
             reply += "and I don't really know what."
             await ctx.send(reply)
 
+        else:
+            status_log  = f"{CYAN}!purge deleted {progress.deleted} of {progress.scanned} messages in "
+            status_log += f"{CYAN_B}#{ctx.channel.name}{YELLOW_B} @ {CYAN_B}{ctx.guild.name}{RESET}"
+            self.logger.info(status_log)
+
+        finally:
+            del self.purges[ctx.channel.id]
+            if not task.done():
+                task.cancel()
+
     @command(name="idban", aliases=["banid"])
     @check(checks.is_mod)
     async def _idban(self, ctx: Context, *args: str) -> None:
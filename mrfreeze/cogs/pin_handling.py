@@ -1,20 +1,33 @@
 """Module that keeps tabs on what posts are pinned and whenever there's a change to them."""
 
-import functools
+import asyncio
 import logging
-import operator
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional
+from typing import List
+from typing import Optional
 
 import discord
 from discord import Message
-from discord import MessageType
 from discord import TextChannel
-from discord.abc import GuildChannel
 from discord.ext.commands import Cog
 
 from mrfreeze.bot import MrFreeze
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.guild_settings import MutedFeature
 from mrfreeze.lib import colors
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import message_listener
+from mrfreeze.lib.pins.crawler import PinCrawler
+from mrfreeze.lib.pins.debouncer import PinDebouncer
+from mrfreeze.lib.pins.index import PinIndex
+from mrfreeze.lib.pins.index import PinState
+from mrfreeze.lib.pins.notices import PinNotices
+
+# Most pinned messages listed in one announcement, an embed can't have more fields.
+MAX_ANNOUNCED = 25
+
+# Most characters in an embed field.
+MAX_FIELD_LENGTH = 1024
 
 
 def setup(bot: MrFreeze) -> None:
@@ -28,52 +41,50 @@ class PinHandler(Cog):
     def __init__(self, bot: MrFreeze) -> None:
         """Initialize the PinHandler cog."""
         self.bot = bot
-        self.pinsDict: Optional[Dict[int, int]] = None
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.index = PinIndex(self.logger)
+        self.crawler = PinCrawler(self.index, self.logger)
+        self.notices = PinNotices()
+        self.debouncer = PinDebouncer(self.reconcile, self.logger)
         self.logger.info("PinHandler initialized")
 
     @Cog.listener()
     async def on_ready(self) -> None:
-        """When ready, make a list of the number of pins in all channels."""
-        # Type declarations
-        all_channel_lists: Iterable[List[GuildChannel]]
-        all_channels: Iterable[GuildChannel]
-        text_channels: Iterable[TextChannel]
-        pinsDict: Dict[int, int]
-
-        guilds = self.bot.guilds
-        pinsDict = dict()
-
-        # Create iterable of all text channes
-        all_channel_lists = map(lambda g: g.channels, guilds)
-        all_channels = functools.reduce(operator.iconcat, all_channel_lists, [])
-        text_channels = filter(lambda c: isinstance(c, TextChannel), all_channels)
-
-        for channel in text_channels:
-            guild = channel.guild.name
-
-            try:
-                num_pins = len(await channel.pins())
-                pinsDict[channel.id] = num_pins
-
-                log = f"{colors.CYAN}{num_pins} pins in {colors.RED_B}{guild} "
-                log += f"{colors.GREEN_B}#{channel.name}{colors.RESET}"
-                self.logger.info(log)
-
-                if channel.id == 466241532458958850 and len(guilds) == 2:
-                    # This is for debugging purposes because the dict takes forever to build.
-                    self.pinsDict = pinsDict
-                    self.logger.info(f"{colors.CYAN_B}PinsDict all done!{colors.RESET}")
-                    return
-
-            except Exception as e:
-                log = f"Encountered {e} fetching pins from {colors.RED_B}{guild} "
-                log += f"{colors.GREEN_B}{channel.name}{colors.RESET}"
-                self.logger.error(log)
-                pass  # Channel probably got deleted or something.
-
-        self.pinsDict = pinsDict
-        self.logger.info(f"{colors.CYAN_B}PinsDict all done!{colors.RESET}")
+        """When ready, load the stored pins and sweep the channels which need checking, see PinIndex."""
+        # on_ready also fires on reconnects, only run one sweep at a time.
+        running = self.bot.bg_tasks.get("pin_sweep")
+        if running is None or running.done():
+            self.bot.add_bg_task(self.sweep(), "pin_sweep")
+
+    async def sweep(self) -> None:
+        """Load the stored pins, unless they already are, then fetch the pins of channels which need checking."""
+        if not self.index.ready and not await executor.write(self.index.load):
+            return
+
+        await self.crawler.crawl(self.index.sweep_order(self.readable_channels()))
+
+    def readable_channels(self) -> List[TextChannel]:
+        """Get every text channel whose pins we can read, grouped by guild."""
+        return [
+            channel
+            for guild in self.bot.guilds
+            for channel in guild.text_channels
+            if channel.permissions_for(guild.me).read_message_history
+        ]
+
+    def cog_unload(self) -> None:
+        """Close the cog when it's unloaded, the bot closes its cogs itself when shutting down."""
+        self.bot.add_bg_task(self.close(), "pin_close")
+
+    async def close(self) -> None:
+        """Stop the sweep and pin events in progress, and write the stored pins to disk."""
+        task = self.bot.bg_tasks.get("pin_sweep")
+        if task is not None:
+            task.cancel()
+
+        self.debouncer.cancel()
+
+        await self.index.close()
 
     @Cog.listener()
     async def on_guild_channel_pins_update(
@@ -85,60 +96,115 @@ class PinHandler(Cog):
 
         The pin system is kind of stupid, it doesn't tell us whether a pin was
         added or removed from the channel, just that there was a change. So we
-        have an index of how many pins each channel had before and use that to
-        determine whether a pin was added or deleted.
-
-        Because discord is being ridiculous and having is keep track of this
-        ourselves, it's very easy to get rate limited doing this. When that
-        happens however, usually the bot will automatically retry again within
-        five seconds and fix it.
+        keep an index of the messages pinned in each channel and compare it
+        with the channel's pins to find the messages which were just pinned.
+        The index is kept on disk, and the first event in a channel since the
+        bot started checks what's stored against the channel's actual pins.
+
+        The system messages saying who pinned a message are picked up by
+        on_pin_notice as they arrive, so they don't have to be searched for.
+
+        Because discord is being ridiculous and having us keep track of this
+        ourselves, pinning a few messages in a row used to get us rate limited.
+        Events are held back until a channel's burst of them is over, see
+        PinDebouncer, and then the channel is reconciled just once.
         """
         if self.bot.listener_block_check(channel):
             return
 
-        # If the pinsDict isn't done yet, log an error and return.
-        if self.pinsDict is None:
-            msg = f"{colors.CYAN}The {colors.RED_B}pinsDict "
-            msg += f"{colors.CYAN}isn't finished yet!{colors.RESET}"
-            self.logger.warn(msg)
-            return
+        self.debouncer.push(channel)
 
-        # The channel might be new, if so we need to create an entry for it.
-        if channel.id not in self.pinsDict:
-            self.pinsDict[channel.id] = 0
+    async def reconcile(self, channel: TextChannel) -> None:
+        """Fetch the pins of a channel, update the index and announce the messages which were just pinned."""
+        # Nothing to compare with until the stored pins have been loaded.
+        if not self.index.ready:
+            msg = f"{colors.CYAN}The {colors.RED_B}pin index "
+            msg += f"{colors.CYAN}isn't loaded yet!{colors.RESET}"
+            self.logger.warning(msg)
+            return
 
-        # For comparisson between the two. These numbers will be
-        # used to determine whether a pin was added or removed.
+        # Read what's stored only once the pins are in, in case the sweep fetched the channel meanwhile.
         channel_pins: List[Message] = await channel.pins()
-        new_pins = len(channel_pins)
-        old_pins = self.pinsDict[channel.id]
-        was_added = new_pins > old_pins
-
-        # Updating the list of pins.
-        self.pinsDict[channel.id] = new_pins
-
-        if was_added:
-            message = channel_pins[0]
-            author_name = message.author.display_name
-            author_pic = message.author.avatar_url
-            content = message.content
+        stored = self.index.get(channel.id)
+        validated = channel.id in self.index.validated
+        self.index.update(channel, [ message.id for message in channel_pins ])
+
+        # Channels the sweep hasn't got to yet have nothing to compare with, but
+        # channels created since it started had no pins before this one.
+        if stored is None and not self.crawler.ready(channel):
+            msg = f"{colors.CYAN}Pins in {colors.RED_B}#{channel.name} "
+            msg += f"{colors.CYAN}hadn't been counted yet!{colors.RESET}"
+            self.logger.warning(msg)
+            return
 
-            pinned_message = discord.Embed(description=content, color=0x00dee9)
-            pinned_message.set_author(name=author_name, icon_url=author_pic)
+        # Pins are listed newest first, announce them in the order they were pinned.
+        added = list(reversed(new_pins(stored, channel_pins, validated)))
+        for start in range(0, len(added), MAX_ANNOUNCED):
+            await self.announce(channel, added[start:start + MAX_ANNOUNCED])
 
-            # Attaching first attachment of the post, if there are any.
-            if message.attachments:
-                pinned_message.set_image(url=message.attachments[0].url)
+    @message_listener(bots=True, blocked_by=MutedFeature.FREEZE, pin_notice=True)
+    async def on_pin_notice(self, facts: MessageFacts) -> None:
+        """Keep the system messages saying a message was pinned for its pin event."""
+        self.notices.add(facts.message)
 
-            history = channel.history(limit=10)
-            sysmsg = await history.find(
-                lambda m: isinstance(m.type, type(MessageType.pins_add)))
+    async def announce(self, channel: TextChannel, messages: List[Message]) -> None:
+        """Post newly pinned messages to chat in one go, replacing the system messages saying who pinned them."""
+        sysmsgs = await asyncio.gather(*[ self.notices.find(channel.id, message.id) for message in messages ])
+        found = [ sysmsg for sysmsg in sysmsgs if sysmsg is not None ]
+        if found:
+            await channel.delete_messages(found)
 
-            if sysmsg is not None:
-                pinner = sysmsg.author.mention
-                await sysmsg.delete()
-            else:
-                pinner = "Some mod"
+        pinners = [ sysmsg.author.mention if sysmsg is not None else "Some mod" for sysmsg in sysmsgs ]
+        pinner = ", ".join(dict.fromkeys(pinners))
 
+        if len(messages) == 1:
             msg = f"The following message was just pinned by {pinner}:\n"
-            await channel.send(msg, embed=pinned_message)
+        else:
+            msg = f"The following {len(messages)} messages were just pinned by {pinner}:\n"
+        await channel.send(msg, embed=pins_embed(messages))
+
+
+def pins_embed(messages: List[Message]) -> discord.Embed:
+    """
+    Create the embed announcing pinned messages.
+
+    A single message is shown in full, several are listed as one field each.
+    Either way the first attachment found is shown as the embed's image.
+    """
+    if len(messages) == 1:
+        message = messages[0]
+        pinned_message = discord.Embed(description=message.content, color=0x00dee9)
+        pinned_message.set_author(name=message.author.display_name, icon_url=message.author.avatar_url)
+    else:
+        pinned_message = discord.Embed(color=0x00dee9)
+        for message in messages:
+            link = f"\n[Jump to message]({message.jump_url})"
+            content = message.content
+            if len(content) + len(link) > MAX_FIELD_LENGTH:
+                content = content[:MAX_FIELD_LENGTH - len(link) - 1] + "…"
+            pinned_message.add_field(name=message.author.display_name, value=content + link, inline=False)
+
+    # Attaching first attachment of the posts, if there are any.
+    attachments = [ message.attachments[0] for message in messages if message.attachments ]
+    if attachments:
+        pinned_message.set_image(url=attachments[0].url)
+
+    return pinned_message
+
+
+def new_pins(stored: Optional[PinState], channel_pins: List[Message], validated: bool = True) -> List[Message]:
+    """
+    Get the pinned messages which weren't pinned before, newest first.
+
+    Without anything stored only the newest pin can be new, the rest may
+    well have been pinned before the bot ever saw the channel. The same goes
+    for pins stored before a restart which haven't been validated since,
+    anything pinned while the bot was offline isn't news.
+    """
+    if stored is None:
+        return channel_pins[:1]
+
+    before = set(stored.messages)
+    if not validated:
+        return [ message for message in channel_pins[:1] if message.id not in before ]
+    return [ message for message in channel_pins if message.id not in before ]
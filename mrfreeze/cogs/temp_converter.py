@@ -11,6 +11,10 @@ from discord.ext.commands import Context
 from discord.ext.commands import command
 
 from mrfreeze.bot import MrFreeze
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import has_digit
+from mrfreeze.lib.message_facts import message_listener
 
 
 class TempUnit(Enum):
@@ -106,6 +110,10 @@ force_convert_begin += r"|(?:convert )?to|convert)"
 find_force_convert = fr"{force_convert_begin} (?:({celsius})|({fahrenheit})"
 find_force_convert += fr"|(°?{kelvin})|({rankine}))(?:\s|$)"
 
+# Compiled once at import rather than looked up in the re cache for every message.
+statement_pattern = re.compile(statement_regex, re.IGNORECASE)
+force_convert_pattern = re.compile(find_force_convert, re.IGNORECASE)
+
 
 def setup(bot: MrFreeze) -> None:
     """Add the cog to the bot."""
@@ -190,7 +198,7 @@ class TemperatureConverter(Cog):
 
         elif args[0].lower() == "on":
             if is_muted:
-                self.bot.settings.toggle_tempconverter_mute(ctx.guild)
+                await self.bot.settings.toggle_tempconverter_mute_async(ctx.guild)
                 is_muted_after = bool(self.bot.settings.is_tempconverter_muted(ctx.guild))
                 msg = self.get_changed_status(ctx, is_muted, is_muted_after, False)
             else:
@@ -200,12 +208,12 @@ class TemperatureConverter(Cog):
             if is_muted:
                 msg = self.get_changed_status(ctx, is_muted, is_muted, True)
             else:
-                self.bot.settings.toggle_tempconverter_mute(ctx.guild)
+                await self.bot.settings.toggle_tempconverter_mute_async(ctx.guild)
                 is_muted_after = bool(self.bot.settings.is_tempconverter_muted(ctx.guild))
                 msg = self.get_changed_status(ctx, is_muted, is_muted_after, True)
 
         elif args[0].lower() == "toggle":
-            self.bot.settings.toggle_tempconverter_mute(ctx.guild)
+            await self.bot.settings.toggle_tempconverter_mute_async(ctx.guild)
             is_muted_after = bool(self.bot.settings.is_tempconverter_muted(ctx.guild))
             msg = self.get_changed_status(ctx, is_muted, is_muted_after, not is_muted)
 
@@ -215,16 +223,13 @@ class TemperatureConverter(Cog):
         if msg:
             await ctx.send(msg)
 
-    @Cog.listener()
-    async def on_message(self, message: Message) -> None:
+    @message_listener(blocked_by=MutedFeature.FREEZE | MutedFeature.TEMPCONVERTER, has_digits=True)
+    async def on_message(self, facts: MessageFacts) -> None:
         """Look through all messages received for temperature statements."""
-        if message.author.bot or self.bot.listener_block_check(message):
-            return
-
-        if message.guild and self.bot.settings.is_tempconverter_muted(message.guild):
+        message, ctx = facts.message, facts.ctx
+        if ctx is None:
             return
 
-        ctx = await self.bot.get_context(message)
         author = ctx.author.mention
         channel = ctx.channel
 
@@ -285,11 +290,16 @@ class TemperatureConverter(Cog):
         temperature: float
         is_manual: bool
 
+        # Every temperature statement has a number in it, and looking for a digit is far
+        # cheaper than running the statement regex, so most messages stop right there.
         text = ctx.message.content
-        statement_match = re.search(statement_regex, text, re.IGNORECASE)
+        if not has_digit(text):
+            return None
+
+        statement_match = statement_pattern.search(text)
         if not statement_match:
             return None
-        conversion_match = re.search(find_force_convert, text, re.IGNORECASE)
+        conversion_match = force_convert_pattern.search(text)
 
         # Determine the origin unit.
         statement = statement_match.groups()
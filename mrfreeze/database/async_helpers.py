@@ -0,0 +1,116 @@
+"""
+Awaitable versions of the database helpers.
+
+SQLite calls block until the disk is done with them, and when they are made
+from inside a coroutine that means the entire event loop (gateway heartbeats,
+every other server's commands) waits too. The helpers in this module run the
+queries on background threads instead: all writes go through a single writer
+thread, so they never have to fight each other for the database lock, while
+reads are spread over a small pool of reader threads. With WAL journaling the
+readers don't have to wait for the writer either.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from sqlite3 import Connection
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+from mrfreeze.database.connections import DEFAULT_POOL_SIZE
+from mrfreeze.database.connections import connections
+from mrfreeze.database.helpers import ExecutionResult
+from mrfreeze.database.helpers import db_execute
+
+T = TypeVar("T")
+
+# One pooled connection is left over for the writer thread.
+DEFAULT_READERS = max(1, DEFAULT_POOL_SIZE - 1)
+
+
+class DatabaseExecutor:
+    """
+    Runs database work on a dedicated writer thread and a small pool of reader threads.
+
+    The threads are started on first use. Once shut down the executor refuses
+    any more work, rather than quietly starting new threads, until it's
+    explicitly started again.
+    """
+
+    def __init__(self, readers: int = DEFAULT_READERS) -> None:
+        self.num_readers = readers
+        self.writer: Optional[ThreadPoolExecutor] = None
+        self.readers: Optional[ThreadPoolExecutor] = None
+        self.closed = False
+
+    def start(self) -> None:
+        """Start the threads, unless they're already running, also after a shutdown."""
+        self.closed = False
+        self.start_threads()
+
+    def start_threads(self) -> None:
+        """Start the threads if they aren't running, raising RuntimeError if the executor has been shut down."""
+        if self.closed:
+            raise RuntimeError("the database executor has been shut down")
+
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        if self.readers is None:
+            self.readers = ThreadPoolExecutor(
+                max_workers=self.num_readers,
+                thread_name_prefix="db-reader")
+
+    async def write(self, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args) on the writer thread and wait for the result."""
+        self.start_threads()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.writer, functools.partial(func, *args))
+
+    async def read(self, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args) on one of the reader threads and wait for the result."""
+        self.start_threads()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.readers, functools.partial(func, *args))
+
+    def shutdown(self) -> None:
+        """Wait for queued work to finish, then stop all threads, this blocks so don't call it on the event loop."""
+        self.closed = True
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+            self.writer = None
+        if self.readers is not None:
+            self.readers.shutdown(wait=True)
+            self.readers = None
+
+
+# The one database executor shared by the whole bot.
+executor = DatabaseExecutor()
+
+
+async def db_execute_async(dbpath: str, sql: str, values: Tuple[Any, ...]) -> ExecutionResult:
+    """Execute a query that changes the database on the writer thread."""
+    return await executor.write(db_execute, dbpath, sql, values)
+
+
+async def db_fetch_async(dbpath: str, sql: str, values: Tuple[Any, ...]) -> ExecutionResult:
+    """Execute a read-only query on one of the reader threads."""
+    return await executor.read(db_execute, dbpath, sql, values)
+
+
+def run_transaction(dbpath: str, func: Callable[[Connection], T]) -> T:
+    """Call func with a pooled connection, committing if it returns and rolling back if it raises."""
+    with connections.connection(dbpath) as conn:
+        return func(conn)
+
+
+async def db_transaction_async(dbpath: str, func: Callable[[Connection], T]) -> T:
+    """
+    Run func(connection) as a single transaction on the writer thread.
+
+    Use this when several statements have to be carried out together,
+    the return value of func is passed on to the caller.
+    """
+    return await executor.write(run_transaction, dbpath, func)
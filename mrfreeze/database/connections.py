@@ -0,0 +1,142 @@
+"""
+Long-lived, pooled connections to the bot's SQLite databases.
+
+Opening a connection to an SQLite file means opening the file, reading the
+schema and setting everything up, only to tear it all down again once the
+statement is done. The ConnectionManager keeps a small pool of connections
+open for every database file instead, so each query only pays for the query.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue
+from sqlite3 import Connection
+from typing import ContextManager
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+# Number of prepared statements each connection keeps around.
+STATEMENT_CACHE_SIZE = 256
+
+# Default number of connections kept per database file.
+DEFAULT_POOL_SIZE = 4
+
+# Seconds to wait for a lock held by another connection before giving up.
+BUSY_TIMEOUT = 10.0
+
+
+def open_connection(dbpath: str) -> Connection:
+    """
+    Open a new connection to a database, configured for long-term use.
+
+    WAL journaling lets readers and the writer work at the same time, and with WAL
+    synchronous=NORMAL is still safe from corruption while only syncing on checkpoints.
+    Connections may be handed between threads, but are only ever used by one at a time.
+    """
+    conn = sqlite3.connect(
+        dbpath,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False)
+
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ConnectionPool:
+    """A pool of long-lived connections to a single database file."""
+
+    def __init__(self, dbpath: str, size: int = DEFAULT_POOL_SIZE) -> None:
+        self.dbpath = dbpath
+        self.size = max(1, size)
+        self.idle: LifoQueue = LifoQueue()
+        self.opened: List[Connection] = list()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self) -> Connection:
+        """
+        Borrow a connection from the pool.
+
+        Idle connections are reused, new ones are only opened until the pool is full.
+        If all connections are busy this blocks until one is released.
+        """
+        if self.closed:
+            raise sqlite3.ProgrammingError(f"Connection pool for {self.dbpath} is closed")
+
+        with self.lock:
+            if self.idle.empty() and len(self.opened) < self.size:
+                conn = open_connection(self.dbpath)
+                self.opened.append(conn)
+                return conn
+
+        return self.idle.get()
+
+    def release(self, conn: Connection) -> None:
+        """Return a borrowed connection to the pool."""
+        if self.closed:
+            conn.close()
+        else:
+            self.idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """
+        Borrow a connection for the duration of a with block.
+
+        Like using a connection as a context manager, the transaction is
+        committed if the block finishes and rolled back if it raises.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close every connection in the pool."""
+        with self.lock:
+            self.closed = True
+            for conn in self.opened:
+                conn.close()
+            self.opened.clear()
+
+
+class ConnectionManager:
+    """Keeps one ConnectionPool for every database file the bot uses."""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE) -> None:
+        self.pool_size = pool_size
+        self.pools: Dict[str, ConnectionPool] = dict()
+        self.lock = threading.Lock()
+
+    def pool(self, dbpath: str) -> ConnectionPool:
+        """Get the pool for a database file, creating it if necessary."""
+        with self.lock:
+            pool = self.pools.get(dbpath)
+            if pool is None or pool.closed:
+                pool = ConnectionPool(dbpath, self.pool_size)
+                self.pools[dbpath] = pool
+            return pool
+
+    def connection(self, dbpath: str) -> ContextManager[Connection]:
+        """Borrow a connection to the given database file, see ConnectionPool.connection."""
+        return self.pool(dbpath).connection()
+
+    def close_all(self) -> None:
+        """Close all pooled connections, this is called when the bot shuts down."""
+        with self.lock:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools.clear()
+
+
+# The one connection manager shared by the whole bot.
+connections = ConnectionManager()
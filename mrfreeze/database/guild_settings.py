@@ -0,0 +1,366 @@
+"""
+All settings of a single server, in a single record.
+
+Each setting still lives in its own table, but the guild_settings view joins
+them all into one row per server. This lets the bot load every setting of every
+server with a single query at startup, and keeps all settings of a server
+together in one compact GuildSettings record instead of spreading them out over
+one dict per table.
+
+For bots in very many servers the store can also run in lazy mode, where the
+settings of a server are only loaded the first time they're needed and only
+the most recently used servers are kept in memory. Servers can be preloaded
+on the database reader threads, and the per message mute check never loads
+anything on the event loop.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.database.helpers import Backoff
+from mrfreeze.database.helpers import ExecutionResult
+from mrfreeze.database.helpers import db_execute
+from mrfreeze.lib.colors import GREEN
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.colors import YELLOW_B
+
+VIEW_NAME = "guild_settings"
+
+# Default number of servers kept in memory in lazy mode.
+DEFAULT_CACHE_SIZE = 1000
+
+
+class GuildSettings:
+    """All settings of a single server, None meaning the setting isn't set."""
+
+    __slots__ = (
+        "server",
+        "mute_interval",
+        "freeze_muted",
+        "inkcyclopedia_muted",
+        "leave_channel",
+        "leave_message",
+        "mute_channel",
+        "mute_role",
+        "self_mute_time",
+        "tempconverter_muted",
+        "trash_channel",
+        "welcome_channel",
+        "welcome_message",
+    )
+
+    def __init__(self, server: int, **values: Any) -> None:
+        self.server = server
+        for field in FIELDS:
+            setattr(self, field, values.pop(field, None))
+
+        if values:
+            raise TypeError(f"Unknown server settings: {', '.join(values)}")
+
+    def __repr__(self) -> str:
+        values = ", ".join([ f"{field}={getattr(self, field)!r}" for field in self.__slots__ ])
+        return f"GuildSettings({values})"
+
+
+class MutedFeature:
+    """
+    Bits of the per-server bitmask of muted features.
+
+    These are plain ints rather than an enum.Flag, since the bitmask is checked
+    for every single message and plain int operations are much cheaper.
+    """
+
+    FREEZE = 1
+    INKCYCLOPEDIA = 2
+    TEMPCONVERTER = 4
+
+
+# Every setting in a GuildSettings record, that is every slot but the server.
+FIELDS: Tuple[str, ...] = GuildSettings.__slots__[1:]
+
+# The setting in a GuildSettings record that corresponds to each muted feature.
+FEATURE_FIELDS: Dict[int, str] = {
+    MutedFeature.FREEZE: "freeze_muted",
+    MutedFeature.INKCYCLOPEDIA: "inkcyclopedia_muted",
+    MutedFeature.TEMPCONVERTER: "tempconverter_muted",
+}
+
+# The settings whose changes have to be reflected in the MutedFeature bitmask.
+MUTED_FIELDS = frozenset(FEATURE_FIELDS.values())
+
+# (table, column, field) for every table that makes up the guild_settings view.
+ViewSource = Tuple[str, str, str]
+
+
+class GuildSettingsStore:
+    """
+    In-memory GuildSettings records of every server, loaded in one go.
+
+    The tables still write their own rows to the database, but keep their
+    values in memory here rather than in dicts of their own.
+
+    In lazy mode each server is loaded by itself on first access into an LRU
+    cache of cache_size servers. Servers without any settings are cached as
+    None, so they don't hit the database every time either. Servers for which
+    keep returns True, e.g. because they have writes which haven't been
+    flushed yet, are never evicted. Failed loads are retried with exponential
+    backoff in both modes, until then the settings read as unset.
+
+    The muted features of every server are also kept as a MutedFeature
+    bitmask, so that checking them for every message is a single lookup.
+    The bitmask is worked out again whenever one of the muted settings is set.
+    In lazy mode a server which isn't cached reads as not muted while its
+    settings are loaded on a reader thread, rather than blocking the event
+    loop. Use preload to load servers ahead of time.
+    """
+
+    def __init__(
+            self,
+            dbpath: str,
+            logger: logging.Logger,
+            lazy: bool = False,
+            cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.dbpath = dbpath
+        self.logger = logger
+        self.name = "guild settings"
+        self.lazy = lazy
+        self.cache_size = max(1, cache_size)
+        self.guilds: Optional[Dict[int, Optional[GuildSettings]]] = OrderedDict() if lazy else None
+        self.select_one: Optional[str] = None
+        self.select_one_fields: List[str] = list()
+        self.backoff = Backoff()
+        self.keep: Optional[Callable[[int], bool]] = None
+        self.muted: Dict[int, int] = dict()
+
+        # Servers being loaded in the background, see muted_features.
+        self.loading: Dict[int, "asyncio.Task[bool]"] = dict()
+
+    def create_view(self, sources: List[ViewSource]) -> None:
+        """
+        Create the guild_settings view from the given tables.
+
+        The view is recreated every time, so that it always matches the current set of tables.
+        """
+        servers = " UNION ".join([ f"SELECT server FROM {table}" for table, _, _ in sources ])
+        columns = ",\n".join([ f"    {table}.{column} AS {field}" for table, column, field in sources ])
+        joins = "\n".join([ f"LEFT JOIN {table} USING (server)" for table, _, _ in sources ])
+
+        # Each setting is a primary key lookup, unlike filtering the view by server.
+        self.select_one = "SELECT " + ", ".join([
+            f"(SELECT {column} FROM {table} WHERE server = ?1)" for table, column, _ in sources
+        ])
+        self.select_one_fields = [ field for _, _, field in sources ]
+
+        view = f"""
+        CREATE VIEW {VIEW_NAME} AS
+        WITH servers (server) AS ({servers})
+        SELECT
+            servers.server,
+        {columns}
+        FROM servers
+        {joins};"""
+
+        with connections.connection(self.dbpath) as conn:
+            try:
+                conn.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+                conn.execute(view)
+                self.infolog("created database view")
+            except Exception as e:
+                self.errorlog(f"failed to create database view: {e}")
+
+    def load(self) -> bool:
+        """
+        Load the settings of every server with a single query.
+
+        In lazy mode this only empties the cache, so that servers are reloaded on next access.
+        """
+        self.muted = dict()
+        if self.lazy and self.guilds is not None:
+            for server in list(self.guilds):
+                if self.keep is None or not self.keep(server):
+                    del self.guilds[server]
+            return True
+
+        query = db_execute(self.dbpath, f"SELECT server, {', '.join(FIELDS)} FROM {VIEW_NAME}", tuple())
+
+        if query.error is not None:
+            self.errorlog(f"failed to fetch data: {query.error}")
+            self.guilds = None
+            self.backoff.failed()
+            return False
+
+        self.guilds = {
+            row[0]: GuildSettings(row[0], **dict(zip(FIELDS, row[1:])))
+            for row in query.output
+        }
+        self.backoff.succeeded()
+        self.infolog(f"successfully fetched data for {len(self.guilds)} servers")
+        return True
+
+    def load_one(self, server: int) -> bool:
+        """Load the settings of a single server into the cache."""
+        if self.guilds is None or self.select_one is None:
+            return False
+        return self.store_one(server, self.read_one(server))
+
+    async def load_one_async(self, server: int) -> bool:
+        """Load the settings of a single server into the cache, querying the database on a reader thread."""
+        if self.guilds is None or self.select_one is None or not self.backoff.ready():
+            return False
+        if server in self.guilds:
+            return True
+
+        query = await executor.read(self.read_one, server)
+
+        # Don't overwrite settings which were set or loaded while we were waiting.
+        if server in self.guilds:
+            return True
+        return self.store_one(server, query)
+
+    async def preload(self, servers: Iterable[int]) -> None:
+        """In lazy mode, load the settings of the given servers which aren't cached yet, up to cache_size of them."""
+        if not self.lazy or self.guilds is None:
+            return
+
+        for i, server in enumerate(servers):
+            if i >= self.cache_size or not await self.load_one_async(server):
+                return
+
+    def read_one(self, server: int) -> ExecutionResult:
+        """Query the settings of a single server, without touching the cache."""
+        return db_execute(self.dbpath, self.select_one, (server,))
+
+    def store_one(self, server: int, query: ExecutionResult) -> bool:
+        """Put the queried settings of a single server into the cache."""
+        if query.error is not None or not query.output:
+            self.errorlog(f"failed to fetch data for server {server}: {query.error}")
+            self.backoff.failed()
+            return False
+
+        self.backoff.succeeded()
+        values = query.output[0]
+        if all(value is None for value in values):
+            self.cache(server, None)
+        else:
+            self.cache(server, GuildSettings(server, **dict(zip(self.select_one_fields, values))))
+        return True
+
+    def lookup(self, server: int) -> Tuple[bool, Optional[GuildSettings]]:
+        """
+        Find the settings of a server, loading them if needed.
+
+        Returns whether the settings could be loaded, and the settings if the server has any.
+        """
+        if self.guilds is not None and server in self.guilds:
+            if self.lazy:
+                self.guilds.move_to_end(server)
+            return True, self.guilds[server]
+
+        if self.backoff.ready():
+            if self.lazy:
+                self.load_one(server)
+            elif self.guilds is None:
+                self.load()
+
+        if self.guilds is None or (self.lazy and server not in self.guilds):
+            return False, None
+
+        return True, self.guilds.get(server)
+
+    def cache(self, server: int, record: Optional[GuildSettings]) -> None:
+        """Put a record into memory, in lazy mode evicting the least recently used servers."""
+        if self.guilds is None:
+            return
+
+        self.guilds[server] = record
+        if not self.lazy:
+            return
+
+        self.guilds.move_to_end(server)
+        if len(self.guilds) <= self.cache_size:
+            return
+
+        for evicted in list(self.guilds):
+            if len(self.guilds) <= self.cache_size:
+                break
+            if evicted != server and (self.keep is None or not self.keep(evicted)):
+                del self.guilds[evicted]
+                self.muted.pop(evicted, None)
+
+    def get(self, server: int) -> Optional[GuildSettings]:
+        """Get all settings of a server, or None if the server has no settings."""
+        return self.lookup(server)[1]
+
+    def get_value(self, server: int, field: str) -> Any:
+        """Get a single setting of a server, or None if it isn't set."""
+        record = self.get(server)
+        return None if record is None else getattr(record, field)
+
+    def set_value(self, server: int, field: str, value: Any) -> bool:
+        """Set a single setting of a server in memory."""
+        loaded, record = self.lookup(server)
+        if not loaded:
+            return False
+
+        if record is None:
+            record = GuildSettings(server)
+            self.cache(server, record)
+
+        setattr(record, field, value)
+        if field in MUTED_FIELDS:
+            self.muted.pop(server, None)
+        return True
+
+    def muted_features(self, server: int) -> int:
+        """Get the MutedFeature bitmask of a server."""
+        mask = self.muted.get(server)
+        if mask is not None:
+            return mask
+
+        if self.lazy and self.guilds is not None and server not in self.guilds and self.load_in_background(server):
+            # Nothing is muted until the settings have been loaded.
+            return 0
+
+        loaded, record = self.lookup(server)
+        mask = 0
+        if record is not None:
+            for feature, field in FEATURE_FIELDS.items():
+                if getattr(record, field):
+                    mask |= feature
+
+        # Don't remember anything about servers that couldn't be loaded.
+        if loaded:
+            self.muted[server] = mask
+        return mask
+
+    def load_in_background(self, server: int) -> bool:
+        """Start loading a server on a reader thread if we're on the event loop, return whether we are."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        if server not in self.loading:
+            task = loop.create_task(self.load_one_async(server))
+            task.add_done_callback(lambda _: self.loading.pop(server, None))
+            self.loading[server] = task
+        return True
+
+    def infolog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
+
+    def errorlog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {MAGENTA}{msg}{RESET}")
@@ -2,6 +2,7 @@
 
 import datetime
 import sqlite3
+import time
 from sqlite3 import Connection
 from typing import Any
 from typing import List
@@ -9,6 +10,8 @@ from typing import Optional
 from typing import Tuple
 from typing import Union
 
+from mrfreeze.database.connections import connections
+from mrfreeze.database.connections import open_connection
 from mrfreeze.lib.colors import CYAN
 from mrfreeze.lib.colors import CYAN_B
 from mrfreeze.lib.colors import GREEN_B
@@ -25,9 +28,43 @@ class ExecutionResult:
         self.error = error
 
 
+class Backoff:
+    """
+    Exponential backoff for retrying failed database loads.
+
+    Every failure doubles the time until the next attempt, up to maximum seconds.
+    A single success resets it.
+    """
+
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = initial
+        self.retry_at = 0.0
+
+    def ready(self) -> bool:
+        """Check whether it's time to try again."""
+        return time.monotonic() >= self.retry_at
+
+    def failed(self) -> None:
+        """Record a failure, pushing the next attempt further back."""
+        self.retry_at = time.monotonic() + self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+
+    def succeeded(self) -> None:
+        """Record a success, allowing the next attempt right away."""
+        self.delay = self.initial
+        self.retry_at = 0.0
+
+
 def db_connect(dbpath: str) -> Connection:
-    """Create a connection to a database."""
-    return sqlite3.connect(dbpath)
+    """
+    Create a new standalone connection to a database.
+
+    Queries should normally borrow a pooled connection through db_execute
+    or connections.connection() instead of opening their own.
+    """
+    return open_connection(dbpath)
 
 
 def db_time(in_data: Union[str, datetime.datetime]) -> Optional[Union[str, datetime.datetime]]:
@@ -53,7 +90,7 @@ def db_execute(dbpath: str, sql: str, values: Tuple[Any, ...]) -> ExecutionResul
     error = None
     output = list()
 
-    with db_connect(dbpath) as conn:
+    with connections.connection(dbpath) as conn:
         c = conn.cursor()
         try:
             c.execute(sql, values)
@@ -66,9 +103,7 @@ def db_execute(dbpath: str, sql: str, values: Tuple[Any, ...]) -> ExecutionResul
 
 def db_create(dbpath: str, dbname: str, table: str) -> None:
     """Create a database file from the provided tables."""
-    conn = db_connect(dbpath)
-
-    with conn:
+    with connections.connection(dbpath) as conn:
         try:
             c = conn.cursor()
             c.execute(table)
@@ -6,9 +6,16 @@ and provides a single interface for working with them all.
 """
 
 import logging
+from typing import Iterable
 from typing import List
+from typing import Optional
 
-from mrfreeze.database.tables.abc_table_base import ABCTableBase
+from discord import Guild
+
+from mrfreeze.database.guild_settings import DEFAULT_CACHE_SIZE
+from mrfreeze.database.guild_settings import GuildSettings
+from mrfreeze.database.guild_settings import GuildSettingsStore
+from mrfreeze.database.tables.abc_table_dict import ABCTableDict
 from mrfreeze.database.tables.freeze_mutes import FreezeMutes
 from mrfreeze.database.tables.inkcyclopedia_mutes import InkcyclopediaMutes
 from mrfreeze.database.tables.leave_channels import LeaveChannels
@@ -21,15 +28,36 @@ from mrfreeze.database.tables.tempconverter_mutes import TempConverterMutes
 from mrfreeze.database.tables.trash_channels import TrashChannels
 from mrfreeze.database.tables.welcome_channels import WelcomeChannels
 from mrfreeze.database.tables.welcome_messages import WelcomeMessages
+from mrfreeze.database.write_behind import WriteBehindQueue
+from mrfreeze.database.write_behind import WriteBehindStats
 
 
 class Settings:
-    """Settings is a class for coordinating all the various settings modules."""
-
-    def __init__(self) -> None:
-        self.dbpath = "settings.db"
-        self.tables: List[ABCTableBase] = list()
+    """
+    Settings is a class for coordinating all the various settings modules.
+
+    With write_behind enabled, changed settings take effect right away but
+    are written to the database in batches, see WriteBehindQueue.
+
+    With lazy enabled, nothing is loaded at startup. Instead the settings of a
+    server are loaded on first use and only the cache_size most recently used
+    servers are kept in memory, see GuildSettingsStore.
+    """
+
+    def __init__(
+            self,
+            dbpath: str = "settings.db",
+            write_behind: bool = False,
+            lazy: bool = False,
+            cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.dbpath = dbpath
+        self.tables: List[ABCTableDict] = list()
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.guild_settings = GuildSettingsStore(self.dbpath, self.logger, lazy=lazy, cache_size=cache_size)
+        self.write_behind: Optional[WriteBehindQueue] = None
+        if write_behind:
+            self.write_behind = WriteBehindQueue(self.dbpath, self.logger)
+            self.guild_settings.keep = self.has_queued_writes
 
         # Initialize the tables
         self.logger.info("Instantiating tables")
@@ -61,6 +89,11 @@ class Settings:
         self.tables.append(self.welcome_channels)
         self.tables.append(self.welcome_messages)
 
+        # Keep the values of all tables together in one record per server
+        for table in self.tables:
+            table.store = self.guild_settings
+            table.write_behind = self.write_behind
+
         # Initialize all the tables
         self.logger.info("Initializing tables")
         self.initialize()
@@ -70,55 +103,72 @@ class Settings:
         # Mute Interval
         self.get_mute_interval          = self.mute_interval.get
         self.set_mute_interval          = self.mute_interval.set_by_id
+        self.set_mute_interval_async    = self.mute_interval.set_by_id_async
 
         # Freeze Mutes
-        self.is_freeze_muted            = self.freeze_mutes.get
+        self.is_freeze_muted            = self.freeze_mutes.is_muted
         self.toggle_freeze_mute         = self.freeze_mutes.toggle
+        self.toggle_freeze_mute_async   = self.freeze_mutes.toggle_async
 
         # Inkcyclopedia Mutes
-        self.is_inkcyclopedia_muted     = self.inkcyclopedia.get
+        self.is_inkcyclopedia_muted     = self.inkcyclopedia.is_muted
         self.toggle_inkcyclopedia_mute  = self.inkcyclopedia.toggle
+        self.toggle_inkcyclopedia_mute_async = self.inkcyclopedia.toggle_async
 
         # Leave Channels
         self.get_leave_channel          = self.leave_channels.get
         self.set_leave_channel          = self.leave_channels.set
         self.set_leave_channel_by_id    = self.leave_channels.set_by_id
+        self.set_leave_channel_async    = self.leave_channels.set_async
+        self.set_leave_channel_by_id_async = self.leave_channels.set_by_id_async
 
         # Leave Messages
         self.get_leave_message          = self.leave_messages.get
         self.set_leave_message_by_id    = self.leave_messages.set_by_id
+        self.set_leave_message_by_id_async = self.leave_messages.set_by_id_async
 
         # Mute Channels
         self.get_mute_channel           = self.mute_channels.get
         self.set_mute_channel           = self.mute_channels.set
         self.set_mute_channel_by_id     = self.mute_channels.set_by_id
+        self.set_mute_channel_async     = self.mute_channels.set_async
+        self.set_mute_channel_by_id_async = self.mute_channels.set_by_id_async
 
         # Mute Roles
         self.get_mute_role              = self.mute_roles.get
         self.set_mute_role              = self.mute_roles.set
         self.set_mute_role_by_id        = self.mute_roles.set_by_id
+        self.set_mute_role_async        = self.mute_roles.set_async
+        self.set_mute_role_by_id_async  = self.mute_roles.set_by_id_async
 
         # Self mute times
         self.get_self_mute_time         = self.self_mute_times.get
         self.set_self_mute_time         = self.self_mute_times.set_by_id
+        self.set_self_mute_time_async   = self.self_mute_times.set_by_id_async
 
         # Temperature Converter Mutes
-        self.is_tempconverter_muted     = self.tempconverter_mutes.get
+        self.is_tempconverter_muted     = self.tempconverter_mutes.is_muted
         self.toggle_tempconverter_mute  = self.tempconverter_mutes.toggle
+        self.toggle_tempconverter_mute_async = self.tempconverter_mutes.toggle_async
 
         # Trash Channels
         self.get_trash_channel          = self.trash_channels.get
         self.set_trash_channel          = self.trash_channels.set
         self.set_trash_channel_by_id    = self.trash_channels.set_by_id
+        self.set_trash_channel_async    = self.trash_channels.set_async
+        self.set_trash_channel_by_id_async = self.trash_channels.set_by_id_async
 
         # Welcome Channels
         self.get_welcome_channel        = self.welcome_channels.get
         self.set_welcome_channel        = self.welcome_channels.set
         self.set_welcome_channel_by_id  = self.welcome_channels.set_by_id
+        self.set_welcome_channel_async  = self.welcome_channels.set_async
+        self.set_welcome_channel_by_id_async = self.welcome_channels.set_by_id_async
 
         # Welcome Messages
         self.get_welcome_message        = self.welcome_messages.get
         self.set_welcome_message_by_id  = self.welcome_messages.set_by_id
+        self.set_welcome_message_by_id_async = self.welcome_messages.set_by_id_async
 
     def initialize(self) -> None:
         """Set up the database and tables necessary for the server settings module."""
@@ -126,6 +176,38 @@ class Settings:
         for module in self.tables:
             module.create_table()
 
-        self.logger.info("Load tables into memory.")
-        for module in self.tables:
-            module.load_from_db()
+        self.guild_settings.create_view([
+            (module.table_name, module.secondary_keys[0], module.field)
+            for module in self.tables
+        ])
+
+        if not self.guild_settings.lazy:
+            self.logger.info("Load tables into memory.")
+            self.guild_settings.load()
+
+    def get_guild_settings(self, server: Guild) -> Optional[GuildSettings]:
+        """Get all settings of a server in one lookup, or None if the server has no settings."""
+        return self.guild_settings.get(server.id)
+
+    async def preload(self, servers: Iterable[Guild]) -> None:
+        """In lazy mode, load the settings of the given servers on the database reader threads."""
+        await self.guild_settings.preload([ server.id for server in servers ])
+
+    def muted_features(self, server: Guild) -> int:
+        """Get the MutedFeature bitmask of a server in one lookup."""
+        return self.guild_settings.muted_features(server.id)
+
+    def has_queued_writes(self, server: int) -> bool:
+        """Check if a server has changed settings waiting in the write-behind queue."""
+        if self.write_behind is None:
+            return False
+        return any(key[1] == server for key in self.write_behind.pending)
+
+    def write_behind_stats(self) -> Optional[WriteBehindStats]:
+        """Get the queue depth and flush latency of the write-behind queue, if enabled."""
+        return None if self.write_behind is None else self.write_behind.stats()
+
+    async def close(self) -> None:
+        """Write any queued settings to the database, this is called when the bot shuts down."""
+        if self.write_behind is not None:
+            await self.write_behind.close()
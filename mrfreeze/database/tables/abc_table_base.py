@@ -6,9 +6,12 @@ from abc import ABCMeta
 from abc import abstractmethod
 from typing import Any
 from typing import Dict
+from typing import Optional
 from typing import Tuple
 
-from mrfreeze.database.helpers import db_connect
+from mrfreeze.database.async_helpers import db_execute_async
+from mrfreeze.database.connections import connections
+from mrfreeze.database.helpers import ExecutionResult
 from mrfreeze.database.helpers import db_execute
 from mrfreeze.lib.colors import GREEN
 from mrfreeze.lib.colors import MAGENTA
@@ -65,19 +68,37 @@ class ABCTableBase(metaclass=ABCMeta):
         The function never accepts None in the primary keys, and also doesn't
         accept None is secondary keys unless accept_none is set to True.
         """
+        value_fill = self.update_values(pairs, accept_none)
+        if value_fill is None:
+            return False
+
+        query = db_execute(self.dbpath, self.insert, value_fill)
+        return self.update_result(query)
+
+    async def update_async(self, pairs: Dict[Any, Any], accept_none: bool = False) -> bool:
+        """Update (or insert) something into the database on the database writer thread."""
+        value_fill = self.update_values(pairs, accept_none)
+        if value_fill is None:
+            return False
+
+        query = await db_execute_async(self.dbpath, self.insert, value_fill)
+        return self.update_result(query)
+
+    def update_values(self, pairs: Dict[Any, Any], accept_none: bool) -> Optional[Tuple[Any, ...]]:
+        """Get the values to fill into the insert query, or None if any required values are missing."""
         primary_values = tuple([ pairs[v] for v in self.primary_keys ])
         secondary_values = tuple([ pairs[v] for v in self.secondary_keys ])
-        value_fill = primary_values + secondary_values + secondary_values
 
         # Check that all required values are filled in
         if None in primary_values or (not accept_none and None in secondary_values):
             self.errorlog(
                 "missing one or more values, can't upsert")
-            return False
-        else:
-            query = db_execute(self.dbpath, self.insert, value_fill)
+            return None
 
-        # Check that query was executed successfully
+        return primary_values + secondary_values + secondary_values
+
+    def update_result(self, query: ExecutionResult) -> bool:
+        """Check that an update query was executed successfully and log the outcome."""
         if query.error is not None:
             self.errorlog(
                 f"failed to upsert new data: {query.error}")
@@ -90,9 +111,7 @@ class ABCTableBase(metaclass=ABCMeta):
 
     def create_table(self) -> None:
         """Create the table for a given module."""
-        conn = db_connect(self.dbpath)
-
-        with conn:
+        with connections.connection(self.dbpath) as conn:
             try:
                 c = conn.cursor()
                 c.execute(self.table)
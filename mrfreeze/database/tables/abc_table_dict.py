@@ -12,9 +12,13 @@ from discord import Guild
 from discord import Role
 from discord import TextChannel
 
-from mrfreeze.database.helpers import db_connect
+from mrfreeze.database.async_helpers import db_execute_async
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import GuildSettingsStore
+from mrfreeze.database.helpers import ExecutionResult
 from mrfreeze.database.helpers import db_execute
 from mrfreeze.database.tables.abc_table_base import ABCTableBase
+from mrfreeze.database.write_behind import WriteBehindQueue
 from mrfreeze.lib.colors import GREEN
 from mrfreeze.lib.colors import MAGENTA
 from mrfreeze.lib.colors import RED
@@ -31,6 +35,13 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
 
     This class defines a number of properties that every settings submodule
     needs to be able to interface properly with the rest of the system.
+
+    When the table is attached to a GuildSettingsStore its values are kept in
+    the store, under the given field of each server's GuildSettings, rather
+    than in self.dict.
+
+    When the table has a WriteBehindQueue, upserts only update the in-memory
+    value and leave the actual database write to the queue.
     """
 
     # General properties
@@ -39,6 +50,9 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
     dbpath: str
     logger: logging.Logger
     dict: Optional[Dict[KT, VT]]
+    field: str
+    store: Optional[GuildSettingsStore] = None
+    write_behind: Optional[WriteBehindQueue] = None
 
     # SQL commands
     select_all: str
@@ -47,9 +61,7 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
 
     def create_table(self) -> None:
         """Create the table for a given module."""
-        conn = db_connect(self.dbpath)
-
-        with conn:
+        with connections.connection(self.dbpath) as conn:
             try:
                 c = conn.cursor()
                 c.execute(self.table)
@@ -66,6 +78,10 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
         are all loaded. This function generalises this process so it doesn't
         have to be implemented into all the cogs individually.
         """
+        if self.store is not None:
+            self.store.load()
+            return
+
         query = db_execute(self.dbpath, self.select_all, tuple())
 
         if query.error is None:
@@ -81,6 +97,9 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
 
     def get(self, server: Guild) -> Optional[VT]:
         """Get the value from a given module for a given server."""
+        if self.store is not None:
+            return self.store.get_value(server.id, self.field)
+
         # Check that values are loaded, if not try again.
         if self.dict is None:
             self.load_from_db()
@@ -98,6 +117,9 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
 
     def update_dictionary(self, key: KT, value: VT) -> bool:
         """Update the dictionary for a given module."""
+        if self.store is not None:
+            return self.store.set_value(key, self.field, value)
+
         if self.dict is None:
             self.load_from_db()
 
@@ -115,10 +137,44 @@ class ABCTableDict(Generic[KT, VT], ABCTableBase):
         """Set the value using a Guild object and a value."""
         return self.upsert(server, value)
 
+    async def set_async(self, object: Union[TextChannel, Role]) -> bool:
+        """Set the value using a TextChannel or Role object, without blocking the event loop."""
+        return await self.upsert_async(object.guild, object.id)
+
+    async def set_by_id_async(self, server: Guild, value: VT) -> bool:
+        """Set the value using a Guild object and a value, without blocking the event loop."""
+        return await self.upsert_async(server, value)
+
     def upsert(self, server: Guild, value: VT) -> bool:
         """Insert or update the value for `server.id` with `value`."""
+        if self.write_behind is not None:
+            return self.upsert_queued(server, value)
+
         query = db_execute(self.dbpath, self.insert, (server.id, value, value))
+        return self.upsert_result(server, value, query)
+
+    async def upsert_async(self, server: Guild, value: VT) -> bool:
+        """Insert or update the value for `server.id` with `value` on the database writer thread."""
+        if self.write_behind is not None:
+            return self.upsert_queued(server, value)
+
+        query = await db_execute_async(self.dbpath, self.insert, (server.id, value, value))
+        return self.upsert_result(server, value, query)
+
+    def upsert_queued(self, server: Guild, value: VT) -> bool:
+        """Update the value for `server.id` in memory and queue the database write."""
+        if self.write_behind is None or not self.update_dictionary(server.id, value):
+            self.errorlog(
+                f"failed to update dictionary for {server.name} to {value}")
+            return False
+
+        self.write_behind.enqueue((self.table_name, server.id), self.insert, (server.id, value, value))
+        self.infolog(
+            f"set {server.name} to {value} (queued)")
+        return True
 
+    def upsert_result(self, server: Guild, value: VT, query: ExecutionResult) -> bool:
+        """Update the dictionary and log the outcome of an upsert query."""
         if query.error is not None:
             self.errorlog(
                 f"failed to set {server.name} to {value}\n{query.error}")
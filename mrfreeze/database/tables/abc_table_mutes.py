@@ -0,0 +1,70 @@
+"""Abstract base class for the tables of servers which have muted a feature."""
+
+import logging
+
+from discord import Guild
+
+from mrfreeze.database.tables.abc_table_dict import ABCTableDict
+
+
+class ABCTableMutes(ABCTableDict[int, bool]):
+    """
+    Abstract base class for the mute tables.
+
+    Each mute table stores whether a single MutedFeature is muted in each
+    server. Its table is named {prefix}_mutes, and its value is kept under
+    {prefix}_muted in the GuildSettingsStore, which keeps the MutedFeature
+    bitmask of every server up to date as the values are set.
+    """
+
+    feature: int
+
+    def __init__(self, dbpath: str, logger: logging.Logger, prefix: str, feature: int) -> None:
+        self.dbpath = dbpath
+        self.name = f"{prefix} mutes"
+        self.table_name = f"{prefix}_mutes"
+        self.field = f"{prefix}_muted"
+        self.dict = None
+        self.logger = logger
+        self.primary_keys = ("server",)
+        self.secondary_keys = ("muted",)
+        self.feature = feature
+
+        # SQL commands
+        self.select_all = f"SELECT server, muted FROM {self.table_name}"
+
+        self.insert = f"""
+        INSERT INTO {self.table_name}
+            (server, muted) VALUES (?, ?)
+        ON CONFLICT(server) DO UPDATE SET muted = ?;
+        """
+
+        self.table = f"""
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            server      INTEGER PRIMARY KEY NOT NULL,
+            muted       BOOLEAN NOT NULL
+        );"""
+
+    def toggle(self, server: Guild) -> bool:
+        """
+        Toggle the mute value for the specified server.
+
+        If the value is unset, set to true.
+        If the value is false, set to true.
+        If the value is true, set to false.
+
+        Return the new value.
+        """
+        new_value = not self.get(server)
+        return self.upsert(server, new_value)
+
+    async def toggle_async(self, server: Guild) -> bool:
+        """Toggle the mute value without blocking the event loop, see toggle."""
+        new_value = not self.get(server)
+        return await self.upsert_async(server, new_value)
+
+    def is_muted(self, server: Guild) -> bool:
+        """Check if the feature is muted in the specified server."""
+        if self.store is not None:
+            return bool(self.store.muted_features(server.id) & self.feature)
+        return bool(self.get(server))
@@ -13,6 +13,7 @@ class LeaveChannels(ABCTableDict[int, Optional[int]]):
         self.dbpath = dbpath
         self.name = "leave channels"
         self.table_name = "leave_channels"
+        self.field = "leave_channel"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -13,6 +13,7 @@ class LeaveMessages(ABCTableDict[int, Optional[str]]):
         self.dbpath = dbpath
         self.name = "leave messages"
         self.table_name = "leave_messages"
+        self.field = "leave_message"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -12,6 +12,7 @@ class MuteChannels(ABCTableDict[int, int]):
         self.dbpath = dbpath
         self.name = "mute channels"
         self.table_name = "mute_channels"
+        self.field = "mute_channel"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -17,6 +17,7 @@ class MuteInterval(ABCTableDict[int, Optional[int]]):
         self.dbpath = dbpath
         self.name = "mute intervals"
         self.table_name = "mute_intervals"
+        self.field = "mute_interval"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
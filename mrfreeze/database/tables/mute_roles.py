@@ -12,6 +12,7 @@ class MuteRoles(ABCTableDict[int, int]):
         self.dbpath = dbpath
         self.name = "mute roles"
         self.table_name = "mute_roles"
+        self.field = "mute_role"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -13,6 +13,7 @@ class SelfMuteTimes(ABCTableDict[int, Optional[int]]):
         self.dbpath = dbpath
         self.name = "self mute times"
         self.table_name = "self_mute_times"
+        self.field = "self_mute_time"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -12,6 +12,7 @@ class TrashChannels(ABCTableDict[int, int]):
         self.dbpath = dbpath
         self.name = "trash channels"
         self.table_name = "trash_channels"
+        self.field = "trash_channel"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
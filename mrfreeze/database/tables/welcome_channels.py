@@ -13,6 +13,7 @@ class WelcomeChannels(ABCTableDict[int, Optional[int]]):
         self.dbpath = dbpath
         self.name = "welcome channels"
         self.table_name = "welcome_channels"
+        self.field = "welcome_channel"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -13,6 +13,7 @@ class WelcomeMessages(ABCTableDict[int, Optional[str]]):
         self.dbpath = dbpath
         self.name = "welcome messages"
         self.table_name = "welcome_messages"
+        self.field = "welcome_message"
         self.dict = None
         self.logger = logger
         self.primary_keys = ("server",)
@@ -0,0 +1,206 @@
+"""
+Write-behind queue for settings writes.
+
+Normally every set_* and toggle_* call writes to the database straight away,
+one transaction per value. In write-behind mode the tables only update their
+in-memory values and hand the query to a WriteBehindQueue. A background
+flusher then commits everything queued in a single transaction, at most
+interval seconds after the first write or as soon as batch_size writes are
+waiting. Several writes to the same setting of the same server in one batch
+collapse into the last one.
+"""
+
+import asyncio
+import logging
+import time
+from sqlite3 import Connection
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from mrfreeze.database.async_helpers import db_transaction_async
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.colors import GREEN
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.colors import YELLOW_B
+
+# Seconds to wait for more writes before flushing.
+DEFAULT_FLUSH_INTERVAL = 0.25
+
+# Number of queued writes which triggers a flush right away.
+DEFAULT_BATCH_SIZE = 100
+
+QueuedWrite = Tuple[str, Tuple[Any, ...]]
+
+
+class WriteBehindStats(NamedTuple):
+    """NamedTuple for reporting the state of a WriteBehindQueue."""
+
+    depth: int
+    flushes: int
+    written: int
+    failures: int
+    last_latency: float
+    max_latency: float
+
+
+def write_batch(batch: List[QueuedWrite], conn: Connection) -> None:
+    """Execute a batch of queued writes using the given connection."""
+    for sql, values in batch:
+        conn.execute(sql, values)
+
+
+def checkpoint(dbpath: str) -> None:
+    """Move everything in the write-ahead log into the database file and sync it to disk."""
+    with connections.connection(dbpath) as conn:
+        conn.execute("PRAGMA wal_checkpoint(FULL)")
+
+
+class WriteBehindQueue:
+    """Queue of database writes which are committed in batches by a background flusher."""
+
+    def __init__(
+            self,
+            dbpath: str,
+            logger: logging.Logger,
+            interval: float = DEFAULT_FLUSH_INTERVAL,
+            batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.dbpath = dbpath
+        self.logger = logger
+        self.name = "write-behind"
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+
+        self.pending: Dict[Hashable, QueuedWrite] = dict()
+        self.task: Optional[asyncio.Task] = None
+        self.queued: Optional[asyncio.Event] = None
+        self.full: Optional[asyncio.Event] = None
+
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Number of writes waiting to be flushed."""
+        return len(self.pending)
+
+    def stats(self) -> WriteBehindStats:
+        """Get the queue depth and flush statistics, latencies are in seconds."""
+        return WriteBehindStats(
+            depth = self.depth,
+            flushes = self.flushes,
+            written = self.written,
+            failures = self.failures,
+            last_latency = self.last_latency,
+            max_latency = self.max_latency)
+
+    def enqueue(self, key: Hashable, sql: str, values: Tuple[Any, ...]) -> None:
+        """
+        Queue a write, replacing any queued write with the same key.
+
+        The flusher is started the first time something is queued from inside a
+        running event loop. Writes queued before that wait for the first flush.
+        """
+        self.pending.pop(key, None)
+        self.pending[key] = (sql, values)
+        self.start()
+
+        if self.queued is not None and self.full is not None:
+            self.queued.set()
+            if len(self.pending) >= self.batch_size:
+                self.full.set()
+
+    def start(self) -> None:
+        """Start the background flusher, unless it's already running or there's no running loop."""
+        if self.task is not None and not self.task.done():
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self.queued = asyncio.Event()
+        self.full = asyncio.Event()
+        if self.pending:
+            self.queued.set()
+        self.task = loop.create_task(self.run())
+
+    async def run(self) -> None:
+        """Flush queued writes whenever the batch is full or the interval has passed, forever."""
+        if self.queued is None or self.full is None:
+            return
+
+        while True:
+            await self.queued.wait()
+            try:
+                await asyncio.wait_for(self.full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.queued.clear()
+            self.full.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Commit everything queued so far in a single transaction, return the number of writes."""
+        if not self.pending:
+            return 0
+
+        batch, self.pending = self.pending, dict()
+        writes = list(batch.values())
+        start = time.perf_counter()
+
+        try:
+            await db_transaction_async(self.dbpath, lambda conn: write_batch(writes, conn))
+        except Exception as e:
+            self.failures += 1
+            self.errorlog(f"failed to flush {len(batch)} writes, requeueing: {e}")
+
+            # Writes queued during the flush are newer, so they take precedence.
+            for key, write in batch.items():
+                self.pending.setdefault(key, write)
+            return 0
+
+        latency = time.perf_counter() - start
+        self.flushes += 1
+        self.written += len(writes)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.logger.debug(f"{self.name} flushed {len(writes)} writes in {latency * 1000:.1f} ms")
+        return len(writes)
+
+    async def close(self) -> None:
+        """Stop the flusher, flush everything still queued and make sure it's on disk."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        flushed = await self.flush()
+        await executor.write(checkpoint, self.dbpath)
+
+        if self.pending:
+            self.errorlog(f"{self.depth} writes could not be flushed on shutdown")
+        else:
+            self.infolog(f"flushed {flushed} writes on shutdown")
+
+    def infolog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
+
+    def errorlog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {MAGENTA}{msg}{RESET}")
@@ -181,9 +181,9 @@ async def attempt_banish(
     forbidden_exception = False
     other_exception = False
     duration, end_date = get_unbanish_duration(ctx, template_engine, args)
+    errors = await mute_db.carry_out_banish_many(bot, victims, logger, end_date)
 
-    for victim in victims:
-        error = await mute_db.carry_out_banish(bot, victim, logger, end_date)
+    for victim, error in zip(victims, errors):
         if isinstance(error, Exception):
             fails_list.append(victim)
             if isinstance(error, discord.HTTPException):
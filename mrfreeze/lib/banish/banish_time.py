@@ -19,7 +19,7 @@ async def run_command(ctx: Context, coginfo: CogInfo) -> None:
         raise InsufficientCogInfo
 
     banish_list: List[mute_db.BanishTuple]
-    banish_list = mute_db.mdb_fetch(bot, ctx.author)
+    banish_list = await mute_db.mdb_fetch(bot, ctx.author)
     mention = ctx.author.mention
 
     msg: Optional[str] = None
@@ -1,7 +1,9 @@
 """Module for handling various database interractions with the mute_db."""
 
 from datetime import datetime
+from datetime import timedelta
 from logging import Logger
+from sqlite3 import Connection
 from typing import List
 from typing import NamedTuple
 from typing import Optional
@@ -13,6 +15,13 @@ from discord import Member
 from discord.ext.commands import Bot
 
 from mrfreeze.bot import MrFreeze
+from mrfreeze.database.async_helpers import db_fetch_async
+from mrfreeze.database.async_helpers import db_transaction_async
+from mrfreeze.database.async_helpers import run_transaction
+from mrfreeze.database.helpers import db_execute
+from mrfreeze.lib.banish.mute_index import MuteEntry
+from mrfreeze.lib.banish.mute_index import MuteIndex
+from mrfreeze.lib.banish.mute_index import MuteKey
 from mrfreeze.lib.colors import CYAN
 from mrfreeze.lib.colors import CYAN_B
 from mrfreeze.lib.colors import GREEN
@@ -36,13 +45,113 @@ dbtable = f"""CREATE TABLE IF NOT EXISTS {dbname} (
     id          integer NOT NULL,
     server      integer NOT NULL,
     voluntary   boolean NOT NULL,
-    until       date,
+    until       integer,
     CONSTRAINT  server_user PRIMARY KEY (id, server));"""
+dbindexes = {
+    "mutes_until": f"CREATE INDEX IF NOT EXISTS mutes_until ON {dbname} (until);",
+    "mutes_server_until": f"CREATE INDEX IF NOT EXISTS mutes_server_until ON {dbname} (server, until);",
+}
+
+# End dates are stored as seconds since the epoch (i.e. in UTC), which unlike
+# local time is unaffected by daylight saving time. Older versions stored them
+# as date strings in local time, schema version 1 is the first using epochs.
+schema_version = 1
+
+# The latest end date we can store, a day short of datetime.max so
+# that it can be converted to local time in any time zone.
+max_until = int((datetime.max - timedelta(days=1)).timestamp())
+
+# Insert a mute, or replace the existing one in a single statement.
+# When prolonging, the time left on the new mute is added to the end of the
+# old one, unless either of them is indefinite.
+upsert_sql = f"""INSERT INTO {dbname} (id, server, voluntary, until) VALUES (?, ?, ?, ?)
+ON CONFLICT(id, server) DO UPDATE SET
+    voluntary = excluded.voluntary,
+    until = CASE
+        WHEN ? AND {dbname}.until IS NOT NULL AND excluded.until IS NOT NULL
+            THEN MIN({dbname}.until + ?, {max_until})
+        ELSE excluded.until
+    END;"""
+select_until_sql = f"SELECT until FROM {dbname} WHERE id = ? AND server = ?"
+select_all_sql = f"SELECT id, server, voluntary, until FROM {dbname}"
+select_due_sql = f"SELECT id, server, voluntary, until FROM {dbname} WHERE until <= ?"
+select_server_due_sql = f"{select_due_sql} AND server = ?"
+delete_sql = f"DELETE FROM {dbname} WHERE id = ? AND server = ?"
+
+
+def to_epoch(date: datetime) -> int:
+    """Convert a (local time) datetime to seconds since the epoch."""
+    try:
+        return min(int(date.timestamp()), max_until)
+    except (OverflowError, ValueError):
+        return max_until
+
+
+def from_epoch(seconds: Optional[int]) -> Optional[datetime]:
+    """Convert seconds since the epoch to a (local time) datetime."""
+    if seconds is None:
+        return None
+    return datetime.fromtimestamp(min(seconds, max_until))
+
+
+def create_table(bot: MrFreeze, logger: Logger) -> None:
+    """Create the mutes database if it doesn't exist, then bring it up to date."""
+    bot.db_create(bot, dbname, dbtable)
+    for index_name, index in dbindexes.items():
+        bot.db_create(bot, dbname, index, comment=index_name)
+    migrate_table(bot, logger)
 
 
-def create_table(bot: MrFreeze) -> None:
-    """Create the mutes database if it doesn't exist."""
-    bot.db_create(bot, dbname, dbtable)
+def migrate_table(bot: MrFreeze, logger: Logger) -> None:
+    """Convert end dates stored as date strings by older versions to seconds since the epoch."""
+    def migrate(conn: Connection) -> Optional[int]:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= schema_version:
+            return None
+
+        rows = conn.execute(f"SELECT id, server, until FROM {dbname} WHERE typeof(until) = 'text'")
+        converted = [ (to_epoch(bot.db_time(until)), uid, server) for uid, server, until in rows ]
+        conn.executemany(f"UPDATE {dbname} SET until = ? WHERE id = ? AND server = ?", converted)
+        conn.execute(f"PRAGMA user_version = {schema_version}")
+        return len(converted)
+
+    try:
+        migrated = run_transaction(db_path(bot), migrate)
+    except Exception as error:
+        logger.error(f"{RED_B}Mutes DB:{CYAN} failed to migrate end dates:\n{RED}==> {error}{RESET}")
+        return
+
+    if migrated is not None:
+        logger.info(f"{GREEN_B}Mutes DB:{CYAN} migrated {migrated} end dates to epoch seconds.{RESET}")
+
+
+def db_path(bot: Bot) -> str:
+    """Get the path of the mutes database file."""
+    return f"{bot.db_prefix}/{dbname}.db"
+
+
+# All current mutes, loaded once at startup and then kept up to date
+# by mdb_add_many and mdb_del as they write to the database.
+mute_index = MuteIndex()
+
+
+def load_index(bot: MrFreeze, logger: Logger) -> bool:
+    """Load all mutes from the database into the mute index."""
+    query = db_execute(db_path(bot), select_all_sql, tuple())
+
+    if query.error is not None:
+        logger.error(f"{RED_B}Mutes DB:{CYAN} failed to load mutes:\n{RED}==> {query.error}{RESET}")
+        return False
+
+    mute_index.load([
+        MuteEntry(
+            server = int(server),
+            user = int(uid),
+            voluntary = bool(voluntary),
+            until = until)
+        for uid, server, voluntary, until in query.output
+    ])
+    logger.info(f"{GREEN_B}Mutes DB:{CYAN} loaded {len(mute_index)} mutes.{RESET}")
+    return True
 
 
 async def carry_out_banish(
@@ -55,21 +164,39 @@ async def carry_out_banish(
 
     Return None if successful, Exception otherwise.
     """
-    server = member.guild
-    roles = member.roles
-    mute_role = await bot.get_mute_role(server)
-    result = None
+    results = await carry_out_banish_many(bot, [ member ], logger, end_date)
+    return results[0]
 
-    if mute_role not in roles:
-        try:
-            await member.add_roles(mute_role)
-        except Exception as e:
-            result = e
 
-    if not isinstance(result, Exception):
-        mdb_add(bot, member, logger, end_date=end_date)
+async def carry_out_banish_many(
+        bot: Bot,
+        members: List[Member],
+        logger: Logger,
+        end_date: Optional[datetime]) -> List[Union[None, Exception]]:
+    """
+    Add the antarctica role to a number of users, then add them all to the db at once.
 
-    return result
+    Return a list with one entry per member, None if successful, Exception otherwise.
+    """
+    if not members:
+        return list()
+
+    mute_role = await bot.get_mute_role(members[0].guild)
+    results: List[Union[None, Exception]] = list()
+
+    for member in members:
+        result = None
+        if mute_role not in member.roles:
+            try:
+                await member.add_roles(mute_role)
+            except Exception as e:
+                result = e
+        results.append(result)
+
+    banished = [ m for m, result in zip(members, results) if not isinstance(result, Exception) ]
+    await mdb_add_many(bot, banished, logger, end_date=end_date)
+
+    return results
 
 
 async def carry_out_unbanish(
@@ -93,12 +220,12 @@ async def carry_out_unbanish(
             result = e
 
     if not isinstance(result, Exception):
-        mdb_del(bot, member, logger)
+        await mdb_del(bot, member, logger)
 
     return result
 
 
-def mdb_add(
+async def mdb_add(
         bot: Bot,
         user: Member,
         logger: Logger,
@@ -106,109 +233,129 @@ def mdb_add(
         end_date: Optional[datetime] = None,
         prolong: bool = True) -> bool:
     """Add a new user to the mutes database."""
-    uid = user.id
-    server = user.guild.id
-    servername = user.guild.name
-    name = f"{user.name}#{user.discriminator}"
-    error = None
-    until = str()     # this string is filled in if called with an end_date
-    duration = str()  # this string too
-
-    current_mute = mdb_fetch(bot, user)
-    is_muted = len(current_mute) != 0
-    if is_muted:
-        # Always delete existing mutes
-        mdb_del(bot, user, logger)
-
-    if is_muted and end_date is not None and prolong:
-        old_until = current_mute[0].until
-        # if current mute is permanent just replace it with a timed one
-        if old_until is not None:
-            diff = end_date - datetime.now()
-            try:
-                end_date = old_until + diff
-            except OverflowError:
-                end_date = datetime.max
-
-    with bot.db_connect(bot, dbname) as conn:
-        c = conn.cursor()
-        if end_date is not None:
-            # Collect time info in string format for the log
-            until = bot.db_time(end_date)
-            until = f"\n{GREEN}==> Until: {until} {RESET}"
+    return await mdb_add_many(bot, [ user ], logger, voluntary, end_date, prolong)
 
-            duration_delta = end_date - datetime.now()
-            duration_delta = bot.parse_timedelta(duration_delta)
-            duration = f"{YELLOW}(in {duration_delta}){RESET}"
 
-            # Turn datetime object into string
-            end_date = bot.db_time(end_date)
+async def mdb_add_many(
+        bot: Bot,
+        users: List[Member],
+        logger: Logger,
+        voluntary: bool = False,
+        end_date: Optional[datetime] = None,
+        prolong: bool = True) -> bool:
+    """
+    Add a number of users to the mutes database in a single transaction.
 
-            sql = f"INSERT INTO {dbname}(id, server, voluntary, until) "
-            sql += "VALUES(?,?,?,?)"
+    Users who are already muted have their mutes replaced, or prolonged by the
+    time between now and end_date if prolong is set and both mutes are timed.
+    """
+    if not users:
+        return True
 
-            try:
-                c.execute(sql, (uid, server, voluntary, end_date))
-            except Exception as e:
-                error = e
+    now = datetime.now()
+    until = to_epoch(end_date) if end_date is not None else None
+    extension = to_epoch(end_date) - to_epoch(now) if end_date is not None else None
 
-        elif end_date is None:
-            sql = f"INSERT INTO {dbname}(id, server, voluntary) VALUES(?,?,?)"
-            try:
-                c.execute(sql, (uid, server, voluntary))
-            except Exception as e:
-                error = e
+    upsert_values = [
+        (user.id, user.guild.id, voluntary, until, prolong, extension)
+        for user in users
+    ]
+    keys = [ (user.id, user.guild.id) for user in users ]
 
-    if error is None:
-        log = f"{GREEN_B}Mutes DB:{CYAN} added user to DB: "
-        log += f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}{until}{duration}"
-        logger.info(log)
-        return True
+    def upsert(conn: Connection) -> List[Optional[int]]:
+        conn.executemany(upsert_sql, upsert_values)
+        return [ conn.execute(select_until_sql, key).fetchone()[0] for key in keys ]
 
-    else:
+    try:
+        new_untils = await db_transaction_async(db_path(bot), upsert)
+    except Exception as error:
+        names = ", ".join([ f"{user.name}#{user.discriminator}" for user in users ])
         log = f"{RED_B}Mutes DB:{CYAN} failed adding to DB: "
-        log += f"{CYAN_B}{name} @ {servername}{CYAN}:\n{RED}==> {error}{RESET}"
+        log += f"{CYAN_B}{names} @ {users[0].guild.name}{CYAN}:\n{RED}==> {error}{RESET}"
         logger.info(log)
         return False
 
+    for user, new_until in zip(users, new_untils):
+        mute_index.add(MuteEntry(
+            server = user.guild.id,
+            user = user.id,
+            voluntary = voluntary,
+            until = new_until))
+
+        name = f"{user.name}#{user.discriminator}"
+        time_info = str()
+        new_date = from_epoch(new_until)
+        if new_date is not None:
+            # Collect time info in string format for the log
+            duration = bot.parse_timedelta(new_date - datetime.now())
+            time_info = f"\n{GREEN}==> Until: {bot.db_time(new_date)} {RESET}"
+            time_info += f"{YELLOW}(in {duration}){RESET}"
+
+        log = f"{GREEN_B}Mutes DB:{CYAN} added user to DB: "
+        log += f"{CYAN_B}{name} @ {user.guild.name}{CYAN}.{RESET}{time_info}"
+        logger.info(log)
+
+    return True
+
 
-def mdb_del(bot: Bot, user: Member, logger: Logger) -> bool:
+async def mdb_del(bot: Bot, user: Member, logger: Logger) -> bool:
     """Remove a user from the mutes database."""
-    uid = user.id
-    server = user.guild.id
     servername = user.guild.name
     name = f"{user.name}#{user.discriminator}"
 
-    is_muted = len(mdb_fetch(bot, user)) != 0
-    if not is_muted:
+    def delete(conn: Connection) -> int:
+        return conn.execute(delete_sql, (user.id, user.guild.id)).rowcount
+
+    try:
+        deleted = await db_transaction_async(db_path(bot), delete)
+    except Exception as error:
+        log = f"{RED_B}Mutes DB:{CYAN} failed to remove from DB: \n{RED}==> {error}{RESET}"
+        logger.error(log)
+        return False
+
+    mute_index.remove(user.guild.id, user.id)
+    if deleted:
+        log = f"{GREEN_B}Mutes DB:{CYAN} removed user from DB: "
+    else:
         log = f"{GREEN_B}Mutes DB:{CYAN} user already not in DB: "
-        log += f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}"
-        logger.info(log)
+    log += f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}"
+    logger.info(log)
+    return True
+
+
+async def mdb_del_keys(bot: Bot, keys: List[MuteKey], logger: Logger) -> bool:
+    """
+    Remove a number of mutes from the mutes database in a single transaction.
+
+    The mutes are given as (server ID, user ID), for mutes of members who
+    can't be fetched any more, or in servers the bot is no longer in.
+    """
+    if not keys:
         return True
 
-    with bot.db_connect(bot, dbname) as conn:
-        c = conn.cursor()
-        sql = f"DELETE FROM {dbname} WHERE id = ? AND server = ?"
+    def delete(conn: Connection) -> int:
+        return conn.executemany(delete_sql, [ (user, server) for server, user in keys ]).rowcount
 
-        try:
-            c.execute(sql, (uid, server))
-            log = f"{GREEN_B}Mutes DB:{CYAN} removed user from DB: "
-            log += f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}"
-            logger.info(log)
-            return True
+    try:
+        deleted = await db_transaction_async(db_path(bot), delete)
+    except Exception as error:
+        log = f"{RED_B}Mutes DB:{CYAN} failed to remove from DB: \n{RED}==> {error}{RESET}"
+        logger.error(log)
+        return False
 
-        except Exception as error:
-            log = f"{RED_B}Mutes DB:{CYAN} failed to remove from DB: \n{RED}==> {error}{RESET}"
-            logger.error(log)
-            return False
+    for server, user in keys:
+        mute_index.remove(server, user)
+    logger.info(f"{GREEN_B}Mutes DB:{CYAN} removed {deleted} unreachable mutes from DB.{RESET}")
+    return True
 
 
-def mdb_fetch(bot: Bot, in_data: Union[Member, Guild]) -> List[BanishTuple]:
+async def mdb_fetch(bot: Bot, in_data: Union[Member, Guild]) -> List[BanishTuple]:
     """
     Return user or server mute information.
 
     If input is a server, return a list of all users from that server in the database.
     If input is a member, return what we've got on that member.
+    This is answered from the mute index, without touching the database.
     """
     is_member = isinstance(in_data, discord.Member)
     is_server = isinstance(in_data, discord.Guild)
@@ -217,26 +364,43 @@ def mdb_fetch(bot: Bot, in_data: Union[Member, Guild]) -> List[BanishTuple]:
         # This should never happen, no point in even logging it.
         raise TypeError(f"Expected discord.Member or discord.Guild, got {type(in_data)}")
 
-    with bot.db_connect(bot, dbname) as conn:
-        c = conn.cursor()
-        fetch_id = in_data.id
-        if is_member:
-            server = in_data.guild
-            sql = f' SELECT * FROM {dbname} WHERE id = ? AND server = ? '
-            c.execute(sql, (fetch_id, server.id))
-
-        elif is_server:
-            server = in_data
-            sql = f' SELECT * FROM {dbname} WHERE server = ? '
-            c.execute(sql, (fetch_id,))
-
-        output = [
-            BanishTuple(
-                member = discord.utils.get(server.members, id=int(entry[0])),
-                voluntary = bool(entry[2]),
-                until = bot.db_time(entry[3])
-            )
-            for entry in c.fetchall()
-        ]
-
-    return output
+    if is_member:
+        entry = mute_index.get(in_data.guild.id, in_data.id)
+        if entry is None:
+            return list()
+        return [ BanishTuple(member=in_data, voluntary=entry.voluntary, until=from_epoch(entry.until)) ]
+
+    return [ banish_tuple(in_data, entry) for entry in mute_index.server_mutes(in_data.id) ]
+
+
+async def mdb_fetch_due(bot: Bot, now: float, server: Optional[Guild] = None) -> List[MuteEntry]:
+    """
+    Return the mutes which have ended by now (in seconds since the epoch).
+
+    If a server is given, only mutes from that server are returned.
+    """
+    if server is None:
+        query = await db_fetch_async(db_path(bot), select_due_sql, (now,))
+    else:
+        query = await db_fetch_async(db_path(bot), select_server_due_sql, (now, server.id))
+
+    if query.error is not None:
+        raise query.error
+
+    return [
+        MuteEntry(server=int(sid), user=int(uid), voluntary=bool(voluntary), until=until)
+        for uid, sid, voluntary, until in query.output
+    ]
+
+
+def banish_tuple(server: Guild, entry: MuteEntry) -> BanishTuple:
+    """
+    Turn an entry from the mute index into a BanishTuple.
+
+    Members who aren't cached (e.g. because they've left) are represented by their ID only.
+    """
+    return BanishTuple(
+        member = server.get_member(entry.user) or discord.Object(id=entry.user),
+        voluntary = entry.voluntary,
+        until = from_epoch(entry.until)
+    )
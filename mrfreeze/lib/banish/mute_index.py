@@ -0,0 +1,138 @@
+"""
+In-memory index of all current mutes.
+
+The index is loaded from the mutes database once at startup and is then kept
+up to date by mute_db whenever it writes to the database. It keeps every mute
+in a dict keyed by (server, user) for direct lookups, and every timed mute in a
+min-heap ordered by expiry so that finding the mutes which are due is cheap no
+matter how many mutes there are. End dates are kept in seconds since the epoch,
+just like they are stored in the database.
+"""
+
+import heapq
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+
+class MuteEntry(NamedTuple):
+    """NamedTuple for holding a single mute in the index."""
+
+    server: int
+    user: int
+    voluntary: bool
+    until: Optional[int]
+
+
+MuteKey = Tuple[int, int]
+HeapItem = Tuple[int, int, int]
+
+
+class MuteIndex:
+    """
+    Dict and expiry heap of all current mutes.
+
+    Removed or replaced mutes are left in the heap and skipped when they reach the
+    top, an entry in the heap is only valid if it matches the mute in the dict.
+    """
+
+    def __init__(self) -> None:
+        self.mutes: Dict[MuteKey, MuteEntry] = dict()
+        self.servers: Dict[int, Set[int]] = dict()
+        self.heap: List[HeapItem] = list()
+        self.loaded = False
+
+        # Functions to call with every mute added to the index.
+        self.listeners: List[Callable[[MuteEntry], None]] = list()
+
+    def __len__(self) -> int:
+        return len(self.mutes)
+
+    def load(self, entries: Iterable[MuteEntry]) -> None:
+        """Replace the contents of the index with the given mutes."""
+        self.mutes = dict()
+        self.servers = dict()
+        for entry in entries:
+            self.mutes[(entry.server, entry.user)] = entry
+            self.servers.setdefault(entry.server, set()).add(entry.user)
+
+        self.rebuild_heap()
+        self.loaded = True
+
+    def add(self, entry: MuteEntry) -> None:
+        """Add a mute to the index, replacing any previous mute for the same user."""
+        self.mutes[(entry.server, entry.user)] = entry
+        self.servers.setdefault(entry.server, set()).add(entry.user)
+
+        if entry.until is not None:
+            heapq.heappush(self.heap, (entry.until, entry.server, entry.user))
+
+        for listener in self.listeners:
+            listener(entry)
+
+        # Replaced and removed mutes pile up in the heap, so clean it out every now and then.
+        if len(self.heap) > 2 * len(self.mutes) + 64:
+            self.rebuild_heap()
+
+    def remove(self, server: int, user: int) -> Optional[MuteEntry]:
+        """Remove a mute from the index, returning the removed mute if there was one."""
+        entry = self.mutes.pop((server, user), None)
+
+        if entry is not None:
+            users = self.servers[server]
+            users.discard(user)
+            if not users:
+                del self.servers[server]
+
+        return entry
+
+    def get(self, server: int, user: int) -> Optional[MuteEntry]:
+        """Get the mute of a user in a server, or None if they're not muted."""
+        return self.mutes.get((server, user))
+
+    def server_mutes(self, server: int) -> List[MuteEntry]:
+        """Get all mutes in a server."""
+        return [ self.mutes[(server, user)] for user in self.servers.get(server, ()) ]
+
+    def is_valid(self, item: HeapItem) -> bool:
+        """Check if a heap item still matches a mute in the index."""
+        until, server, user = item
+        entry = self.mutes.get((server, user))
+        return entry is not None and entry.until == until
+
+    def next_expiry(self) -> Optional[int]:
+        """Get the end date of the timed mute that ends first, or None if there are no timed mutes."""
+        while self.heap and not self.is_valid(self.heap[0]):
+            heapq.heappop(self.heap)
+
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, now: float, server: Optional[int] = None) -> List[MuteEntry]:
+        """
+        Get all mutes that have ended by now, optionally limited to a single server.
+
+        The mutes are not removed from the index, that happens once they've actually
+        been removed from the database. Until then they will keep showing up as due.
+        """
+        due: Dict[MuteKey, MuteEntry] = dict()
+
+        while self.heap and self.heap[0][0] <= now:
+            item = heapq.heappop(self.heap)
+            if self.is_valid(item):
+                until, item_server, user = item
+                due[(item_server, user)] = self.mutes[(item_server, user)]
+
+        for entry in due.values():
+            heapq.heappush(self.heap, (entry.until, entry.server, entry.user))
+
+        return [ e for e in due.values() if server is None or e.server == server ]
+
+    def rebuild_heap(self) -> None:
+        """Rebuild the heap from the mutes in the dict, dropping all stale items."""
+        self.heap = [ (e.until, e.server, e.user) for e in self.mutes.values() if e.until is not None ]
+        heapq.heapify(self.heap)
@@ -1,14 +1,26 @@
-"""Module for handling automatic unbanishments."""
+"""
+Module for handling automatic unbanishments.
+
+A single UnbanishScheduler takes care of every server. Rather than checking
+the database every few seconds it sleeps until the first mute ends, and is
+woken up early whenever a mute which ends even sooner is added.
+"""
 import asyncio
 import datetime
+import time
 from logging import Logger
+from typing import Dict
+from typing import List
+from typing import Optional
 
+import discord
 from discord import Guild
 
 from mrfreeze.bot import MrFreeze
 from mrfreeze.cogs.coginfo import CogInfo
 from mrfreeze.lib import default
 from mrfreeze.lib.banish import mute_db
+from mrfreeze.lib.banish.mute_index import MuteEntry
 from mrfreeze.lib.colors import CYAN
 from mrfreeze.lib.colors import CYAN_B
 from mrfreeze.lib.colors import MAGENTA
@@ -17,93 +29,193 @@ from mrfreeze.lib.colors import RESET
 from mrfreeze.lib.colors import YELLOW
 
 
-async def unbanish_loop(server: Guild, coginfo: CogInfo) -> None:
-    """Check for people to unbanish every self.banish_interval seconds."""
-    if coginfo.bot and coginfo.logger and coginfo.default_mute_interval:
-        bot: MrFreeze = coginfo.bot
-        logger: Logger = coginfo.logger
-        default_mute_interval: int = coginfo.default_mute_interval
-    else:
-        raise Exception("Failed to create unbanish loop, insufficient cog info.")
+class UnbanishScheduler:
+    """
+    Unbanish everyone in every server once their time is up.
+
+    The scheduler sleeps until the first timed mute in the mute index ends, then asks
+    the database for everything that is due in a single range query. A server's
+    mute interval, if set, is an upper bound on how long the scheduler may sleep while
+    that server has people in Antarctica. Mutes which are due but couldn't be undone
+    are retried every default_mute_interval seconds, unless they never can be: mutes
+    in servers the bot has left, or of members who have left, are dropped instead.
+    """
+
+    def __init__(self, coginfo: CogInfo) -> None:
+        if coginfo.bot and coginfo.logger and coginfo.default_mute_interval:
+            self.bot: MrFreeze = coginfo.bot
+            self.logger: Logger = coginfo.logger
+            self.default_mute_interval: int = coginfo.default_mute_interval
+        else:
+            raise Exception("Failed to create unbanish scheduler, insufficient cog info.")
+
+        self.coginfo = coginfo
+        self.wakeup: Optional[asyncio.Event] = None
+        self.next_run: Optional[float] = None
+        mute_db.mute_index.listeners.append(self.mute_added)
+
+    def stop(self) -> None:
+        """Stop listening for added mutes, so that a scheduler which is no longer used isn't kept alive."""
+        if self.mute_added in mute_db.mute_index.listeners:
+            mute_db.mute_index.listeners.remove(self.mute_added)
+
+    def mute_added(self, entry: MuteEntry) -> None:
+        """Wake the scheduler up if a mute was added which ends before the next planned run."""
+        if entry.until is None or self.wakeup is None:
+            return
+
+        if self.next_run is None or entry.until < self.next_run:
+            self.wakeup.set()
+
+    def sleep_time(self, now: float) -> Optional[float]:
+        """Get the number of seconds to sleep before the next run, None meaning until woken up."""
+        delays: List[float] = list()
+
+        next_expiry = mute_db.mute_index.next_expiry()
+        if next_expiry is not None and next_expiry <= now:
+            # Someone is overdue, probably because unbanishing them failed.
+            delays.append(self.default_mute_interval)
+        elif next_expiry is not None:
+            delays.append(next_expiry - now)
+
+        for server_id in mute_db.mute_index.servers:
+            server = self.bot.get_guild(server_id)
+            interval = server and self.bot.settings.get_mute_interval(server)
+            if interval:
+                delays.append(interval)
+
+        return min(delays) if delays else None
+
+    async def run(self) -> None:
+        """Unbanish everyone who is due, then sleep until the next mute ends, forever."""
+        self.wakeup = asyncio.Event()
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed():
+            current_time = datetime.datetime.now()
+            due_mutes: Dict[int, List[MuteEntry]] = dict()
+            try:
+                due = await mute_db.mdb_fetch_due(self.bot, time.time())
+            except Exception as e:
+                self.logger.error(f"Failed to fetch due mutes: {e}")
+                due = mute_db.mute_index.due(time.time())
 
-    while not bot.is_closed():
-        # Wait the time specified by the server (or the default time) before running
-        interval = bot.settings.get_mute_interval(server) or default_mute_interval
-        logger.debug(f"Running unbanish loop for {server.name} in {interval}.")
-        await asyncio.sleep(interval)
-        logger.debug(f"Running unbanish loop for {server.name}.")
+            for entry in due:
+                due_mutes.setdefault(entry.server, list()).append(entry)
 
-        # Fetch mute role/channel, which might fail.
-        try:
-            mute_role = await bot.get_mute_role(server)
-            mute_channel = await bot.get_mute_channel(server, silent=True)
-        except Exception:
-            logger.warning(f"{server.name} Unbanish loop failed to fetch mute role or channel.")
-            continue
-        unmuted = list()
+            for server_id, entries in due_mutes.items():
+                server = self.bot.get_guild(server_id)
+                if server is None:
+                    self.logger.warning(f"Dropping {len(entries)} mutes due in unknown server {server_id}.")
+                    keys = [ (entry.server, entry.user) for entry in entries ]
+                    await mute_db.mdb_del_keys(self.bot, keys, self.logger)
+                    continue
 
-        # Create a list of mutes which are due for unmuting
-        current_time = datetime.datetime.now()
-        mutes = mute_db.mdb_fetch(bot, server)
-        timed_mutes = [ i for i in mutes if i.until is not None ]
-        due_mutes = [ i for i in timed_mutes if i.until < current_time ]
-        logger.debug(f"{server.name} mutes: {len(mutes)}/{len(timed_mutes)}/{len(due_mutes)}")
+                mutes = [ mute_db.banish_tuple(server, entry) for entry in entries ]
+                try:
+                    await unbanish_server(server, mutes, self.coginfo, current_time)
+                except Exception as e:
+                    self.logger.error(f"{server.name} Failed to unbanish due mutes: {e}")
 
-        for mute in due_mutes:
-            logger.debug(f"{mute} is due for unbanish!")
+            now = time.time()
+            delay = self.sleep_time(now)
+            if delay is None:
+                self.next_run = None
+                self.logger.debug("No timed mutes, unbanish scheduler sleeping until woken up.")
+            else:
+                self.next_run = now + delay
+                self.logger.debug(f"Unbanish scheduler sleeping for {delay:.1f} seconds.")
 
-            # Refresh member to make sure we have their latest roles.
+            self.wakeup.clear()
             try:
-                member = await server.fetch_member(mute.member.id)
-                logger.debug(f"Refreshed {member}, they have {len(member.roles)} roles.")
-            except Exception as e:
-                logger.error(f"Failed to refresh muted member: {e}")
-                continue  # Will try again next unbanish loop
+                await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def unbanish_server(
+    server: Guild,
+    due_mutes: List[mute_db.BanishTuple],
+    coginfo: CogInfo,
+    current_time: datetime.datetime
+) -> None:
+    """Unbanish the due mutes of a server and announce it in the mute channel."""
+    if coginfo.bot and coginfo.logger:
+        bot: MrFreeze = coginfo.bot
+        logger: Logger = coginfo.logger
+    else:
+        raise Exception("Failed to unbanish, insufficient cog info.")
 
-            # Calculate how late we were in unbanishing
-            diff = bot.parse_timedelta(current_time - mute.until)
-            if diff == "":
-                diff = "now"
-            else:
-                diff = f"{diff} ago"
+    logger.debug(f"Running unbanish for {server.name}, {len(due_mutes)} mutes due.")
 
-            # Remove from database
-            mute_db.mdb_del(bot, member, logger)
+    # Fetch mute role/channel, which might fail.
+    try:
+        mute_role = await bot.get_mute_role(server)
+        mute_channel = await bot.get_mute_channel(server, silent=True)
+    except Exception:
+        logger.warning(f"{server.name} Unbanish failed to fetch mute role or channel.")
+        return
+    unmuted = list()
 
-            if mute_role in member.roles:
-                logger.debug(f"{member} has the mute role! Removing it.")
-                try:
-                    await member.remove_roles(mute_role)
-                    logger.debug(f"{member} should no longer have the mute role.")
-                    # Members are only considered unmuted if they had the antarctica role
-                    unmuted.append(member)
+    for mute in due_mutes:
+        logger.debug(f"{mute} is due for unbanish!")
 
-                    log = f"Auto-unmuted {CYAN_B}{member.name}#"
-                    log += f"{member.discriminator} @ {server.name}."
-                    log += f"{YELLOW} (due {diff}){RESET}"
-                    logger.info(log)
+        # Refresh member to make sure we have their latest roles.
+        try:
+            member = await server.fetch_member(mute.member.id)
+            logger.debug(f"Refreshed {member}, they have {len(member.roles)} roles.")
+        except discord.NotFound:
+            logger.warning(f"Muted member {mute.member.id} has left {server.name}, dropping their mute.")
+            await mute_db.mdb_del_keys(bot, [ (server.id, mute.member.id) ], logger)
+            continue
+        except Exception as e:
+            logger.error(f"Failed to refresh muted member: {e}")
+            continue  # Will try again next time the scheduler runs
+
+        # Calculate how late we were in unbanishing
+        diff = bot.parse_timedelta(current_time - mute.until)
+        if diff == "":
+            diff = "now"
+        else:
+            diff = f"{diff} ago"
+
+        # Remove from database
+        await mute_db.mdb_del(bot, member, logger)
+
+        if mute_role in member.roles:
+            logger.debug(f"{member} has the mute role! Removing it.")
+            try:
+                await member.remove_roles(mute_role)
+                logger.debug(f"{member} should no longer have the mute role.")
+                # Members are only considered unmuted if they had the antarctica role
+                unmuted.append(member)
 
-                except Exception as e:
-                    log = f"Failed to remove mute role of {YELLOW}"
-                    log += f"{member.name}#{member.discriminator}"
-                    log += f"{CYAN_B} @ {MAGENTA} {server.name}:"
-                    log += f"\n{RED}==> {RESET}{e}"
-                    logger.error(log)
-            else:
-                log = f"User {YELLOW}{member.name}#{member.discriminator}"
-                log += f"{CYAN_B} @ {MAGENTA} {server.name}{CYAN} "
-                log += f"due for unmute but does not have a mute role!{RESET}"
-                logger.warning(log)
-
-        # Time for some great regrets
-        if len(unmuted) > 0:
-            unmuted_str = default.mentions_list(unmuted)
-
-            if len(unmuted_str) == 1:
-                msg = "It's with great regret that I must inform you all that "
-                msg += f"{unmuted_str}'s exile has come to an end."
-            else:
-                msg = "It's with great regret that I must inform you all that the exile of "
-                msg += f"{unmuted_str} has come to an end."
+                log = f"Auto-unmuted {CYAN_B}{member.name}#"
+                log += f"{member.discriminator} @ {server.name}."
+                log += f"{YELLOW} (due {diff}){RESET}"
+                logger.info(log)
 
-            await mute_channel.send(msg)
+            except Exception as e:
+                log = f"Failed to remove mute role of {YELLOW}"
+                log += f"{member.name}#{member.discriminator}"
+                log += f"{CYAN_B} @ {MAGENTA} {server.name}:"
+                log += f"\n{RED}==> {RESET}{e}"
+                logger.error(log)
+        else:
+            log = f"User {YELLOW}{member.name}#{member.discriminator}"
+            log += f"{CYAN_B} @ {MAGENTA} {server.name}{CYAN} "
+            log += f"due for unmute but does not have a mute role!{RESET}"
+            logger.warning(log)
+
+    # Time for some great regrets
+    if len(unmuted) > 0:
+        unmuted_str = default.mentions_list(unmuted)
+
+        if len(unmuted_str) == 1:
+            msg = "It's with great regret that I must inform you all that "
+            msg += f"{unmuted_str}'s exile has come to an end."
+        else:
+            msg = "It's with great regret that I must inform you all that the exile of "
+            msg += f"{unmuted_str} has come to an end."
+
+        await mute_channel.send(msg)
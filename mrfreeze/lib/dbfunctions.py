@@ -7,23 +7,27 @@ for handling interraction with databases.
 import datetime
 import sqlite3
 
+from mrfreeze.database.connections import connections
 from mrfreeze.lib import colors
 
 
 def db_connect(bot, dbname):
-    """Create a connection to a database."""
+    """
+    Borrow a pooled connection to a database.
+
+    Use it in a with statement, the transaction is committed when
+    the block finishes and the connection returned to the pool.
+    """
     db_file = f"{bot.db_prefix}/{dbname}.db"
-    conn = sqlite3.connect(db_file)
-    return conn
+    return connections.connection(db_file)
 
 
 def db_create(bot, dbname, tables, comment=None):
     """Create a database file from the provided tables."""
-    conn = bot.db_connect(bot, dbname)
-    if comment is not None:
-        dbname = f"{dbname} ({comment})"
+    with bot.db_connect(bot, dbname) as conn:
+        if comment is not None:
+            dbname = f"{dbname} ({comment})"
 
-    with conn:
         try:
             c = conn.cursor()
             c.execute(tables)
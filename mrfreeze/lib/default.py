@@ -9,6 +9,8 @@ from discord import Member
 from discord import User
 from discord.ext.commands import Context
 
+from mrfreeze.lib import fuzzy
+
 
 def context_replacements(
     ctx: Union[Context, Member],
@@ -66,23 +68,7 @@ def mentions_list(mentions: List[User]) -> str:
 
 def word_distance(a: str, b: str) -> int:
     """Get the word distance between two words."""
-    arr = [ [ 0 for x in range(len(b)) ] for y in range(len(a)) ]
-    for x in range(0, len(a)):
-        arr[x][0] = x
-    for x in range(0, len(b)):
-        arr[0][x] = x
-    for row in range(1, len(a)):
-        for col in range(1, len(b)):
-            if a[row] == b[col]:
-                cost = 0
-            else:
-                cost = 1
-    arr[row][col] = min(
-        1 + arr[row - 1][col],
-        1 + arr[row][col - 1],
-        cost + arr[row - 1][col - 1])
-
-    return arr[len(a) - 1][len(b) - 1]
+    return fuzzy.edit_distance(a, b)
 
 
 def get_closest_match(candidates: Iterable[str], input: str) -> str:
@@ -91,4 +77,7 @@ def get_closest_match(candidates: Iterable[str], input: str) -> str:
 
     This method acts as a wrapper for word distance.
     """
-    return min(candidates, key=lambda k: word_distance(k, input))
+    match = fuzzy.closest(candidates, input)
+    if match is None:
+        raise ValueError("get_closest_match() needs at least one candidate")
+    return match[0]
@@ -0,0 +1,177 @@
+"""
+Fuzzy string matching.
+
+edit_distance is the Levenshtein distance between two strings, worked out
+with a single rolling row and giving up as soon as the distance is known to
+be over a limit. The BKTree indexes a set of candidates by their distances to
+each other, so that finding the candidates closest to a string only has to
+compare it with a small part of the set.
+"""
+
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# A word in a BKTree, and its children keyed by their distance to it.
+BKNode = Tuple[str, Dict[int, Any]]
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    Get the number of single character insertions, deletions and substitutions needed to turn a into b.
+
+    With a limit, any distance over the limit is returned as limit + 1,
+    which is a lot quicker for strings that are very different.
+    """
+    if a == b:
+        return 0
+
+    # Keep the row as short as possible.
+    if len(a) < len(b):
+        a, b = b, a
+
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    if not b:
+        return len(a)
+
+    row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        diagonal = row[0]
+        row[0] = i
+        smallest = i
+
+        for j, char_b in enumerate(b, 1):
+            above = row[j]
+            cost = diagonal if char_a == char_b else diagonal + 1
+            if above + 1 < cost:
+                cost = above + 1
+            if row[j - 1] + 1 < cost:
+                cost = row[j - 1] + 1
+
+            row[j] = cost
+            diagonal = above
+            if cost < smallest:
+                smallest = cost
+
+        # The distance can never go below the smallest value in the row.
+        if limit is not None and smallest > limit:
+            return limit + 1
+
+    distance = row[-1]
+    if limit is not None and distance > limit:
+        return limit + 1
+    return distance
+
+
+def closest(candidates: Iterable[str], word: str) -> Optional[Tuple[str, int]]:
+    """
+    Find the candidate closest to word by going through them all, and its distance.
+
+    Each candidate is only compared for as long as it can still beat the best one so far.
+    """
+    best: Optional[Tuple[str, int]] = None
+    for candidate in candidates:
+        limit = None if best is None else best[1] - 1
+        if limit is not None and limit < 0:
+            break
+
+        distance = edit_distance(candidate, word, limit)
+        if limit is None or distance <= limit:
+            best = (candidate, distance)
+
+    return best
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree of words, for finding the words closest to another word.
+
+    Every child of a node is stored under its distance to the node. By the
+    triangle inequality, only the children whose distance lies within
+    max_distance of the distance between the node and the query can hold
+    matches, so the rest of the tree is never looked at. For the same reason
+    the distance to a node only has to be worked out up to max_distance past
+    its furthest child.
+    """
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.root: Optional[BKNode] = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, word: str) -> None:
+        """Add a word to the tree, unless it's already in it."""
+        if self.root is None:
+            self.root = (word, dict())
+            self.size = 1
+            return
+
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, dict())
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Find every word within max_distance of word, closest first."""
+        found: List[Tuple[str, int]] = list()
+        if self.root is None:
+            return found
+
+        stack = [ self.root ]
+        while stack:
+            candidate, children = stack.pop()
+            distance = edit_distance(word, candidate, max_distance + max(children, default=0))
+            if distance <= max_distance:
+                found.append((candidate, distance))
+
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+
+        found.sort(key=lambda match: match[1])
+        return found
+
+    def closest(self, word: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """
+        Find the word closest to word, and its distance.
+
+        Returns None if the tree is empty or nothing is within max_distance.
+        The search radius shrinks as closer words are found.
+        """
+        if self.root is None:
+            return None
+
+        best: Optional[Tuple[str, int]] = None
+        radius = max_distance
+        stack = [ self.root ]
+        while stack:
+            candidate, children = stack.pop()
+            limit = None if radius is None else radius + max(children, default=0)
+            distance = edit_distance(word, candidate, limit)
+            if (radius is None or distance <= radius) and (best is None or distance < best[1]):
+                best = (candidate, distance)
+                radius = distance
+                if distance == 0:
+                    break
+
+            for edge, child in children.items():
+                if radius is None or distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+        return best
@@ -0,0 +1,131 @@
+"""
+Coalescing of concurrent ink lookups.
+
+A popular ink mentioned in several channels at once used to be looked up
+once per message. The InkBatcher instead collects the names requested
+within a short window and looks them all up with a single search request.
+Lookups of a name that is already waiting or in flight don't add it again,
+they just wait for the same result.
+"""
+
+import asyncio
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitOpenError
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+
+# Seconds to collect names before sending a search request.
+DEFAULT_WINDOW = 0.05
+
+# Number of waiting names which triggers a search request right away.
+DEFAULT_MAX_BATCH = 50
+
+InkFuture = "asyncio.Future[Optional[Ink]]"
+
+
+class InkBatcher:
+    """Looks up normalised ink names through an InkClient, batching and sharing concurrent lookups."""
+
+    def __init__(self, client: InkClient, window: float = DEFAULT_WINDOW, max_batch: int = DEFAULT_MAX_BATCH) -> None:
+        self.client = client
+        self.window = window
+        self.max_batch = max(1, max_batch)
+
+        # Every name waiting for or in a search request, mapped to its result.
+        self.inflight: Dict[str, InkFuture] = dict()
+
+        # Names waiting for the next search request.
+        self.queue: List[str] = list()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+        # Search requests in flight.
+        self.searches: Set["asyncio.Task[None]"] = set()
+
+        self.requests = 0
+        self.shared = 0
+
+    async def lookup(self, names: List[str]) -> Dict[str, Optional[Ink]]:
+        """
+        Look up a list of normalised ink names, None meaning the ink wasn't found.
+
+        Raises whatever InkClient.search raises if the search request fails,
+        or CircuitOpenError right away while the API is failing.
+        """
+        if self.client.breaker.short_circuit():
+            raise CircuitOpenError("the Ink API is failing, not sending any requests for now")
+
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, InkFuture] = dict()
+
+        for name in names:
+            future = self.inflight.get(name)
+            if future is not None:
+                self.shared += 1
+            else:
+                future = loop.create_future()
+                self.inflight[name] = future
+                self.queue.append(name)
+            futures[name] = future
+
+        if len(self.queue) >= self.max_batch:
+            self.send()
+        elif self.queue and self.timer is None:
+            self.timer = loop.call_later(self.window, self.send)
+
+        # Shielded, so that a cancelled message doesn't cancel the lookup for everyone else waiting on it.
+        results = await asyncio.gather(*[ asyncio.shield(future) for future in futures.values() ])
+        return dict(zip(futures, results))
+
+    def send(self) -> None:
+        """Send a search request for every waiting name."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        batch, self.queue = self.queue, list()
+        if batch:
+            self.requests += 1
+            task = asyncio.ensure_future(self.search(batch))
+            self.searches.add(task)
+            task.add_done_callback(self.searches.discard)
+
+    async def close(self) -> None:
+        """Cancel the lookups which are waiting and the search requests in flight, and wait for them to stop."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        for name in self.queue:
+            self.inflight.pop(name).cancel()
+        self.queue = list()
+
+        searches = list(self.searches)
+        for task in searches:
+            task.cancel()
+        await asyncio.gather(*searches, return_exceptions=True)
+
+    async def search(self, batch: List[str]) -> None:
+        """Look up a batch of names and hand the results to everyone waiting for them."""
+        results: Optional[Dict[str, Ink]] = None
+        error: Optional[Exception] = None
+        try:
+            results = await self.client.search(batch)
+        except Exception as e:
+            error = e
+        finally:
+            for name in batch:
+                future = self.inflight.pop(name)
+                if future.done():
+                    continue
+                elif results is not None:
+                    future.set_result(results.get(name))
+                elif error is not None:
+                    future.set_exception(error)
+                    # Mark the exception as retrieved, in case everyone waiting for it was cancelled.
+                    future.exception()
+                else:
+                    future.cancel()
@@ -0,0 +1,190 @@
+"""
+Circuit breaker and adaptive timeout for the Ink API.
+
+When the Ink API is slow or down, every message mentioning an ink used to
+wait out a full failed request. The CircuitBreaker keeps track of the last
+few requests, and after too many failures in a row it opens: lookups fail
+straight away without touching the network. Once reset_timeout seconds have
+passed it goes half-open, letting a single probe request through. If the
+probe succeeds the breaker closes again, otherwise it stays open for another
+reset_timeout.
+
+The breaker also works out the timeout for each request from the latency
+of recent successful requests, so a single stuck request doesn't hold up a
+lookup for much longer than a normal one takes.
+"""
+
+import time
+from collections import deque
+from typing import Deque
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+# Number of failed requests in a row which opens the breaker.
+DEFAULT_FAILURE_THRESHOLD = 5
+
+# Seconds the breaker stays open before letting a probe through.
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Number of recent requests used for the error rate and latencies.
+DEFAULT_WINDOW = 50
+
+# Bounds of the adaptive timeout, in seconds.
+DEFAULT_MIN_TIMEOUT = 1.0
+DEFAULT_MAX_TIMEOUT = 5.0
+
+# The timeout is this many times the 95th percentile latency of recent successful requests.
+TIMEOUT_FACTOR = 3.0
+
+# Number of successful requests needed before the timeout adapts.
+MIN_SAMPLES = 5
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request while the circuit breaker is open."""
+
+    pass
+
+
+class BreakerState:
+    """States of a CircuitBreaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class BreakerStats(NamedTuple):
+    """NamedTuple for reporting the state of a CircuitBreaker, times are in seconds."""
+
+    state: str
+    requests: int
+    error_rate: float
+    consecutive_failures: int
+    rejected: int
+    median_latency: Optional[float]
+    p95_latency: Optional[float]
+    timeout: float
+    retry_in: Optional[float]
+
+
+def percentile(values: Deque[float], fraction: float) -> Optional[float]:
+    """Get a percentile of some values, None if there aren't any."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Tracks the outcome of requests to a service and stops sending them while it's failing."""
+
+    def __init__(
+            self,
+            failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+            window: int = DEFAULT_WINDOW,
+            min_timeout: float = DEFAULT_MIN_TIMEOUT,
+            max_timeout: float = DEFAULT_MAX_TIMEOUT) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.max_timeout = max_timeout
+
+        # (succeeded, latency) of recent requests, and the latencies of recent successful ones.
+        self.outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.consecutive_failures = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        Check if a request may be made right now.
+
+        When an open breaker has waited long enough this lets a single probe
+        through and makes the breaker half-open until the probe is recorded.
+        """
+        if self.state == BreakerState.CLOSED:
+            return True
+
+        if not self.probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = BreakerState.HALF_OPEN
+            self.probing = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def short_circuit(self) -> bool:
+        """
+        Check if requests are being refused right now, without letting a probe through.
+
+        This lets callers fail fast before doing any work towards a request.
+        """
+        if self.state == BreakerState.CLOSED:
+            return False
+
+        if not self.probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return False
+
+        self.rejected += 1
+        return True
+
+    def succeeded(self, latency: float) -> None:
+        """Record a successful request, closing the breaker."""
+        self.outcomes.append((True, latency))
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        self.probing = False
+        self.state = BreakerState.CLOSED
+
+    def failed(self, latency: float) -> None:
+        """Record a failed request, opening the breaker after too many failures in a row or a failed probe."""
+        self.outcomes.append((False, latency))
+        self.consecutive_failures += 1
+        if self.state == BreakerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = BreakerState.OPEN
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def abandoned(self) -> None:
+        """Record that a request was cancelled before it finished, letting another probe through."""
+        if self.probing:
+            self.probing = False
+            self.state = BreakerState.OPEN
+
+    def timeout(self) -> float:
+        """Get the timeout for the next request."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return self.max_timeout
+
+        p95 = percentile(self.latencies, 0.95) or 0.0
+        return min(self.max_timeout, max(self.min_timeout, p95 * TIMEOUT_FACTOR))
+
+    def error_rate(self) -> float:
+        """Get the share of recent requests which failed."""
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for succeeded, _ in self.outcomes if not succeeded) / len(self.outcomes)
+
+    def stats(self) -> BreakerStats:
+        """Get the state of the breaker and its view of the service."""
+        retry_in: Optional[float] = None
+        if self.state == BreakerState.OPEN:
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+        return BreakerStats(
+            state = self.state,
+            requests = len(self.outcomes),
+            error_rate = self.error_rate(),
+            consecutive_failures = self.consecutive_failures,
+            rejected = self.rejected,
+            median_latency = percentile(self.latencies, 0.5),
+            p95_latency = percentile(self.latencies, 0.95),
+            timeout = self.timeout(),
+            retry_in = retry_in)
@@ -0,0 +1,95 @@
+"""
+Cache of Ink API search results.
+
+The same popular inks get looked up over and over, so the Inkcyclopedia
+remembers the result of every lookup, keyed by the normalised ink name, for
+ttl seconds. Names the API doesn't know are remembered as well, but only for
+the shorter negative_ttl, so that newly added inks show up reasonably soon.
+Only the size most recently used names are kept.
+"""
+
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+
+# Number of ink names kept in the cache.
+DEFAULT_CACHE_SIZE = 1024
+
+# Seconds a found ink is cached.
+DEFAULT_TTL = 6 * 60 * 60.0
+
+# Seconds a name the API doesn't know is cached.
+DEFAULT_NEGATIVE_TTL = 5 * 60.0
+
+# When the entry expires, and the ink or None if it wasn't found.
+CacheEntry = Tuple[float, Optional[Ink]]
+
+
+class InkCacheStats(NamedTuple):
+    """NamedTuple for reporting the state of an InkCache."""
+
+    size: int
+    hits: int
+    misses: int
+
+
+class InkCache:
+    """Size-bounded LRU cache of ink lookups with expiry, None meaning the ink wasn't found."""
+
+    def __init__(
+            self,
+            size: int = DEFAULT_CACHE_SIZE,
+            ttl: float = DEFAULT_TTL,
+            negative_ttl: float = DEFAULT_NEGATIVE_TTL) -> None:
+        self.size = max(1, size)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> InkCacheStats:
+        """Get the size of the cache and its hit and miss counts."""
+        return InkCacheStats(size=len(self.entries), hits=self.hits, misses=self.misses)
+
+    def get(self, name: str) -> Tuple[bool, Optional[Ink]]:
+        """
+        Look up a normalised ink name.
+
+        Returns whether the name was in the cache, and the ink if it was found by the API.
+        """
+        entry = self.entries.get(name)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[name]
+            self.misses += 1
+            return False, None
+
+        self.entries.move_to_end(name)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, name: str, ink: Optional[Ink], ttl: Optional[float] = None) -> None:
+        """
+        Remember the result of looking up a normalised ink name, evicting the least recently used names.
+
+        By default the result is kept for ttl or negative_ttl seconds, depending on whether the ink was found.
+        """
+        if ttl is None:
+            ttl = self.ttl if ink is not None else self.negative_ttl
+        self.entries[name] = (time.monotonic() + ttl, ink)
+        self.entries.move_to_end(name)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every cached lookup."""
+        self.entries.clear()
@@ -0,0 +1,300 @@
+"""
+Local, offline catalogue of inks.
+
+Rather than asking the Ink API about every {ink} mentioned, the Inkcyclopedia
+keeps its own copy of the API's ink list in an SQLite database. Names are
+resolved locally by exact match, then by prefix, then by the share of
+trigrams (three letter sequences) they have in common with a catalogued ink,
+all of which are index lookups. Only names which can't be resolved locally
+are looked up in the API.
+
+The catalogue is synced from the API's list endpoint or imported from a JSON
+file. Syncs are incremental, only inks which have changed since the last sync
+are rewritten, and all the database work runs on the database writer thread.
+Lookups run on the reader threads, so they never hold up the event loop.
+"""
+
+import hashlib
+import json
+import logging
+from sqlite3 import Connection
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.async_helpers import run_transaction
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.colors import GREEN
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.colors import YELLOW_B
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+from mrfreeze.lib.inkcyclopedia.ink import normalise
+
+DEFAULT_DBPATH = "inks.db"
+
+# The smallest share of trigrams a name must have in common with an ink to match it.
+MIN_SIMILARITY = 0.5
+
+# Names shorter than this only match exactly, not by prefix.
+MIN_PREFIX = 4
+
+# Number of trigram candidates to score for each lookup.
+TRIGRAM_CANDIDATES = 10
+
+# A sync listing fewer than this share of the catalogued inks doesn't remove any,
+# the API is far more likely to be broken than to have lost most of its inks.
+MIN_SYNC_SHARE = 0.5
+
+tables = [
+    """CREATE TABLE IF NOT EXISTS inks (
+        id          text PRIMARY KEY,
+        norm        text NOT NULL,
+        name        text NOT NULL,
+        url         text NOT NULL,
+        submitter   text,
+        review      text,
+        alternates  text,
+        trigrams    integer NOT NULL,
+        checksum    text NOT NULL);""",
+    "CREATE INDEX IF NOT EXISTS inks_norm ON inks (norm);",
+    """CREATE TABLE IF NOT EXISTS ink_trigrams (
+        trigram     text NOT NULL,
+        id          text NOT NULL,
+        PRIMARY KEY (trigram, id)) WITHOUT ROWID;""",
+    "CREATE INDEX IF NOT EXISTS ink_trigrams_id ON ink_trigrams (id);",
+]
+
+columns = "inks.id, inks.name, inks.url, inks.submitter, inks.review, inks.alternates"
+
+
+class SyncResult(NamedTuple):
+    """NamedTuple for reporting what a sync changed in the catalogue."""
+
+    added: int
+    updated: int
+    removed: int
+    unchanged: int
+
+
+def trigrams(norm: str) -> Set[str]:
+    """Get the trigrams of a normalised name, padded so that short names and word edges count too."""
+    padded = f"  {norm} "
+    return { padded[i:i + 3] for i in range(len(padded) - 2) }
+
+
+def checksum(entry: Dict[str, Any]) -> str:
+    """Get a checksum of an API entry, used to detect which inks have changed."""
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+
+
+def ink_from_row(row: Tuple[Any, ...]) -> Ink:
+    """Create an Ink from a row of the inks table, with the columns in the order of columns."""
+    ink = Ink()
+    ink.id, ink.name, ink.url, ink.submitter, ink.review, alternates = row
+    ink.alternates = json.loads(alternates) if alternates else list()
+    return ink
+
+
+def read_file(path: str) -> Any:
+    """Read a JSON file."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def entries_from(body: Any) -> List[Dict[str, Any]]:
+    """
+    Get the list of ink entries out of an API list response or catalogue file.
+
+    Raises ValueError if there's no list of inks, such as for an error response.
+    """
+    if isinstance(body, dict) and ("inks" in body or "found" in body):
+        body = body.get("inks", body.get("found"))
+    if isinstance(body, dict):
+        # Inks keyed by their IDs or names.
+        body = [ entry for entry in body.values() if isinstance(entry, dict) ]
+        if not body:
+            raise ValueError("expected a list of inks")
+    if not isinstance(body, list):
+        raise ValueError("expected a list of inks")
+    return [ entry for entry in body if isinstance(entry, dict) ]
+
+
+def apply_entries(conn: Connection, entries: Iterable[Dict[str, Any]], remove_missing: bool) -> SyncResult:
+    """
+    Write the given API entries to the catalogue, skipping the ones that haven't changed.
+
+    With remove_missing, inks which aren't among the entries are removed.
+    """
+    existing: Dict[str, str] = dict(conn.execute("SELECT id, checksum FROM inks"))
+    seen: Set[str] = set()
+    added = updated = unchanged = 0
+
+    for entry in entries:
+        ink = Ink.from_api(entry)
+        if ink is None or ink.name is None:
+            continue
+
+        norm = normalise(ink.name)
+        ink_id = str(ink.id) if ink.id is not None else norm
+        if ink_id in seen:
+            continue
+        seen.add(ink_id)
+
+        digest = checksum(entry)
+        old = existing.get(ink_id)
+        if old == digest:
+            unchanged += 1
+            continue
+
+        grams = trigrams(norm)
+        alternates = json.dumps(ink.alternates) if ink.alternates else None
+        conn.execute(
+            "INSERT OR REPLACE INTO inks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (ink_id, norm, ink.name, ink.url, ink.submitter, ink.review, alternates, len(grams), digest))
+        conn.execute("DELETE FROM ink_trigrams WHERE id = ?", (ink_id,))
+        conn.executemany("INSERT INTO ink_trigrams VALUES (?, ?)", [ (gram, ink_id) for gram in grams ])
+
+        if old is None:
+            added += 1
+        else:
+            updated += 1
+
+    removed = 0
+    if remove_missing:
+        for ink_id in existing.keys() - seen:
+            conn.execute("DELETE FROM inks WHERE id = ?", (ink_id,))
+            conn.execute("DELETE FROM ink_trigrams WHERE id = ?", (ink_id,))
+            removed += 1
+
+    return SyncResult(added, updated, removed, unchanged)
+
+
+class InkCatalogue:
+    """The local ink catalogue, stored in the SQLite database at dbpath."""
+
+    def __init__(self, logger: logging.Logger, dbpath: str = DEFAULT_DBPATH) -> None:
+        self.dbpath = dbpath
+        self.logger = logger
+        self.name = "ink catalogue"
+        self.size = 0
+
+    def create_tables(self) -> bool:
+        """Create the catalogue tables if they don't exist, and count the catalogued inks."""
+        try:
+            with connections.connection(self.dbpath) as conn:
+                for table in tables:
+                    conn.execute(table)
+                self.size = conn.execute("SELECT COUNT(*) FROM inks").fetchone()[0]
+        except Exception as e:
+            self.errorlog(f"failed to create tables: {e}")
+            return False
+
+        self.infolog(f"{self.size} inks in the catalogue")
+        return True
+
+    def lookup(self, name: str) -> Optional[Ink]:
+        """
+        Resolve a normalised name to a catalogued ink, or None if there's no good match.
+
+        This queries the database and waits for a pooled connection, so from
+        inside the event loop use lookup_async instead.
+        """
+        if not self.size or not name:
+            return None
+
+        with connections.connection(self.dbpath) as conn:
+            row = conn.execute(f"SELECT {columns} FROM inks WHERE norm = ?", (name,)).fetchone()
+            if row is not None:
+                return ink_from_row(row)
+
+            # The shortest ink starting with the name.
+            if len(name) >= MIN_PREFIX:
+                row = conn.execute(
+                    f"SELECT {columns} FROM inks WHERE norm > ? AND norm < ? ORDER BY length(norm) LIMIT 1",
+                    (name, name + "\uffff")).fetchone()
+                if row is not None:
+                    return ink_from_row(row)
+
+            grams = trigrams(name)
+            placeholders = ", ".join([ "?" ] * len(grams))
+            candidates = conn.execute(
+                f"""SELECT inks.trigrams, COUNT(*) AS shared, {columns}
+                FROM ink_trigrams JOIN inks USING (id)
+                WHERE ink_trigrams.trigram IN ({placeholders})
+                GROUP BY ink_trigrams.id
+                ORDER BY shared DESC
+                LIMIT ?""",
+                (*grams, TRIGRAM_CANDIDATES)).fetchall()
+
+        best: Optional[Tuple[Any, ...]] = None
+        best_score = 0.0
+        for count, shared, *row in candidates:
+            score = shared / (len(grams) + count - shared)
+            if score > best_score:
+                best, best_score = tuple(row), score
+
+        if best is None or best_score < MIN_SIMILARITY:
+            return None
+        return ink_from_row(best)
+
+    async def lookup_async(self, name: str) -> Optional[Ink]:
+        """Resolve a normalised name to a catalogued ink on one of the database reader threads."""
+        return await executor.read(self.lookup, name)
+
+    async def apply(self, entries: List[Dict[str, Any]], remove_missing: bool) -> SyncResult:
+        """Write entries to the catalogue on the database writer thread."""
+        result = await executor.write(
+            run_transaction,
+            self.dbpath,
+            lambda conn: apply_entries(conn, entries, remove_missing))
+        self.size += result.added - result.removed
+        return result
+
+    async def sync(self, client: InkClient) -> Optional[SyncResult]:
+        """Sync the catalogue with the API's list of inks, None if the sync failed."""
+        try:
+            entries = entries_from(await client.list_inks())
+            remove_missing = bool(entries) and len(entries) >= self.size * MIN_SYNC_SHARE
+            if not remove_missing:
+                self.errorlog(f"the Ink API only listed {len(entries)} of {self.size} inks, not removing any")
+            result = await self.apply(entries, remove_missing=remove_missing)
+        except Exception as e:
+            self.errorlog(f"failed to sync with the Ink API: {e!r}")
+            return None
+
+        self.infolog(f"synced with the Ink API: {self.format_result(result)}")
+        return result
+
+    async def import_file(self, path: str) -> Optional[SyncResult]:
+        """Add the inks in a JSON file to the catalogue, None if the import failed."""
+        try:
+            entries = entries_from(await executor.read(read_file, path))
+            result = await self.apply(entries, remove_missing=False)
+        except Exception as e:
+            self.errorlog(f"failed to import {path}: {e!r}")
+            return None
+
+        self.infolog(f"imported {path}: {self.format_result(result)}")
+        return result
+
+    def format_result(self, result: SyncResult) -> str:
+        """Describe the result of a sync."""
+        return (
+            f"{result.added} added, {result.updated} updated, {result.removed} removed, "
+            f"{result.unchanged} unchanged, {self.size} in total")
+
+    def infolog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
+
+    def errorlog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {MAGENTA}{msg}{RESET}")
@@ -0,0 +1,128 @@
+"""
+Asynchronous client for the Ink API.
+
+The Inkcyclopedia used to call the API with the blocking requests library,
+which froze the whole bot for as long as each lookup took. The InkClient
+instead keeps a pooled aiohttp session, reusing kept-alive connections
+between lookups, limiting the number of connections to the API and giving
+up on lookups that take longer than a strict total timeout. Searches go
+through a circuit breaker, which stops sending them while the API is failing
+and adapts the timeout to how long searches normally take.
+"""
+
+import asyncio
+import time
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import aiohttp
+
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitBreaker
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitOpenError
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+from mrfreeze.lib.inkcyclopedia.ink import normalise
+
+# Seconds a lookup may take in total, including connecting and reading the response.
+# This is the upper bound, the circuit breaker lowers it when the API is responding quickly.
+DEFAULT_TIMEOUT = 5.0
+
+# Maximum number of simultaneous connections to the API.
+DEFAULT_CONNECTION_LIMIT = 4
+
+# Seconds fetching the full list of inks may take.
+DEFAULT_LIST_TIMEOUT = 60.0
+
+# Seconds an idle connection is kept open for reuse.
+DEFAULT_KEEPALIVE = 30.0
+
+
+def parse_response(body: Dict[str, Any]) -> Dict[str, Ink]:
+    """Get the complete inks out of an Ink API search response, keyed by their normalised search names."""
+    found = body.get("found") or dict()
+    result: Dict[str, Ink] = dict()
+    for name, entry in found.items():
+        ink = Ink.from_api(entry)
+        if ink is not None:
+            result[normalise(name)] = ink
+    return result
+
+
+class InkClient:
+    """Pooled HTTP client for the Ink API, the session is created on first use."""
+
+    def __init__(
+            self,
+            url: str,
+            timeout: float = DEFAULT_TIMEOUT,
+            limit: int = DEFAULT_CONNECTION_LIMIT,
+            keepalive: float = DEFAULT_KEEPALIVE) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.limit = max(1, limit)
+        self.keepalive = keepalive
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.breaker = CircuitBreaker(max_timeout=timeout)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Get the session, creating it if there isn't an open one. Must be called from a coroutine."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit,
+                keepalive_timeout=self.keepalive)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                raise_for_status=True)
+        return self.session
+
+    async def search(self, names: List[str]) -> Dict[str, Ink]:
+        """
+        Search for the listed inks, return the ones that were found keyed by their normalised names.
+
+        Raises CircuitOpenError without making a request while the circuit breaker is open,
+        asyncio.TimeoutError if the lookup takes too long and aiohttp.ClientError if the API
+        can't be reached or returns an error.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("the Ink API is failing, not sending any requests for now")
+
+        session = self.get_session()
+        timeout = aiohttp.ClientTimeout(total=self.breaker.timeout())
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{self.url}/search", json=names, timeout=timeout) as response:
+                body = await response.json(content_type=None)
+            result = parse_response(body)
+        except asyncio.CancelledError:
+            self.breaker.abandoned()
+            raise
+        except aiohttp.ClientResponseError as e:
+            # Client errors mean the request was wrong, not that the API is failing.
+            if e.status < 500:
+                self.breaker.succeeded(time.perf_counter() - start)
+            else:
+                self.breaker.failed(time.perf_counter() - start)
+            raise
+        except Exception:
+            self.breaker.failed(time.perf_counter() - start)
+            raise
+
+        self.breaker.succeeded(time.perf_counter() - start)
+        return result
+
+    async def list_inks(self) -> Any:
+        """Fetch the API's full list of inks, this may take a while so it has a timeout of its own."""
+        session = self.get_session()
+        timeout = aiohttp.ClientTimeout(total=DEFAULT_LIST_TIMEOUT)
+        async with session.get(self.url, timeout=timeout) as response:
+            return await response.json(content_type=None)
+
+    async def close(self) -> None:
+        """Close the session and all of its connections."""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
@@ -0,0 +1,51 @@
+"""The Ink class, shared by the Inkcyclopedia cog and its helpers."""
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+class Ink:
+    """A class used to store information pertaining to an ink entry."""
+
+    id:         Optional[str]
+    name:       Optional[str]
+    url:        Optional[str]
+    submitter:  Optional[str]
+    alternates: List[str]
+    review:     Optional[str]
+
+    def __init__(self) -> None:
+        self.id = None
+        self.name = None
+        self.url = None
+        self.submitter = None
+        self.alternates = list()
+        self.review = None
+
+    @classmethod
+    def from_api(cls, body: Dict[str, Any]) -> Optional["Ink"]:
+        """Create an Ink from an entry in an Ink API response, or None if the entry is incomplete."""
+        if "fullName" not in body or "primaryImage" not in body:
+            return None
+
+        ink = cls()
+        ink.id = body.get("id")
+        ink.name = body.get("fullName")
+        ink.url = body.get("primaryImage")
+        ink.submitter = body.get("submittedBy")
+        ink.review = body.get("reviewLink")
+
+        alternates = body.get("alternateImages")
+        if alternates:
+            ink.alternates = alternates
+
+        if ink.name and ink.url:
+            return ink
+        return None
+
+
+def normalise(name: str) -> str:
+    """Normalise an ink name for lookups, ignoring case and extra whitespace."""
+    return " ".join(name.lower().split())
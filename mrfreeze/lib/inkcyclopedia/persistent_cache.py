@@ -0,0 +1,176 @@
+"""
+On-disk cache of Ink API lookups, surviving restarts.
+
+The in-memory InkCache starts out empty every time the bot starts, which
+would send every lookup back to the API. The PersistentInkCache keeps the
+result of every API lookup in the ink database as well, along with when it
+was fetched and last used. Lookups missing the in-memory cache are warmed
+from it one name at a time, so startup doesn't have to load anything.
+
+Entries older than their ttl are still served, but are refreshed from the
+API in the background, most recently used first, so the inks people
+actually ask about are always served locally.
+"""
+
+import json
+import logging
+import time
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from mrfreeze.database.async_helpers import db_fetch_async
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.database.write_behind import WriteBehindQueue
+from mrfreeze.lib.colors import GREEN
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.colors import YELLOW_B
+from mrfreeze.lib.inkcyclopedia.cache import DEFAULT_NEGATIVE_TTL
+from mrfreeze.lib.inkcyclopedia.cache import DEFAULT_TTL
+from mrfreeze.lib.inkcyclopedia.catalogue import DEFAULT_DBPATH
+from mrfreeze.lib.inkcyclopedia.catalogue import ink_from_row
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+
+# Number of stale entries refreshed per round.
+DEFAULT_REFRESH_BATCH = 50
+
+table = """CREATE TABLE IF NOT EXISTS ink_lookups (
+    name        text PRIMARY KEY,
+    id          text,
+    fullname    text,
+    url         text,
+    submitter   text,
+    review      text,
+    alternates  text,
+    fetched     real NOT NULL,
+    used        real NOT NULL);"""
+index = "CREATE INDEX IF NOT EXISTS ink_lookups_used ON ink_lookups (used);"
+
+upsert = "INSERT OR REPLACE INTO ink_lookups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+touch = "UPDATE ink_lookups SET used = ? WHERE name = ?"
+
+
+class StoredLookup(NamedTuple):
+    """NamedTuple for a lookup read back from disk, ink is None if the API didn't know it."""
+
+    ink: Optional[Ink]
+    fetched: float
+
+    def age(self) -> float:
+        """Seconds since the lookup was fetched from the API."""
+        return time.time() - self.fetched
+
+
+class PersistentInkCache:
+    """Ink API lookups stored in the SQLite database at dbpath, written in batches by a write-behind queue."""
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            dbpath: str = DEFAULT_DBPATH,
+            ttl: float = DEFAULT_TTL,
+            negative_ttl: float = DEFAULT_NEGATIVE_TTL) -> None:
+        self.dbpath = dbpath
+        self.logger = logger
+        self.name = "ink lookups"
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.ready = False
+        self.writes = WriteBehindQueue(dbpath, logger)
+
+    def create_table(self) -> bool:
+        """Create the table if it doesn't exist, lookups are only read and written once it does."""
+        try:
+            with connections.connection(self.dbpath) as conn:
+                conn.execute(table)
+                conn.execute(index)
+        except Exception as e:
+            self.errorlog(f"failed to create table: {e}")
+            return False
+
+        self.ready = True
+        return True
+
+    def expires_in(self, stored: StoredLookup) -> float:
+        """Seconds until a stored lookup is stale, negative if it already is."""
+        ttl = self.ttl if stored.ink is not None else self.negative_ttl
+        return ttl - stored.age()
+
+    def read(self, name: str) -> Optional[StoredLookup]:
+        """
+        Read the stored lookup of a normalised ink name, None if there isn't one.
+
+        This queries the database, so from inside the event loop use load instead.
+        """
+        if not self.ready:
+            return None
+
+        with connections.connection(self.dbpath) as conn:
+            row = conn.execute(
+                "SELECT id, fullname, url, submitter, review, alternates, fetched FROM ink_lookups WHERE name = ?",
+                (name,)).fetchone()
+
+        if row is None:
+            return None
+
+        ink = ink_from_row(row[:6]) if row[2] is not None else None
+        return StoredLookup(ink, row[6])
+
+    async def load(self, name: str) -> Optional[StoredLookup]:
+        """Read the stored lookup of a normalised ink name on a database reader thread, marking it as used."""
+        if not self.ready:
+            return None
+
+        stored = await executor.read(self.read, name)
+        if stored is not None:
+            self.writes.enqueue(("used", name), touch, (time.time(), name))
+        return stored
+
+    def save(self, name: str, ink: Optional[Ink]) -> None:
+        """Queue the result of looking up a normalised ink name in the API for writing."""
+        if not self.ready:
+            return
+
+        now = time.time()
+        if ink is None:
+            values = (name, None, None, None, None, None, None, now, now)
+        else:
+            alternates = json.dumps(ink.alternates) if ink.alternates else None
+            values = (name, ink.id, ink.name, ink.url, ink.submitter, ink.review, alternates, now, now)
+
+        self.writes.enqueue(("lookup", name), upsert, values)
+
+    async def stale(self, limit: int = DEFAULT_REFRESH_BATCH) -> List[str]:
+        """Get the names of up to limit stale lookups, the most recently used first."""
+        if not self.ready:
+            return list()
+
+        now = time.time()
+        query = await db_fetch_async(
+            self.dbpath,
+            """SELECT name FROM ink_lookups
+            WHERE (url IS NOT NULL AND fetched < ?) OR (url IS NULL AND fetched < ?)
+            ORDER BY used DESC
+            LIMIT ?""",
+            (now - self.ttl, now - self.negative_ttl, limit))
+
+        if query.error is not None:
+            self.errorlog(f"failed to fetch stale lookups: {query.error}")
+            return list()
+        return [ row[0] for row in query.output ]
+
+    async def close(self) -> None:
+        """Write everything still queued to disk."""
+        if self.ready:
+            await self.writes.close()
+
+    def infolog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
+
+    def errorlog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {MAGENTA}{msg}{RESET}")
@@ -68,10 +68,10 @@ def get_message(ctx: Context, bot: MrFreeze, default_template: Template) -> str:
     return f"{ctx.author.mention} The welcome message for this server is:\n{msg}"
 
 
-def set_message(ctx: Context, bot: MrFreeze) -> str:
+async def set_message(ctx: Context, bot: MrFreeze) -> str:
     """Set the server's leave message."""
     new_msg = default.command_free_content(ctx)
-    was_set = bot.settings.set_leave_message_by_id(ctx.guild, new_msg)
+    was_set = await bot.settings.set_leave_message_by_id_async(ctx.guild, new_msg)
 
     if was_set:
         return f"{ctx.author.mention} The leave message has been set to:\n{new_msg}"
@@ -79,9 +79,9 @@ def set_message(ctx: Context, bot: MrFreeze) -> str:
         return f"{ctx.author.mention} Something went awry, I couldn't change your leave message."
 
 
-def unset_message(ctx: Context, bot: MrFreeze) -> str:
+async def unset_message(ctx: Context, bot: MrFreeze) -> str:
     """Unset the server's leave message, reverting to the default."""
-    was_unset = bot.settings.set_leave_message_by_id(ctx.guild, None)
+    was_unset = await bot.settings.set_leave_message_by_id_async(ctx.guild, None)
 
     if was_unset:
         return f"{ctx.author.mention} The leave message has been reset to bot default. :ok_hand:"
@@ -146,7 +146,7 @@ async def set_channel(ctx: Context, coginfo: CogInfo, channel: Optional[TextChan
 
     # Try to change the channel, give responses accordingly
     new_value = channel.id if channel else channel
-    channel_set = bot.settings.set_leave_channel_by_id(ctx.guild, new_value)
+    channel_set = await bot.settings.set_leave_channel_by_id_async(ctx.guild, new_value)
 
     if not channel_set:
         return f"{ctx.author.mention} Sorry, something went wrong when setting the leave messages channel."
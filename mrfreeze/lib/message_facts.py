@@ -0,0 +1,137 @@
+"""
+Shared pre-processing of incoming messages.
+
+Rather than every cog registering its own on_message listener, and each of
+them building the command context and checking the same things over again,
+MrFreeze builds the context and a MessageFacts object once for every message.
+Cogs subscribe to the result with the message_listener decorator, declaring
+which messages they're interested in, and are only called for those.
+"""
+
+import re
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from discord import Message
+from discord import MessageType
+from discord.ext.commands import Context
+
+# Attribute set on methods decorated with message_listener.
+LISTENER_ATTRIBUTE = "__message_filter__"
+
+has_digit = re.compile(r"\d").search
+
+
+class MessageFacts:
+    """
+    Everything the message listeners need to know about a message, worked out once.
+
+    Like with the bot's own command processing, no context is built for messages from bots.
+    """
+
+    __slots__ = (
+        "message",
+        "ctx",
+        "is_bot",
+        "is_private",
+        "muted",
+        "is_command",
+        "has_digits",
+        "has_brace",
+        "is_pin_notice",
+    )
+
+    def __init__(self, message: Message, ctx: Optional[Context], muted: int) -> None:
+        content = message.content
+        self.message = message
+        self.ctx = ctx
+        self.is_bot: bool = message.author.bot
+        self.is_private = message.guild is None
+        self.muted = muted
+        self.is_command = ctx is not None and ctx.command is not None
+        self.has_digits = has_digit(content) is not None
+        self.has_brace = "{" in content
+        self.is_pin_notice = message.type == MessageType.pins_add
+
+
+class MessageFilter(NamedTuple):
+    """
+    Declares which messages a message listener wants.
+
+    bots:       also accept messages from bots.
+    blocked_by: MutedFeature bits, the listener is skipped if any of them are muted in the server.
+    commands:   True to only accept commands, False to only accept non-commands, None for both.
+    has_digits: only accept messages containing a digit.
+    has_brace:  only accept messages containing a curly bracket.
+    pin_notice: only accept the system messages saying a message was pinned.
+    """
+
+    bots: bool = False
+    blocked_by: int = 0
+    commands: Optional[bool] = None
+    has_digits: bool = False
+    has_brace: bool = False
+    pin_notice: bool = False
+
+    def matches(self, facts: MessageFacts) -> bool:
+        """Check if a message passes the filter."""
+        return not (
+            (facts.is_bot and not self.bots) or
+            facts.muted & self.blocked_by or
+            (self.commands is not None and facts.is_command != self.commands) or
+            (self.has_digits and not facts.has_digits) or
+            (self.has_brace and not facts.has_brace) or
+            (self.pin_notice and not facts.is_pin_notice)
+        )
+
+
+MessageCallback = Callable[[MessageFacts], Awaitable[None]]
+
+
+def message_listener(**filters: Any) -> Callable[[Callable], Callable]:
+    """
+    Mark a cog method as a message listener, see MessageFilter for the filters.
+
+    The method is called with the MessageFacts of every message passing the filters.
+    """
+    message_filter = MessageFilter(**filters)
+
+    def decorator(func: Callable) -> Callable:
+        setattr(func, LISTENER_ATTRIBUTE, message_filter)
+        return func
+
+    return decorator
+
+
+class MessagePipeline:
+    """The message listeners subscribed to the shared message pre-processing."""
+
+    def __init__(self) -> None:
+        self.listeners: List[Tuple[MessageCallback, MessageFilter]] = list()
+
+    def subscribe(self, callback: MessageCallback, message_filter: MessageFilter) -> None:
+        """Call callback with the facts of every message that passes the filter."""
+        self.listeners.append((callback, message_filter))
+
+    def subscribe_cog(self, cog: Any) -> None:
+        """Subscribe all methods of a cog decorated with message_listener."""
+        for name in dir(type(cog)):
+            message_filter = getattr(getattr(type(cog), name), LISTENER_ATTRIBUTE, None)
+            if isinstance(message_filter, MessageFilter):
+                self.subscribe(getattr(cog, name), message_filter)
+
+    def unsubscribe_cog(self, cog: Any) -> None:
+        """Remove all listeners belonging to a cog."""
+        self.listeners = [
+            (callback, message_filter) for callback, message_filter in self.listeners
+            if getattr(callback, "__self__", None) is not cog
+        ]
+
+    def matching(self, facts: MessageFacts) -> List[MessageCallback]:
+        """Get the listeners that want a message."""
+        return [ callback for callback, message_filter in self.listeners if message_filter.matches(facts) ]
@@ -0,0 +1,209 @@
+"""
+Crawling the pins in every channel.
+
+The PinHandler needs to know which messages are pinned in every channel to
+tell if a pin was added or removed. Fetching them one channel at a time on
+startup took ages, and no pin event could be handled until every channel
+was done. Now the pins are stored in the PinIndex, and the PinCrawler is
+the slow background sweep which revalidates the channels it lists.
+
+The PinCrawler fetches the pins of up to concurrency channels at a time.
+Channels are crawled guild by guild, so each guild becomes ready as soon as
+its own channels are done, and a channel can be used as soon as it has been
+crawled. Channels fetched in the meantime because of a pin event are skipped.
+
+Every pins request goes through its own rate limit bucket, which discord.py
+keeps track of, but they all count towards the bot's global rate limit. The
+crawler spaces its requests out to stay under max_rate per second, leaving
+room for the rest of the bot. If a request is rate limited regardless, every
+worker backs off for as long as Discord asks before the channel is retried.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Set
+
+import discord
+from discord import TextChannel
+
+from mrfreeze.lib.colors import CYAN
+from mrfreeze.lib.colors import CYAN_B
+from mrfreeze.lib.colors import GREEN_B
+from mrfreeze.lib.colors import RED_B
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.pins.index import PinIndex
+
+# Number of channels whose pins are fetched at the same time.
+DEFAULT_CONCURRENCY = 2
+
+# Most pins requests sent per second, the sweep is low priority.
+DEFAULT_MAX_RATE = 5.0
+
+# Number of times a rate limited channel is retried.
+MAX_RETRIES = 3
+
+# Seconds to back off when a rate limited response doesn't say how long to wait.
+DEFAULT_RETRY_AFTER = 5.0
+
+
+class CrawlStats(NamedTuple):
+    """NamedTuple for reporting the progress of a crawl, elapsed is in seconds."""
+
+    guilds: int
+    guilds_ready: int
+    channels: int
+    crawled: int
+    failed: int
+    rate_limited: int
+    elapsed: float
+
+
+def retry_after(error: discord.HTTPException) -> float:
+    """Get the seconds to wait after a rate limited request."""
+    try:
+        return float(error.response.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class PinCrawler:
+    """Fetches the pins in a set of channels into a PinIndex, a few at a time."""
+
+    def __init__(
+            self,
+            index: PinIndex,
+            logger: logging.Logger,
+            concurrency: int = DEFAULT_CONCURRENCY,
+            max_rate: float = DEFAULT_MAX_RATE) -> None:
+        self.index = index
+        self.logger = logger
+        self.concurrency = max(1, concurrency)
+        self.interval = 1 / max_rate if max_rate > 0 else 0.0
+
+        # Channels which haven't been crawled yet, by guild.
+        self.pending: Dict[int, Set[int]] = dict()
+
+        self.started = False
+        self.next_request = 0.0
+        self.guilds = self.guilds_ready = 0
+        self.channels = self.crawled = self.failed = self.rate_limited = 0
+        self.start_time = self.end_time = 0.0
+
+    def ready(self, channel: TextChannel) -> bool:
+        """
+        Check if the crawl is done with a channel.
+
+        Channels which weren't listed when the crawl started are ready
+        straight away.
+        """
+        return self.started and channel.id not in self.pending.get(channel.guild.id, ())
+
+    def guild_ready(self, guild_id: int) -> bool:
+        """Check if every channel in a guild has been crawled."""
+        return self.started and guild_id not in self.pending
+
+    async def crawl(self, channels: Iterable[TextChannel]) -> CrawlStats:
+        """Fetch the pins in the channels, return the final progress."""
+        by_guild: Dict[int, List[TextChannel]] = dict()
+        for channel in channels:
+            by_guild.setdefault(channel.guild.id, list()).append(channel)
+
+        self.pending = { guild: { channel.id for channel in chans } for guild, chans in by_guild.items() }
+        self.started = True
+        self.guilds = len(by_guild)
+        self.guilds_ready = self.crawled = self.failed = self.rate_limited = 0
+        self.channels = sum([ len(chans) for chans in by_guild.values() ])
+        self.start_time = time.monotonic()
+        self.end_time = 0.0
+
+        # Waiters on a semaphore are woken in order, so channels are crawled guild by guild.
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*[
+            self.crawl_channel(channel, semaphore)
+            for chans in by_guild.values()
+            for channel in chans
+        ])
+
+        self.end_time = time.monotonic()
+        stats = self.stats()
+        msg = f"{CYAN_B}Pins swept: {CYAN}{stats.crawled} channels in {stats.guilds} guilds, "
+        msg += f"{stats.failed} failed, {stats.rate_limited} rate limited, {stats.elapsed:.1f}s{RESET}"
+        self.logger.info(msg)
+        return stats
+
+    async def crawl_channel(self, channel: TextChannel, semaphore: asyncio.Semaphore) -> None:
+        """Fetch the pins in a channel, retrying it if it's rate limited."""
+        async with semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                if channel.id in self.index.validated:
+                    break
+
+                await self.wait_turn()
+                try:
+                    pins = await channel.pins()
+                except discord.HTTPException as e:
+                    if e.status == 429 and attempt < MAX_RETRIES:
+                        self.rate_limited += 1
+                        self.back_off(retry_after(e))
+                        continue
+                    self.fetch_failed(channel, e)
+                except Exception as e:
+                    self.fetch_failed(channel, e)
+                else:
+                    self.index.update(channel, [ message.id for message in pins ])
+                    self.crawled += 1
+
+                    log = f"{CYAN}{len(pins)} pins in {RED_B}{channel.guild.name} "
+                    log += f"{GREEN_B}#{channel.name}{RESET}"
+                    self.logger.debug(log)
+                break
+
+        self.channel_done(channel)
+
+    async def wait_turn(self) -> None:
+        """Wait until the next request may be sent."""
+        now = time.monotonic()
+        start = max(now, self.next_request)
+        self.next_request = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def back_off(self, seconds: float) -> None:
+        """Hold back every request for a number of seconds."""
+        self.next_request = max(self.next_request, time.monotonic() + seconds)
+
+    def fetch_failed(self, channel: TextChannel, error: Exception) -> None:
+        """Log a channel whose pins couldn't be fetched, it has probably been deleted or hidden from us."""
+        self.failed += 1
+        log = f"Encountered {error} fetching pins from {RED_B}{channel.guild.name} "
+        log += f"{GREEN_B}{channel.name}{RESET}"
+        self.logger.error(log)
+
+    def channel_done(self, channel: TextChannel) -> None:
+        """Mark a channel as crawled, and its guild as ready if it was the last one."""
+        pending = self.pending.get(channel.guild.id)
+        if pending is None:
+            return
+
+        pending.discard(channel.id)
+        if not pending:
+            del self.pending[channel.guild.id]
+            self.guilds_ready += 1
+            self.logger.info(f"{CYAN}Pins ready in {RED_B}{channel.guild.name}{RESET}")
+
+    def stats(self) -> CrawlStats:
+        """Get the progress of the current or last crawl."""
+        end = self.end_time or time.monotonic()
+        return CrawlStats(
+            guilds = self.guilds,
+            guilds_ready = self.guilds_ready,
+            channels = self.channels,
+            crawled = self.crawled,
+            failed = self.failed,
+            rate_limited = self.rate_limited,
+            elapsed = end - self.start_time if self.started else 0.0)
@@ -0,0 +1,128 @@
+"""
+Coalescing of pin events.
+
+Discord sends a pin event for every change to a channel's pins, so pinning
+or unpinning a handful of messages used to fetch the channel's pins once
+per change, which is an easy way to get rate limited. The PinDebouncer
+holds back the events of each channel until window seconds have passed
+without another one, or max_delay seconds since the first, and then
+reconciles the channel once for the whole burst.
+
+A channel is never reconciled twice at the same time. Events arriving while
+a reconciliation is running start another burst, reconciled once the
+running one is done.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import NamedTuple
+from typing import Set
+
+from discord import TextChannel
+
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RED_B
+from mrfreeze.lib.colors import RESET
+
+# Seconds without another event before a channel is reconciled.
+DEFAULT_WINDOW = 1.5
+
+# Most seconds a channel's events are held back, however long the burst.
+DEFAULT_MAX_DELAY = 5.0
+
+Reconcile = Callable[[TextChannel], Awaitable[None]]
+
+
+class DebouncerStats(NamedTuple):
+    """NamedTuple for reporting how many events a PinDebouncer has coalesced."""
+
+    events: int
+    reconciliations: int
+    waiting: int
+    running: int
+
+
+class PinDebouncer:
+    """Calls reconcile once for every burst of pin events in a channel."""
+
+    def __init__(
+            self,
+            reconcile: Reconcile,
+            logger: logging.Logger,
+            window: float = DEFAULT_WINDOW,
+            max_delay: float = DEFAULT_MAX_DELAY) -> None:
+        self.reconcile = reconcile
+        self.logger = logger
+        self.window = window
+        self.max_delay = max(window, max_delay)
+
+        # The timer of every channel with events waiting, and when the first of them arrived.
+        self.timers: Dict[int, asyncio.TimerHandle] = dict()
+        self.first: Dict[int, float] = dict()
+
+        # Channels being reconciled, and the ones with a burst waiting for that to finish.
+        self.running: Dict[int, "asyncio.Task[None]"] = dict()
+        self.again: Set[int] = set()
+
+        self.events = 0
+        self.reconciliations = 0
+
+    def push(self, channel: TextChannel) -> None:
+        """Add a pin event, putting off the channel's reconciliation until the burst is over."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.events += 1
+
+        first = self.first.setdefault(channel.id, now)
+        timer = self.timers.pop(channel.id, None)
+        if timer is not None:
+            timer.cancel()
+
+        delay = min(self.window, first + self.max_delay - now)
+        self.timers[channel.id] = loop.call_later(max(0.0, delay), self.fire, channel)
+
+    def fire(self, channel: TextChannel) -> None:
+        """Reconcile a channel whose burst is over, or once its running reconciliation is done."""
+        self.timers.pop(channel.id, None)
+        self.first.pop(channel.id, None)
+
+        if channel.id in self.running:
+            self.again.add(channel.id)
+            return
+
+        self.reconciliations += 1
+        self.running[channel.id] = asyncio.get_running_loop().create_task(self.run(channel))
+
+    async def run(self, channel: TextChannel) -> None:
+        """Reconcile a channel, then start over if another burst ended in the meantime."""
+        try:
+            await self.reconcile(channel)
+        except Exception as e:
+            self.logger.error(f"{MAGENTA}Failed to reconcile the pins in {RED_B}#{channel.name}{MAGENTA}: {e!r}{RESET}")
+        finally:
+            del self.running[channel.id]
+            if channel.id in self.again:
+                self.again.discard(channel.id)
+                self.fire(channel)
+
+    def cancel(self) -> None:
+        """Drop every waiting event and stop every running reconciliation."""
+        for timer in self.timers.values():
+            timer.cancel()
+        for task in self.running.values():
+            task.cancel()
+
+        self.timers.clear()
+        self.first.clear()
+        self.again.clear()
+
+    def stats(self) -> DebouncerStats:
+        """Get the number of events and reconciliations so far, and how many channels are waiting or running."""
+        return DebouncerStats(
+            events = self.events,
+            reconciliations = self.reconciliations,
+            waiting = len(self.timers),
+            running = len(self.running))
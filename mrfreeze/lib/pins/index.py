@@ -0,0 +1,143 @@
+"""
+Index of the pins in every channel, surviving restarts.
+
+The PinHandler used to count the pins of every channel from scratch on
+every on_ready, reconnects included, which is one request per channel. The
+PinIndex instead keeps the number of pins and the IDs of the pinned
+messages of every channel in an SQLite database, loaded with a single query
+at startup and written in batches by a write-behind queue.
+
+What's on disk may have changed while the bot was offline, so entries are
+revalidated lazily: a channel is fetched again on its first pin event, or
+by a slow background sweep of the channels which haven't been checked for
+max_age seconds. Restarting the bot doesn't fetch anything it checked
+recently.
+"""
+
+import logging
+import time
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from discord import TextChannel
+
+from mrfreeze.database.connections import connections
+from mrfreeze.database.write_behind import WriteBehindQueue
+from mrfreeze.lib.colors import GREEN
+from mrfreeze.lib.colors import MAGENTA
+from mrfreeze.lib.colors import RESET
+from mrfreeze.lib.colors import YELLOW_B
+
+DEFAULT_DBPATH = "pins.db"
+
+# Seconds after which a channel is checked again by the background sweep.
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+table = """CREATE TABLE IF NOT EXISTS pins (
+    channel     integer PRIMARY KEY,
+    guild       integer NOT NULL,
+    count       integer NOT NULL,
+    messages    text NOT NULL,
+    checked     real NOT NULL);"""
+
+upsert = "INSERT OR REPLACE INTO pins VALUES (?, ?, ?, ?, ?)"
+
+
+class PinState(NamedTuple):
+    """NamedTuple for the pins of a channel, messages are the IDs of the pinned messages, newest first."""
+
+    count: int
+    messages: Tuple[int, ...]
+    checked: float
+
+
+class PinIndex:
+    """The pins of every channel, stored in the SQLite database at dbpath."""
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            dbpath: str = DEFAULT_DBPATH,
+            max_age: float = DEFAULT_MAX_AGE) -> None:
+        self.dbpath = dbpath
+        self.logger = logger
+        self.name = "pin index"
+        self.max_age = max_age
+        self.ready = False
+        self.writes = WriteBehindQueue(dbpath, logger)
+
+        self.states: Dict[int, PinState] = dict()
+
+        # Channels which have been fetched since the bot started.
+        self.validated: Set[int] = set()
+
+    def load(self) -> bool:
+        """Create the table if it doesn't exist and read every stored channel into memory."""
+        try:
+            with connections.connection(self.dbpath) as conn:
+                conn.execute(table)
+                rows = conn.execute("SELECT channel, count, messages, checked FROM pins").fetchall()
+        except Exception as e:
+            self.errorlog(f"failed to load pins: {e}")
+            return False
+
+        for channel, count, messages, checked in rows:
+            ids = tuple([ int(message) for message in messages.split() ])
+            self.states[channel] = PinState(count, ids, checked)
+
+        self.ready = True
+        self.infolog(f"loaded the pins of {len(self.states)} channels")
+        return True
+
+    def get(self, channel_id: int) -> Optional[PinState]:
+        """Get the stored pins of a channel, None if it has never been fetched."""
+        return self.states.get(channel_id)
+
+    def update(self, channel: TextChannel, messages: Iterable[int]) -> PinState:
+        """Store the IDs of the messages pinned in a channel, newest first, as fetched just now."""
+        ids = tuple(messages)
+        state = PinState(len(ids), ids, time.time())
+        self.states[channel.id] = state
+        self.validated.add(channel.id)
+
+        if self.ready:
+            values = (channel.id, channel.guild.id, state.count, " ".join([ str(i) for i in ids ]), state.checked)
+            self.writes.enqueue(("pins", channel.id), upsert, values)
+        return state
+
+    def needs_check(self, channel_id: int) -> bool:
+        """Check if a channel should be fetched by the background sweep."""
+        if channel_id in self.validated:
+            return False
+        state = self.states.get(channel_id)
+        return state is None or time.time() - state.checked >= self.max_age
+
+    def sweep_order(self, channels: Iterable[TextChannel]) -> List[TextChannel]:
+        """Get the channels which should be swept, those never fetched first, then the longest unchecked."""
+        stale = [ channel for channel in channels if self.needs_check(channel.id) ]
+
+        def last_checked(channel: TextChannel) -> float:
+            state = self.states.get(channel.id)
+            return state.checked if state is not None else 0.0
+
+        # A stable sort, so channels which were never fetched stay in guild order.
+        stale.sort(key=last_checked)
+        return stale
+
+    async def close(self) -> None:
+        """Write everything still queued to disk."""
+        if self.ready:
+            await self.writes.close()
+
+    def infolog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
+
+    def errorlog(self, msg: str) -> None:
+        """Write a message to the log, prefixing it with the module name."""
+        self.logger.info(f"{YELLOW_B}{self.name} {MAGENTA}{msg}{RESET}")
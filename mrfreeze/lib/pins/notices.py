@@ -0,0 +1,104 @@
+"""
+Pin notices captured from the gateway.
+
+When a message is pinned Discord posts a system message saying who pinned
+it, which the PinHandler deletes and replaces with its own announcement.
+It used to find that message by fetching the channel's recent history. Now
+the notices are captured as they arrive through the message listeners, and
+matched with the pinned message they refer to.
+
+The notice and the pin event can arrive in either order, so a pin event
+may wait a little while for its notice to show up.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from discord import Message
+
+# Seconds a notice is kept around for its pin event.
+DEFAULT_TTL = 60.0
+
+# Seconds a pin event waits for its notice.
+DEFAULT_WAIT = 2.0
+
+# Most notices kept around at once.
+MAX_NOTICES = 256
+
+# (channel ID, ID of the pinned message), the message ID is None for notices which don't say.
+NoticeKey = Tuple[int, Optional[int]]
+
+
+def notice_key(notice: Message) -> NoticeKey:
+    """Get the key of a pin notice."""
+    reference = notice.reference
+    pinned = reference.message_id if reference is not None else None
+    return (notice.channel.id, pinned)
+
+
+class PinNotices:
+    """The pin notices which haven't been matched with their pin event yet."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, wait: float = DEFAULT_WAIT) -> None:
+        self.ttl = ttl
+        self.wait = wait
+        self.notices: "OrderedDict[NoticeKey, Tuple[Message, float]]" = OrderedDict()
+        self.waiters: Dict[NoticeKey, "asyncio.Future[Message]"] = dict()
+
+    def add(self, notice: Message) -> None:
+        """Store a pin notice, or hand it straight to the pin event waiting for it."""
+        key = notice_key(notice)
+        waiter = self.waiters.get(key)
+
+        # A notice which doesn't say what it's for goes to any pin event waiting in its channel.
+        if waiter is None and key[1] is None:
+            waiter = next((w for (channel, _), w in self.waiters.items() if channel == key[0]), None)
+
+        if waiter is not None and not waiter.done():
+            waiter.set_result(notice)
+            return
+
+        self.expire()
+        self.notices.pop(key, None)
+        self.notices[key] = (notice, time.monotonic())
+        while len(self.notices) > MAX_NOTICES:
+            self.notices.popitem(last=False)
+
+    def take(self, channel_id: int, message_id: int) -> Optional[Message]:
+        """Remove and get the stored notice for a pinned message, or one which doesn't say what it's for."""
+        self.expire()
+        for key in ((channel_id, message_id), (channel_id, None)):
+            entry = self.notices.pop(key, None)
+            if entry is not None:
+                return entry[0]
+        return None
+
+    async def find(self, channel_id: int, message_id: int) -> Optional[Message]:
+        """Get the notice for a pinned message, waiting up to wait seconds for it, None if it never shows up."""
+        notice = self.take(channel_id, message_id)
+        if notice is not None:
+            return notice
+
+        key = (channel_id, message_id)
+        waiter: "asyncio.Future[Message]" = asyncio.get_running_loop().create_future()
+        self.waiters[key] = waiter
+        try:
+            return await asyncio.wait_for(waiter, timeout=self.wait)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self.waiters.get(key) is waiter:
+                del self.waiters[key]
+
+    def expire(self) -> None:
+        """Forget notices older than ttl seconds, the oldest are first."""
+        oldest = time.monotonic() - self.ttl
+        while self.notices:
+            key, (_, added) = next(iter(self.notices.items()))
+            if added >= oldest:
+                break
+            del self.notices[key]
@@ -0,0 +1,274 @@
+"""
+Purging large numbers of messages.
+
+Discord only bulk deletes up to 100 messages per request, and only messages
+younger than two weeks. A Purge streams a channel's history newest first,
+one page at a time, and deletes the messages which match its PurgeFilter
+in bulk as soon as 100 of them have been collected. Older messages can
+only be deleted one by one, which is slow and has its own rate limit, so
+they're handed to a separate lane which deletes them in the background
+while the bulk deletes carry on.
+
+A Purge keeps count of its progress and can be cancelled at any point, it
+then stops after the request in progress.
+"""
+
+import asyncio
+import datetime
+import re
+import time
+from typing import AsyncIterator
+from typing import FrozenSet
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+
+import discord
+from discord import Message
+from discord import TextChannel
+
+from mrfreeze.lib.time import extract_time
+
+# Most messages deleted by a single bulk delete request.
+BULK_DELETE_LIMIT = 100
+
+# Messages older than this can't be bulk deleted, with a minute to spare.
+BULK_DELETE_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=1)
+
+# A number followed by a time unit, either as one argument (30m) or two (30 minutes).
+time_arg = re.compile(r"^\d+(s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?)$", re.IGNORECASE)
+time_unit = re.compile(r"^(s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?)$", re.IGNORECASE)
+
+
+class PurgeFilter(NamedTuple):
+    """
+    NamedTuple for which messages to purge.
+
+    limit:   number of messages to look through, None for no limit.
+    after:   only look through messages sent after this time (UTC).
+    authors: IDs of the authors whose messages are deleted, empty for everyone.
+    pattern: only delete messages matching this regular expression.
+    Pinned messages are never deleted.
+    """
+
+    limit: Optional[int] = None
+    after: Optional[datetime.datetime] = None
+    authors: FrozenSet[int] = frozenset()
+    pattern: Optional[Pattern] = None
+
+    def matches(self, message: Message) -> bool:
+        """Check if a message should be deleted."""
+        return not (
+            message.pinned or
+            (self.authors and message.author.id not in self.authors) or
+            (self.pattern is not None and self.pattern.search(message.content) is None)
+        )
+
+
+class PurgeProgress(NamedTuple):
+    """
+    NamedTuple for reporting the progress of a Purge, elapsed is in seconds.
+
+    error is the name of the exception which stopped the purge, None unless it failed.
+    Old messages still waiting when the purge is cancelled or fails are never deleted.
+    """
+
+    scanned: int
+    deleted: int
+    old_deleted: int
+    old_waiting: int
+    failed: int
+    elapsed: float
+    done: bool
+    cancelled: bool
+    error: Optional[str] = None
+
+
+def oldest_bulk() -> int:
+    """Get the lowest message ID which can still be bulk deleted."""
+    return discord.utils.time_snowflake(datetime.datetime.utcnow() - BULK_DELETE_AGE)
+
+
+def parse_purge_args(args: Sequence[str], authors: Sequence[int] = ()) -> PurgeFilter:
+    """
+    Work out which messages to purge from the arguments of a purge command.
+
+    The first plain number is the number of messages to look through, the
+    time expressions (30m, 2 hours) are the time window, and an argument
+    in /slashes/ is a regular expression the messages have to match.
+    Mentions are left to the caller, who passes the IDs of the authors.
+
+    Raises re.error if the regular expression is invalid.
+    """
+    count: Optional[int] = None
+    window: List[str] = list()
+    pattern: Optional[Pattern] = None
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        following = args[i + 1] if i + 1 < len(args) else ""
+
+        if len(arg) > 2 and arg.startswith("/") and arg.endswith("/"):
+            pattern = re.compile(arg[1:-1], re.IGNORECASE)
+        elif time_arg.match(arg):
+            window.append(arg)
+        elif arg.isdigit() and time_unit.match(following):
+            window += [ arg, following ]
+            i += 1
+        elif count is None and (arg.isdigit() or (arg[:1] == "-" and arg[1:].isdigit())):
+            count = int(arg)
+        i += 1
+
+    after: Optional[datetime.datetime] = None
+    if window:
+        # extract_time needs something after the unit to recognise single letter units.
+        delta, _ = extract_time([ *window, "" ], fallback_minutes=False)
+        if delta is not None:
+            after = datetime.datetime.utcnow() - delta
+
+    return PurgeFilter(
+        limit = count,
+        after = after,
+        authors = frozenset(authors),
+        pattern = pattern)
+
+
+class Purge:
+    """Deletes the messages in a channel sent before a given message which match a PurgeFilter."""
+
+    def __init__(self, channel: TextChannel, purge_filter: PurgeFilter, before: Optional[Message] = None) -> None:
+        self.channel = channel
+        self.filter = purge_filter
+        self.before = before
+
+        # Messages too old for bulk deletes, waiting to be deleted one by one.
+        self.old: "asyncio.Queue[Optional[Message]]" = asyncio.Queue()
+
+        self.scanned = self.deleted = self.old_deleted = self.old_waiting = self.failed = 0
+        self.start_time = self.end_time = 0.0
+        self.cancelled = False
+        self.error: Optional[str] = None
+
+    def cancel(self) -> None:
+        """Stop purging once the request in progress is done."""
+        self.cancelled = True
+
+    def progress(self) -> PurgeProgress:
+        """Get the progress of the purge so far."""
+        end = self.end_time or time.monotonic()
+        return PurgeProgress(
+            scanned = self.scanned,
+            deleted = self.deleted + self.old_deleted,
+            old_deleted = self.old_deleted,
+            old_waiting = self.old_waiting,
+            failed = self.failed,
+            elapsed = end - self.start_time if self.start_time else 0.0,
+            done = self.end_time > 0,
+            cancelled = self.cancelled,
+            error = self.error)
+
+    def history(self) -> AsyncIterator[Message]:
+        """Stream the messages to look through, newest first, fetching them a page at a time."""
+        return self.channel.history(
+            limit=self.filter.limit,
+            before=self.before,
+            after=self.filter.after,
+            oldest_first=False)
+
+    async def run(self) -> PurgeProgress:
+        """
+        Delete the matching messages, return the final progress.
+
+        Raises discord.Forbidden if we're not allowed to delete messages,
+        other failed requests are counted and skipped. Whatever stops the
+        purge is recorded in its progress.
+        """
+        self.start_time = time.monotonic()
+        old_lane = asyncio.get_running_loop().create_task(self.delete_old())
+        oldest = oldest_bulk()
+        batch: List[Message] = list()
+
+        try:
+            async for message in self.history():
+                if self.cancelled:
+                    break
+
+                self.scanned += 1
+                if not self.filter.matches(message):
+                    continue
+
+                if message.id > oldest:
+                    batch.append(message)
+                    if len(batch) == BULK_DELETE_LIMIT:
+                        await self.delete_bulk(batch)
+                        batch = list()
+                        oldest = oldest_bulk()
+                else:
+                    self.queue_old(message)
+
+            if batch and not self.cancelled:
+                await self.delete_bulk(batch)
+
+            self.old.put_nowait(None)
+            await old_lane
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        except Exception as e:
+            self.error = type(e).__name__
+            raise
+        finally:
+            old_lane.cancel()
+            self.end_time = time.monotonic()
+
+        return self.progress()
+
+    def queue_old(self, message: Message) -> None:
+        """Hand a message too old for bulk deletes to the lane deleting them one by one."""
+        self.old_waiting += 1
+        self.old.put_nowait(message)
+
+    async def delete_bulk(self, batch: List[Message]) -> None:
+        """
+        Delete up to 100 messages younger than two weeks with a single request.
+
+        A long purge can take minutes, so messages which have become too old
+        since they were collected are handed to the old lane instead, Discord
+        would otherwise reject the whole request.
+        """
+        oldest = oldest_bulk()
+        for message in batch:
+            if message.id <= oldest:
+                self.queue_old(message)
+        batch = [ message for message in batch if message.id > oldest ]
+        if not batch:
+            return
+
+        try:
+            await self.channel.delete_messages(batch)
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException:
+            self.failed += len(batch)
+        else:
+            self.deleted += len(batch)
+
+    async def delete_old(self) -> None:
+        """Delete the messages too old for bulk deletes one by one, until the end of the queue."""
+        while True:
+            message = await self.old.get()
+            if message is None or self.cancelled:
+                return
+
+            self.old_waiting -= 1
+            try:
+                await message.delete()
+            except discord.Forbidden:
+                raise
+            except discord.HTTPException:
+                self.failed += 1
+            else:
+                self.old_deleted += 1
@@ -10,6 +10,8 @@ from discord.ext.commands import Context
 from mrfreeze.cogs.coginfo import CogInfo
 from mrfreeze.cogs.coginfo import InsufficientCogInfo
 from mrfreeze.lib.banish import mute_db
+from mrfreeze.lib.region_resolver import RegionMatch
+from mrfreeze.lib.region_resolver import RegionResolver
 
 
 regional_aliases = {
@@ -38,17 +40,22 @@ antarctica_spellings = (
     "anarctica", "antarctica", "antartica", "anartica",
     "anctartica", "anctarctica", "antacrtica")
 
+ANTARCTICA = "Antarctica"
+
+# Built once, finds the region in a message in a single pass. Antarctica takes priority over everything else.
+resolver = RegionResolver({ **regional_aliases, ANTARCTICA: antarctica_spellings }, priority=ANTARCTICA)
+
 
 async def region_cmd(ctx: Context, cog: CogInfo, args: Tuple[str, ...]) -> None:
     """Assign yourself a colourful regional role."""
     args = tuple([ a.lower() for a in args ])
     msg: Optional[str] = None
+    match = resolver.resolve(" ".join(args))
 
     # antarctica_spelling will be none if the user did not spell it
     antarctica_spelling: Optional[str] = None
-    for variant in antarctica_spellings:
-        if variant in args:
-            antarctica_spelling = variant
+    if match and match.region == ANTARCTICA:
+        antarctica_spelling = match.text
 
     if len(args) == 0 or "help" in args:
         msg = "Type !region followed by your region, this will assign you a regional role "
@@ -70,7 +77,7 @@ async def region_cmd(ctx: Context, cog: CogInfo, args: Tuple[str, ...]) -> None:
         await region_antarctica(ctx, cog, antarctica_spelling)
 
     else:
-        await set_region(ctx, cog, args)
+        await set_region(ctx, cog, args, match)
 
     if msg:
         await ctx.send(msg)
@@ -90,7 +97,7 @@ async def region_antarctica(ctx: Context, cog: CogInfo, spelling: str) -> bool:
         raise InsufficientCogInfo()
 
     # Check if the user is on an indefinite banish.
-    mute_status = mute_db.mdb_fetch(bot, ctx.author)
+    mute_status = await mute_db.mdb_fetch(bot, ctx.author)
     indefinite_mute = mute_status and not mute_status[0].until
 
     # User confirmed to have tried to set region to Antarctica
@@ -132,13 +139,18 @@ async def region_antarctica(ctx: Context, cog: CogInfo, spelling: str) -> bool:
     return True
 
 
-async def set_region(ctx: Context, cog: CogInfo, args: Tuple[str, ...]) -> None:
+async def set_region(
+        ctx: Context,
+        cog: CogInfo,
+        args: Tuple[str, ...],
+        match: Optional[RegionMatch] = None) -> None:
     """
     Set the region of a user based on what they said.
 
     Determine which region the user tried to set using the !region command,
     then set that region (if found) and send an appropriate response. If
     the region isn't found don't set a role, just send an appropriate response.
+    The region may already have been resolved by the caller.
     """
     if cog.regions:
         regions = cog.regions[ctx.guild.id]
@@ -146,21 +158,15 @@ async def set_region(ctx: Context, cog: CogInfo, args: Tuple[str, ...]) -> None:
         raise InsufficientCogInfo()
 
     author_roles = [ i.id for i in ctx.author.roles if i.name not in regions.keys() ]
-    all_args = " ".join(args)
+    if match is None:
+        match = resolver.resolve(" ".join(args))
 
-    found_region = False
+    found_region = match is not None and match.region in regions
     valid_region = True
-    for region in regional_aliases:
-        if found_region:
-            break
-
-        for alias in regional_aliases[region]:
-            if alias in all_args:
-                author_roles.append(regions[region])
-                valid_region = regions[region] is not None
-                new_role_name = region
-                found_region = True
-                break
+    if match is not None and found_region:
+        author_roles.append(regions[match.region])
+        valid_region = regions[match.region] is not None
+        new_role_name = match.region
 
     if found_region and valid_region:
         new_roles = [ discord.Object(id=i) for i in author_roles ]
@@ -0,0 +1,194 @@
+"""
+Resolving what users type into regions.
+
+The RegionResolver is built once from a dict of region names and their
+aliases. All aliases are compiled into a single regular expression, longest
+first, which finds every alias in a message in one pass. Only whole words
+match, so that e.g. "us" doesn't match "russia" or "australia".
+
+If no alias is found, or none of the priority region, the words of the
+message are looked up in a typo index. Every way of deleting a character
+from each alias is worked out up front, so finding the aliases close to a
+word only takes deleting each of its characters in turn and looking the
+results up, rather than comparing the word with every alias. Two strings
+sharing such a deletion are at most two edits apart, which covers a wrong,
+missing, extra or swapped letter, or one missing and one extra letter, but
+not two wrong letters.
+
+When a message matches several regions, the priority region (Antarctica,
+for the region command) wins, even when it's misspelt, then the alias with
+the fewest typos, then the longest.
+"""
+
+import re
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Set
+from typing import Tuple
+
+from mrfreeze.lib.fuzzy import edit_distance
+
+# Shortest alias that may be matched with typos, and shortest which may have two.
+MIN_TYPO_LENGTH = 5
+MIN_TWO_TYPO_LENGTH = 6
+
+# Most words in an alias, and so in a group of words looked up in the typo index.
+MAX_ALIAS_WORDS = 3
+
+
+class RegionMatch(NamedTuple):
+    """NamedTuple for a region found in a message."""
+
+    region: str
+    alias: str
+    text: str
+    distance: int
+
+
+def deletions(word: str) -> Set[str]:
+    """Get word and every string made by deleting a single character from it."""
+    return { word } | { word[:i] + word[i + 1:] for i in range(len(word)) }
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Get a regular expression matching any of the words, longest first.
+
+    Rather than one alternative per word, which the regex engine would try
+    one by one at every position, words sharing a prefix share a branch.
+    """
+    trie: Dict[str, Any] = dict()
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, dict())
+        node[""] = dict()
+
+    def pattern(node: Dict[str, Any]) -> str:
+        branches = [ re.escape(char) + pattern(child) for char, child in node.items() if char ]
+        if not branches:
+            return ""
+
+        # Longer matches first, the end of a word last.
+        group = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            group = f"(?:{group})?"
+        return group
+
+    return pattern(trie)
+
+
+def max_typos(alias: str) -> int:
+    """Get the number of typos allowed when matching an alias."""
+    if len(alias) >= MIN_TWO_TYPO_LENGTH:
+        return 2
+    if len(alias) >= MIN_TYPO_LENGTH:
+        return 1
+    return 0
+
+
+class RegionResolver:
+    """Finds the region meant by a message, see the module docstring."""
+
+    def __init__(self, aliases: Dict[str, Iterable[str]], priority: Optional[str] = None) -> None:
+        self.priority = priority
+        self.regions: Dict[str, str] = dict()
+        for region, region_aliases in aliases.items():
+            for alias in region_aliases:
+                self.regions.setdefault(alias.lower(), region)
+
+        self.pattern: Pattern = re.compile(r"(?<!\w)" + trie_pattern(self.regions) + r"(?!\w)")
+
+        # Maps every deletion variant of each alias to the aliases it was made from,
+        # and the same for the priority region alone.
+        self.typos = self.typo_index(self.regions)
+        self.priority_typos = self.typo_index([ alias for alias, name in self.regions.items() if name == priority ])
+
+        # The shortest and longest deletion variant in each index.
+        self.typo_lengths = self.lengths(self.typos)
+        self.priority_typo_lengths = self.lengths(self.priority_typos)
+
+    @staticmethod
+    def typo_index(aliases: Iterable[str]) -> Dict[str, List[str]]:
+        """Map every deletion variant of each alias long enough to have typos to the aliases it was made from."""
+        typos: Dict[str, List[str]] = dict()
+        for alias in aliases:
+            if max_typos(alias):
+                for variant in deletions(alias):
+                    typos.setdefault(variant, list()).append(alias)
+        return typos
+
+    @staticmethod
+    def lengths(typos: Dict[str, List[str]]) -> Tuple[int, int]:
+        """Get the length of the shortest and the longest deletion variant in a typo index."""
+        lengths = [ len(variant) for variant in typos ]
+        return min(lengths, default=0), max(lengths, default=0)
+
+    def best(self, matches: List[RegionMatch]) -> Optional[RegionMatch]:
+        """Pick the best match: the priority region, then the closest and longest alias, then the first."""
+        if not matches:
+            return None
+        return min(matches, key=lambda match: (
+            match.region != self.priority,
+            match.distance,
+            -len(match.alias)))
+
+    def exact(self, text: str) -> List[RegionMatch]:
+        """Find every alias written out in the text."""
+        return [
+            RegionMatch(self.regions[alias], alias, alias, 0)
+            for alias in self.pattern.findall(text.lower())
+        ]
+
+    def fuzzy(self, text: str, priority_only: bool = False) -> List[RegionMatch]:
+        """
+        Find every alias written with typos in the text, trying every run of up to three words.
+
+        With priority_only, only the aliases of the priority region are looked for.
+        """
+        typos = self.priority_typos if priority_only else self.typos
+        shortest, longest = self.priority_typo_lengths if priority_only else self.typo_lengths
+        words = re.findall(r"[\w'-]+", text.lower())
+        matches: List[RegionMatch] = list()
+
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + MAX_ALIAS_WORDS, len(words)) + 1):
+                phrase = " ".join(words[start:end])
+
+                # Too short or too long to be within two typos of any alias.
+                if len(phrase) > longest + 2:
+                    break
+                if len(phrase) < shortest:
+                    continue
+
+                candidates = {
+                    alias for variant in deletions(phrase) for alias in typos.get(variant, ())
+                }
+                for alias in candidates:
+                    limit = max_typos(alias)
+                    distance = edit_distance(phrase, alias, limit)
+                    if distance <= limit:
+                        matches.append(RegionMatch(self.regions[alias], alias, phrase, distance))
+
+        return matches
+
+    def resolve(self, text: str) -> Optional[RegionMatch]:
+        """
+        Find the region meant by the text, None if there doesn't seem to be one.
+
+        If no alias is written out the typo index is searched for every alias.
+        If only aliases of other regions are, it's still searched for the
+        priority region, since a misspelt priority region wins all the same.
+        """
+        matches = self.exact(text)
+        match = self.best(matches)
+        if match is None:
+            return self.best(self.fuzzy(text))
+        if self.priority is None or match.region == self.priority:
+            return match
+        return self.best(matches + self.fuzzy(text, priority_only=True))
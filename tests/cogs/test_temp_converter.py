@@ -2,11 +2,15 @@
 
 import asyncio
 import unittest
+from types import SimpleNamespace
 from typing import List
 
 from discord import File
 
 from mrfreeze.cogs.temp_converter import TemperatureConverter
+from mrfreeze.cogs.temp_converter import statement_pattern
+from mrfreeze.lib.message_facts import LISTENER_ATTRIBUTE
+from mrfreeze.lib.message_facts import MessageFacts
 
 from tests import helpers
 
@@ -51,7 +55,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         to ensure that it's closed after the test finish running.
         """
         self.msg.content = content
-        coroutine = self.cog.on_message(self.msg)
+        coroutine = self.cog.on_message(MessageFacts(self.msg, self.ctx, 0))
         self.assertIsNone(asyncio.run(coroutine))
 
         text, kwargs = self.channel.send.call_args
@@ -68,13 +72,12 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         self.author.roles.append(new_role)
 
     def test_on_message_no_response_when_user_is_bot(self):
-        """Test that on_message() does nothing when called by bot."""
+        """Test that on_message() isn't subscribed to messages from bots."""
         self.msg.author.bot = True
 
         self.msg.content = "10 c"
-        coroutine = self.cog.on_message(self.msg)
-        self.assertIsNone(asyncio.run(coroutine))
-        self.channel.send.assert_not_called()
+        message_filter = getattr(TemperatureConverter.on_message, LISTENER_ATTRIBUTE)
+        self.assertFalse(message_filter.matches(MessageFacts(self.msg, None, 0)))
 
     def test_on_message_no_response_with_invalid_statement(self):
         """
@@ -83,7 +86,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         Should return nothing at all.
         """
         self.msg.content = "10"
-        coroutine = self.cog.on_message(self.msg)
+        coroutine = self.cog.on_message(MessageFacts(self.msg, self.ctx, 0))
         self.assertIsNone(asyncio.run(coroutine))
         self.channel.send.assert_not_called()
 
@@ -518,3 +521,49 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         self.assertEqual(
             len(self.files),
             0, msg="self.files should be empty.")
+
+
+class TemperaturePrefilterUnitTest(unittest.TestCase):
+    """Test that skipping messages without digits doesn't skip any temperature statements."""
+
+    messages = [
+        "It's 20°C today",
+        "451°F is when paper burns",
+        "-5 °F outside",
+        "300°K",
+        "300 kelvin",
+        "0 °R",
+        "100°celsius in fahrenheit",
+        "37,5 c to k",
+        "it's 5k to the shop",
+        "°C °F °K",
+        "no digits c",
+        "freedom units",
+        "{Diamine Oxblood}",
+        "",
+    ]
+
+    def setUp(self):
+        """Set up the cog, no bot needed for parsing."""
+        self.cog = TemperatureConverter(helpers.MockMrFreeze())
+
+    def test_prefiltered_parse_finds_the_same_statements(self):
+        """Every message the unfiltered regex matches should still be parsed, with the same temperature."""
+        for content in self.messages:
+            with self.subTest(content=content):
+                match = statement_pattern.search(content)
+                parsed = self.cog.parse_request(SimpleNamespace(message=SimpleNamespace(content=content)))
+
+                self.assertEqual(parsed is None, match is None)
+                if match is not None:
+                    self.assertEqual(parsed.temperature, float(match.group(1).replace(",", ".")))
+
+    def test_listener_filter_accepts_every_statement(self):
+        """The listener's digit filter should let through every message the unfiltered regex matches."""
+        message_filter = getattr(TemperatureConverter.on_message, LISTENER_ATTRIBUTE)
+        for content in self.messages:
+            with self.subTest(content=content):
+                msg = helpers.MockMessage(content=content)
+                msg.author.bot = False
+                if statement_pattern.search(content):
+                    self.assertTrue(message_filter.matches(MessageFacts(msg, None, 0)))
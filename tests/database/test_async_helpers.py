@@ -0,0 +1,70 @@
+"""Unittests for the awaitable database helpers."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mrfreeze.database.async_helpers import DatabaseExecutor
+
+
+@pytest.fixture()
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def executor():
+    """Create a database executor that is shut down after the test."""
+    executor = DatabaseExecutor(readers=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_writes_run_on_a_single_writer_thread(loop, executor):
+    """All writes should be carried out by the same thread, which isn't the event loop's."""
+    async def writes():
+        return await asyncio.gather(*[
+            executor.write(threading.get_ident) for _ in range(10)
+        ])
+
+    threads = set(loop.run_until_complete(writes()))
+
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+
+
+def test_slow_queries_do_not_block_the_event_loop(loop, executor):
+    """The event loop should keep running other coroutines while a slow query is in progress."""
+    ticks = list()
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def both():
+        await asyncio.gather(executor.write(time.sleep, 0.2), ticker())
+
+    loop.run_until_complete(both())
+    gaps = [ b - a for a, b in zip(ticks, ticks[1:]) ]
+
+    assert len(ticks) == 5
+    assert max(gaps) < 0.1
+
+
+def test_no_work_is_accepted_after_shutdown(loop, executor):
+    """Once shut down the executor should refuse work rather than start new threads, until started again."""
+    assert loop.run_until_complete(executor.read(sum, [ 1, 2 ])) == 3
+    executor.shutdown()
+
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(executor.write(sum, [ 1, 2 ]))
+    assert executor.writer is None and executor.readers is None
+
+    executor.start()
+    assert loop.run_until_complete(executor.write(sum, [ 1, 2 ])) == 3
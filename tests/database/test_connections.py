@@ -0,0 +1,73 @@
+"""Unittests for the pooled database connections."""
+
+import pytest
+
+from mrfreeze.database.connections import ConnectionManager
+
+
+@pytest.fixture()
+def manager():
+    """Create a connection manager that is closed after the test."""
+    manager = ConnectionManager(pool_size=2)
+    yield manager
+    manager.close_all()
+
+
+def test_connections_are_reused(manager, tmp_path):
+    """Borrowing a connection twice in a row should give back the same connection."""
+    dbpath = str(tmp_path / "test.db")
+
+    with manager.connection(dbpath) as first:
+        pass
+    with manager.connection(dbpath) as second:
+        pass
+
+    assert first is second
+    assert len(manager.pool(dbpath).opened) == 1
+
+
+def test_connections_use_wal_and_normal_sync(manager, tmp_path):
+    """Pooled connections should use WAL journaling and synchronous=NORMAL."""
+    dbpath = str(tmp_path / "test.db")
+
+    with manager.connection(dbpath) as conn:
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+
+    assert journal_mode == "wal"
+    assert synchronous == 1
+
+
+def test_connection_commits_on_success_and_rolls_back_on_error(manager, tmp_path):
+    """The with block should commit when it finishes and roll back when it raises."""
+    dbpath = str(tmp_path / "test.db")
+
+    with manager.connection(dbpath) as conn:
+        conn.execute("CREATE TABLE numbers (n INTEGER)")
+        conn.execute("INSERT INTO numbers VALUES (1)")
+
+    with pytest.raises(RuntimeError):
+        with manager.connection(dbpath) as conn:
+            conn.execute("INSERT INTO numbers VALUES (2)")
+            raise RuntimeError()
+
+    with manager.connection(dbpath) as conn:
+        rows = conn.execute("SELECT n FROM numbers").fetchall()
+
+    assert rows == [ (1,) ]
+
+
+def test_pool_never_opens_more_than_its_size(manager, tmp_path):
+    """Borrowing more connections than the pool size should not open extra connections."""
+    dbpath = str(tmp_path / "test.db")
+    pool = manager.pool(dbpath)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    third = pool.acquire()
+
+    assert third is first
+    assert len(pool.opened) == 2
+    pool.release(second)
+    pool.release(third)
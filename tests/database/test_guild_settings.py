@@ -0,0 +1,104 @@
+"""Unittests for the per-server settings records."""
+
+import pytest
+
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import GuildSettings
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.database.settings import Settings
+
+
+class Server:
+    """Stand-in for a discord Guild."""
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.name = f"server {id}"
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a fresh settings database, whose connections are closed after the test."""
+    yield str(tmp_path / "settings.db")
+    connections.close_all()
+
+
+def test_guild_settings_use_slots():
+    """GuildSettings records should not carry a __dict__ around."""
+    record = GuildSettings(1, mute_role=2)
+
+    assert not hasattr(record, "__dict__")
+    assert record.mute_role == 2
+    assert record.trash_channel is None
+
+
+def test_settings_are_loaded_into_one_record_per_server(dbpath):
+    """Settings written through the old aliases should be loaded back as one record per server."""
+    settings = Settings(dbpath)
+    settings.set_mute_role_by_id(Server(1), 10)
+    settings.set_trash_channel_by_id(Server(1), 20)
+    settings.toggle_freeze_mute(Server(2))
+
+    reloaded = Settings(dbpath)
+    first = reloaded.get_guild_settings(Server(1))
+    second = reloaded.get_guild_settings(Server(2))
+
+    assert (first.mute_role, first.trash_channel, first.freeze_muted) == (10, 20, None)
+    assert second.freeze_muted
+    assert reloaded.get_mute_role(Server(1)) == 10
+    assert reloaded.get_guild_settings(Server(3)) is None
+    assert reloaded.get_mute_role(Server(3)) is None
+
+
+def test_setting_a_value_updates_the_record(dbpath):
+    """Setting a value should be visible in the server's record right away."""
+    settings = Settings(dbpath)
+    settings.set_welcome_message_by_id(Server(1), "Hello $user")
+
+    assert settings.get_guild_settings(Server(1)).welcome_message == "Hello $user"
+    assert settings.get_welcome_message(Server(1)) == "Hello $user"
+    assert settings.welcome_messages.dict is None
+
+
+def test_toggles_keep_the_muted_features_bitmask_up_to_date(dbpath):
+    """Toggling a feature mute should be reflected in the server's muted features bitmask."""
+    settings = Settings(dbpath)
+    settings.toggle_freeze_mute(Server(1))
+    settings.toggle_tempconverter_mute(Server(1))
+    assert settings.muted_features(Server(1)) == MutedFeature.FREEZE | MutedFeature.TEMPCONVERTER
+
+    settings.toggle_freeze_mute(Server(1))
+    assert settings.muted_features(Server(1)) == MutedFeature.TEMPCONVERTER
+    assert not settings.is_freeze_muted(Server(1))
+    assert settings.is_tempconverter_muted(Server(1))
+
+    reloaded = Settings(dbpath)
+    assert reloaded.muted_features(Server(1)) == MutedFeature.TEMPCONVERTER
+    assert reloaded.muted_features(Server(2)) == 0
+
+
+def test_every_write_keeps_the_muted_features_bitmask_up_to_date(dbpath):
+    """Setting a feature mute any other way than toggling should update the bitmask too."""
+    settings = Settings(dbpath, write_behind=True)
+    assert settings.muted_features(Server(1)) == 0
+
+    settings.inkcyclopedia.set_by_id(Server(1), True)
+    assert settings.muted_features(Server(1)) == MutedFeature.INKCYCLOPEDIA
+
+    settings.tempconverter_mutes.upsert(Server(1), True)
+    settings.inkcyclopedia.upsert(Server(1), False)
+    assert settings.muted_features(Server(1)) == MutedFeature.TEMPCONVERTER
+    assert settings.is_tempconverter_muted(Server(1))
+    assert not settings.is_inkcyclopedia_muted(Server(1))
+
+
+def test_mute_tables_share_one_implementation(dbpath):
+    """Every mute table should store its own MutedFeature under its own table and field."""
+    settings = Settings(dbpath)
+    tables = [ settings.freeze_mutes, settings.inkcyclopedia, settings.tempconverter_mutes ]
+
+    assert [ (table.table_name, table.field, table.feature) for table in tables ] == [
+        ("freeze_mutes", "freeze_muted", MutedFeature.FREEZE),
+        ("inkcyclopedia_mutes", "inkcyclopedia_muted", MutedFeature.INKCYCLOPEDIA),
+        ("tempconverter_mutes", "tempconverter_muted", MutedFeature.TEMPCONVERTER),
+    ]
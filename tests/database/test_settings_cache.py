@@ -0,0 +1,148 @@
+"""Unittests for the lazily loaded per-server settings cache."""
+
+import asyncio
+import threading
+
+import pytest
+
+from mrfreeze.database import guild_settings
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.database.settings import Settings
+
+
+class Server:
+    """Stand-in for a discord Guild."""
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.name = f"server {id}"
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a settings database with mute roles set for servers 1-5."""
+    executor.start()
+    dbpath = str(tmp_path / "settings.db")
+    settings = Settings(dbpath)
+    for i in range(1, 6):
+        settings.set_mute_role_by_id(Server(i), i * 10)
+
+    yield dbpath
+    executor.shutdown()
+    connections.close_all()
+
+
+@pytest.fixture()
+def queries(monkeypatch):
+    """Count the queries made by the settings store."""
+    queries = list()
+    db_execute = guild_settings.db_execute
+
+    def counting_db_execute(dbpath, sql, values):
+        queries.append(values)
+        return db_execute(dbpath, sql, values)
+
+    monkeypatch.setattr(guild_settings, "db_execute", counting_db_execute)
+    return queries
+
+
+def test_lazy_settings_are_loaded_on_first_use(dbpath, queries):
+    """Nothing should be loaded at startup, and each server only once after that."""
+    settings = Settings(dbpath, lazy=True)
+    assert queries == []
+
+    assert settings.get_mute_role(Server(1)) == 10
+    assert settings.get_mute_role(Server(1)) == 10
+    assert settings.get_trash_channel(Server(1)) is None
+    assert queries == [ (1,) ]
+
+
+def test_servers_without_settings_are_cached(dbpath, queries):
+    """Servers with no settings at all should only be looked up once."""
+    settings = Settings(dbpath, lazy=True)
+
+    assert settings.get_guild_settings(Server(99)) is None
+    assert settings.get_mute_role(Server(99)) is None
+    assert len(queries) == 1
+
+    settings.set_mute_role_by_id(Server(99), 990)
+    assert settings.get_mute_role(Server(99)) == 990
+
+
+def test_least_recently_used_servers_are_evicted(dbpath, queries):
+    """Only cache_size servers should be kept, dropping the least recently used."""
+    settings = Settings(dbpath, lazy=True, cache_size=2)
+
+    settings.get_mute_role(Server(1))
+    settings.get_mute_role(Server(2))
+    settings.get_mute_role(Server(1))
+    settings.get_mute_role(Server(3))
+
+    assert list(settings.guild_settings.guilds) == [ 1, 3 ]
+    assert settings.get_mute_role(Server(2)) == 20
+    assert queries == [ (1,), (2,), (3,), (2,) ]
+
+
+def test_failed_loads_back_off(dbpath, queries):
+    """A failed load should not be retried on every lookup."""
+    settings = Settings(dbpath, lazy=True)
+    select_one = settings.guild_settings.select_one
+    settings.guild_settings.select_one = "SELECT * FROM missing_table"
+
+    assert settings.get_mute_role(Server(1)) is None
+    assert settings.get_mute_role(Server(1)) is None
+    assert len(queries) == 1
+
+    settings.guild_settings.select_one = select_one
+    settings.guild_settings.backoff.retry_at = 0
+    assert settings.get_mute_role(Server(1)) == 10
+    assert settings.guild_settings.backoff.delay == settings.guild_settings.backoff.initial
+
+
+def test_servers_are_preloaded_off_the_event_loop(loop, dbpath, queries):
+    """Preloading should load every server not cached yet on a reader thread, up to cache_size of them."""
+    settings = Settings(dbpath, lazy=True, cache_size=3)
+    settings.get_mute_role(Server(1))
+    threads = list()
+    read_one = settings.guild_settings.read_one
+
+    def record(server):
+        threads.append(threading.current_thread().name)
+        return read_one(server)
+
+    settings.guild_settings.read_one = record
+    loop.run_until_complete(settings.preload([ Server(i) for i in range(1, 6) ]))
+
+    assert queries == [ (1,), (2,), (3,) ]
+    assert all(thread.startswith("db-reader") for thread in threads)
+    assert list(settings.guild_settings.guilds) == [ 1, 2, 3 ]
+    assert settings.get_mute_role(Server(3)) == 30
+
+
+def test_mute_checks_never_load_on_the_event_loop(loop, dbpath, queries):
+    """A server that isn't cached should read as not muted while it's loaded in the background."""
+    settings = Settings(dbpath, lazy=True)
+    settings.toggle_freeze_mute(Server(1))
+    settings.guild_settings.load()
+    del queries[:]
+
+    async def run():
+        first = settings.muted_features(Server(1))
+        assert list(settings.guild_settings.loading) == [ 1 ]
+        settings.muted_features(Server(1))
+        await asyncio.wait(list(settings.guild_settings.loading.values()))
+        return first, settings.muted_features(Server(1))
+
+    assert loop.run_until_complete(run()) == (0, MutedFeature.FREEZE)
+    assert queries == [ (1,) ]
+    assert not settings.guild_settings.loading
@@ -0,0 +1,88 @@
+"""Unittests for write-behind settings writes."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.database.settings import Settings
+
+
+class Server:
+    """Stand-in for a discord Guild."""
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.name = f"server {id}"
+
+
+@pytest.fixture()
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a fresh settings database, whose connections are closed after the test."""
+    executor.start()
+    yield str(tmp_path / "settings.db")
+    executor.shutdown()
+    connections.close_all()
+
+
+def stored_roles(dbpath):
+    """Read the mute roles straight from the database file."""
+    with sqlite3.connect(dbpath) as conn:
+        return dict(conn.execute("SELECT server, role FROM mute_roles").fetchall())
+
+
+def test_writes_are_visible_at_once_and_flushed_in_one_batch(loop, dbpath):
+    """Queued values should be readable right away and reach the database in a single flush."""
+    settings = Settings(dbpath, write_behind=True)
+    settings.write_behind.interval = 60
+
+    async def writes():
+        for i in range(10):
+            await settings.set_mute_role_by_id_async(Server(i), i)
+        settings.set_mute_role_by_id(Server(0), 100)
+
+        assert settings.get_mute_role(Server(0)) == 100
+        assert settings.write_behind_stats().depth == 10
+        assert stored_roles(dbpath) == dict()
+
+        await settings.close()
+
+    loop.run_until_complete(writes())
+    stats = settings.write_behind_stats()
+
+    assert stored_roles(dbpath) == { **{ i: i for i in range(10) }, 0: 100 }
+    assert (stats.depth, stats.flushes, stats.written) == (0, 1, 10)
+    assert stats.last_latency > 0
+
+
+def test_full_batches_are_flushed_before_the_interval(loop, dbpath):
+    """Reaching the batch size should trigger a flush without waiting for the interval."""
+    settings = Settings(dbpath, write_behind=True)
+    settings.write_behind.interval = 60
+    settings.write_behind.batch_size = 5
+
+    async def writes():
+        for i in range(5):
+            await settings.set_mute_role_by_id_async(Server(i), i)
+
+        for _ in range(100):
+            if settings.write_behind_stats().flushes:
+                break
+            await asyncio.sleep(0.01)
+
+        await settings.close()
+
+    loop.run_until_complete(writes())
+
+    assert stored_roles(dbpath) == { i: i for i in range(5) }
+    assert settings.write_behind_stats().flushes == 1
@@ -0,0 +1,93 @@
+"""A local stand-in for the Ink API, with adjustable latency."""
+
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from aiohttp import web
+
+# The inks known to the stand-in, keyed by their lowercase names.
+INKS: Dict[str, Dict[str, Any]] = {
+    "diamine oxblood": {
+        "id": "1",
+        "fullName": "Diamine Oxblood",
+        "primaryImage": "https://example.com/oxblood.jpg",
+        "alternateImages": [ "https://example.com/oxblood2.jpg" ],
+        "submittedBy": "ink fan",
+    },
+    "sailor yama-dori": {
+        "id": "2",
+        "fullName": "Sailor Yama-dori",
+        "primaryImage": "https://example.com/yama-dori.jpg",
+        "reviewLink": "https://example.com/review",
+    },
+    "pilot iroshizuku kon-peki": {
+        "id": "3",
+        "fullName": "Pilot Iroshizuku Kon-peki",
+        "primaryImage": "https://example.com/kon-peki.jpg",
+    },
+}
+
+
+class StubInkAPI:
+    """
+    Serve the Ink API's list and search endpoints on a random local port.
+
+    Every response is delayed by delay seconds. The searches and the number of
+    client addresses, one per connection, are recorded so tests can inspect them.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.status = 200
+        self.catalogue: List[Dict[str, Any]] = list(INKS.values())
+        self.listings = 0
+        self.searches: List[List[str]] = list()
+        self.clients: Set[Tuple[str, int]] = set()
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def search(self, request: web.Request) -> web.Response:
+        """Look up the inks in the posted list."""
+        names = await request.json()
+        if request.transport is not None:
+            self.clients.add(request.transport.get_extra_info("peername"))
+        self.searches.append(names)
+        await asyncio.sleep(self.delay)
+
+        if self.status != 200:
+            return web.Response(status=self.status)
+
+        found = { name: INKS[name.lower()] for name in names if name.lower() in INKS }
+        return web.json_response({ "found": found })
+
+    async def list_inks(self, request: web.Request) -> web.Response:
+        """List every ink in the catalogue."""
+        self.listings += 1
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return web.json_response(self.catalogue)
+
+    async def start(self) -> str:
+        """Start the server, return the base url of the API."""
+        app = web.Application()
+        app.router.add_get("/api/inks", self.list_inks)
+        app.router.add_post("/api/inks/search", self.search)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+
+        port = self.runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/api/inks"
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self.runner is not None:
+            await self.runner.cleanup()
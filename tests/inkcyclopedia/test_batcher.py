@@ -0,0 +1,153 @@
+"""Unittests for the coalescing of concurrent ink lookups."""
+
+import asyncio
+
+import pytest
+
+from mrfreeze.lib.inkcyclopedia.batcher import InkBatcher
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_identical_lookups_share_one_request(loop):
+    """Concurrent lookups of the same ink should result in a single search request."""
+    async def run():
+        api = StubInkAPI(delay=0.1)
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client)
+        try:
+            results = await asyncio.gather(*[ batcher.lookup([ "diamine oxblood" ]) for _ in range(10) ])
+
+            # A lookup arriving while the request is in flight joins it too.
+            first = asyncio.ensure_future(batcher.lookup([ "sailor yama-dori" ]))
+            await asyncio.sleep(0.08)
+            second = await batcher.lookup([ "sailor yama-dori" ])
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert all(result["diamine oxblood"].name == "Diamine Oxblood" for result in results)
+        assert first.result() == second
+        assert api.searches == [ [ "diamine oxblood" ], [ "sailor yama-dori" ] ]
+        assert batcher.requests == 2
+        assert batcher.shared == 10
+        assert not batcher.inflight
+
+    loop.run_until_complete(run())
+
+
+def test_different_lookups_are_batched(loop):
+    """Lookups of different inks within the window should be sent as one search request."""
+    async def run():
+        api = StubInkAPI()
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client, window=0.05)
+        try:
+            first, second = await asyncio.gather(
+                batcher.lookup([ "diamine oxblood", "no such ink" ]),
+                batcher.lookup([ "pilot iroshizuku kon-peki", "diamine oxblood" ]))
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert first["diamine oxblood"].name == "Diamine Oxblood"
+        assert first["no such ink"] is None
+        assert second["pilot iroshizuku kon-peki"].name == "Pilot Iroshizuku Kon-peki"
+        assert api.searches == [ [ "diamine oxblood", "no such ink", "pilot iroshizuku kon-peki" ] ]
+
+    loop.run_until_complete(run())
+
+
+def test_full_batches_are_sent_right_away(loop):
+    """A batch reaching max_batch names shouldn't wait for the window."""
+    async def run():
+        api = StubInkAPI()
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client, window=10, max_batch=2)
+        try:
+            result = await asyncio.wait_for(batcher.lookup([ "a", "b" ]), timeout=1)
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert result == { "a": None, "b": None }
+
+    loop.run_until_complete(run())
+
+
+def test_errors_reach_every_waiting_lookup(loop):
+    """A failed search request should fail every lookup waiting for it, and not be remembered."""
+    async def run():
+        api = StubInkAPI()
+        api.status = 500
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client)
+        try:
+            results = await asyncio.gather(
+                batcher.lookup([ "diamine oxblood" ]),
+                batcher.lookup([ "diamine oxblood" ]),
+                return_exceptions=True)
+            api.status = 200
+            retry = await batcher.lookup([ "diamine oxblood" ])
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert all(isinstance(result, Exception) for result in results)
+        assert retry["diamine oxblood"] is not None
+        assert len(api.searches) == 2
+
+    loop.run_until_complete(run())
+
+
+def test_cancelled_lookups_dont_affect_others(loop):
+    """Cancelling one waiting lookup shouldn't cancel the shared request."""
+    async def run():
+        api = StubInkAPI(delay=0.1)
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client)
+        try:
+            cancelled = asyncio.ensure_future(batcher.lookup([ "diamine oxblood" ]))
+            waiting = asyncio.ensure_future(batcher.lookup([ "diamine oxblood" ]))
+            await asyncio.sleep(0.08)
+            cancelled.cancel()
+            result = await waiting
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert result["diamine oxblood"].name == "Diamine Oxblood"
+
+    loop.run_until_complete(run())
+
+
+def test_closing_cancels_lookups_in_progress(loop):
+    """Closing should cancel both waiting lookups and search requests in flight, and wait for them."""
+    async def run():
+        api = StubInkAPI(delay=0.5)
+        client = InkClient(await api.start())
+        batcher = InkBatcher(client, window=0.05)
+        try:
+            inflight = asyncio.ensure_future(batcher.lookup([ "diamine oxblood" ]))
+            await asyncio.sleep(0.1)
+            waiting = asyncio.ensure_future(batcher.lookup([ "sailor yama-dori" ]))
+            await asyncio.sleep(0)
+            await batcher.close()
+            await asyncio.wait([ inflight, waiting ])
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert inflight.cancelled() and waiting.cancelled()
+        assert batcher.requests == 1
+        assert not batcher.searches and not batcher.inflight and not batcher.queue
+
+    loop.run_until_complete(run())
@@ -0,0 +1,126 @@
+"""Unittests for the Ink API circuit breaker."""
+
+import asyncio
+import time
+
+import pytest
+
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.lib.inkcyclopedia.breaker import BreakerState
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitBreaker
+from mrfreeze.lib.inkcyclopedia.breaker import CircuitOpenError
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    """Only failures in a row should open the breaker."""
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.failed(0.1)
+    breaker.failed(0.1)
+    breaker.succeeded(0.1)
+    breaker.failed(0.1)
+    breaker.failed(0.1)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow()
+
+    breaker.failed(0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.short_circuit()
+    assert breaker.stats().rejected == 2
+    assert breaker.stats().error_rate == 5 / 6
+
+
+def test_breaker_half_opens_for_a_single_probe():
+    """After the reset timeout one probe should be let through, closing or reopening the breaker."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.failed(0.1)
+    time.sleep(0.06)
+
+    assert not breaker.short_circuit()
+    assert breaker.allow()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.short_circuit()
+    assert not breaker.allow()
+
+    breaker.failed(0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.succeeded(0.1)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow()
+
+
+def test_abandoned_probes_let_another_one_through():
+    """A cancelled probe shouldn't leave the breaker stuck half-open."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.failed(0.1)
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    breaker.abandoned()
+    assert breaker.allow()
+
+
+def test_timeout_adapts_to_latency():
+    """The timeout should follow recent latencies, within its bounds."""
+    breaker = CircuitBreaker(window=10, min_timeout=0.5, max_timeout=5.0)
+    assert breaker.timeout() == 5.0
+
+    for _ in range(10):
+        breaker.succeeded(0.4)
+    assert breaker.timeout() == pytest.approx(1.2)
+
+    for _ in range(10):
+        breaker.succeeded(0.01)
+    assert breaker.timeout() == pytest.approx(0.5)
+
+
+def test_lookups_short_circuit_while_the_api_is_down(loop):
+    """Once the breaker opens, lookups should fail at once without requests, until a probe succeeds."""
+    async def run():
+        api = StubInkAPI()
+        api.status = 500
+        inkcyclopedia = Inkcyclopedia(None)
+        inkcyclopedia.client = InkClient(await api.start())
+        inkcyclopedia.client.breaker.reset_timeout = 0.1
+        inkcyclopedia.batcher.client = inkcyclopedia.client
+        client = inkcyclopedia.client
+        try:
+            for _ in range(5):
+                assert await inkcyclopedia.search_inks([ "Diamine Oxblood" ]) == []
+            assert len(api.searches) == 5
+
+            start = time.perf_counter()
+            with pytest.raises(CircuitOpenError):
+                await client.search([ "Diamine Oxblood" ])
+            assert await inkcyclopedia.search_inks([ "Diamine Oxblood" ]) == []
+            assert time.perf_counter() - start < 0.05
+            assert len(api.searches) == 5
+
+            api.status = 200
+            await asyncio.sleep(0.1)
+            inks = await inkcyclopedia.search_inks([ "Diamine Oxblood" ])
+            embed = inkcyclopedia.stats_embed()
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert [ ink.name for ink in inks ] == [ "Diamine Oxblood" ]
+        assert client.breaker.state == BreakerState.CLOSED
+        assert embed.fields[0].value == "closed"
+        assert "2 lookups skipped" in embed.fields[1].value
+
+    loop.run_until_complete(run())
@@ -0,0 +1,121 @@
+"""Unittests for the cache of Ink API search results."""
+
+import asyncio
+import time
+
+import pytest
+
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.lib.inkcyclopedia.cache import InkCache
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_ink(name):
+    """Create an ink with the given name."""
+    ink = Ink()
+    ink.name = name
+    ink.url = f"https://example.com/{name}.jpg"
+    return ink
+
+
+def using_api(url):
+    """Create an Inkcyclopedia using the API at the given url."""
+    inkcyclopedia = Inkcyclopedia(None)
+    inkcyclopedia.client = InkClient(url)
+    inkcyclopedia.batcher.client = inkcyclopedia.client
+    return inkcyclopedia
+
+
+def test_hits_and_misses_are_counted():
+    """Both found and unknown inks should be cached, and lookups counted."""
+    cache = InkCache()
+    ink = make_ink("oxblood")
+    cache.put("diamine oxblood", ink)
+    cache.put("no such ink", None)
+
+    assert cache.get("diamine oxblood") == (True, ink)
+    assert cache.get("no such ink") == (True, None)
+    assert cache.get("sailor yama-dori") == (False, None)
+    assert cache.stats() == (2, 2, 1)
+
+
+def test_least_recently_used_inks_are_evicted():
+    """The cache should never hold more than size inks, dropping the least recently used."""
+    cache = InkCache(size=2)
+    cache.put("a", make_ink("a"))
+    cache.put("b", make_ink("b"))
+    cache.get("a")
+    cache.put("c", make_ink("c"))
+
+    assert len(cache) == 2
+    assert cache.get("a")[0]
+    assert not cache.get("b")[0]
+    assert cache.get("c")[0]
+
+
+def test_entries_expire():
+    """Unknown inks should expire after the negative ttl, found inks after the ttl."""
+    cache = InkCache(ttl=0.2, negative_ttl=0.05)
+    cache.put("found", make_ink("found"))
+    cache.put("unknown", None)
+    time.sleep(0.1)
+
+    assert cache.get("found")[0]
+    assert not cache.get("unknown")[0]
+    assert len(cache) == 1
+
+    time.sleep(0.15)
+    assert not cache.get("found")[0]
+    assert len(cache) == 0
+
+
+def test_repeat_lookups_skip_the_api(loop):
+    """Inks looked up before should be answered without a request, whatever their case and spacing."""
+    async def run():
+        api = StubInkAPI()
+        inkcyclopedia = using_api(await api.start())
+        try:
+            first = await inkcyclopedia.search_inks([ "Diamine Oxblood", "No Such Ink" ])
+            second = await inkcyclopedia.search_inks([ "diamine  OXBLOOD", "no such ink" ])
+            third = await inkcyclopedia.search_inks([ "Sailor Yama-dori", "diamine oxblood" ])
+        finally:
+            await inkcyclopedia.client.close()
+            await api.stop()
+
+        assert [ ink.name for ink in first ] == [ "Diamine Oxblood" ]
+        assert [ ink.name for ink in second ] == [ "Diamine Oxblood" ]
+        assert [ ink.name for ink in third ] == [ "Sailor Yama-dori", "Diamine Oxblood" ]
+        assert api.searches == [ [ "diamine oxblood", "no such ink" ], [ "sailor yama-dori" ] ]
+        assert inkcyclopedia.cache.stats() == (3, 3, 3)
+
+    loop.run_until_complete(run())
+
+
+def test_failed_lookups_are_not_cached(loop):
+    """Errors from the API shouldn't be remembered as unknown inks."""
+    async def run():
+        api = StubInkAPI()
+        api.status = 500
+        inkcyclopedia = using_api(await api.start())
+        try:
+            assert await inkcyclopedia.search_inks([ "Diamine Oxblood" ]) == []
+            api.status = 200
+            inks = await inkcyclopedia.search_inks([ "Diamine Oxblood" ])
+        finally:
+            await inkcyclopedia.client.close()
+            await api.stop()
+
+        assert [ ink.name for ink in inks ] == [ "Diamine Oxblood" ]
+        assert len(api.searches) == 2
+
+    loop.run_until_complete(run())
@@ -0,0 +1,176 @@
+"""Unittests for the local ink catalogue."""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.inkcyclopedia.catalogue import InkCatalogue
+from mrfreeze.lib.inkcyclopedia.catalogue import read_file
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "inks.json")
+
+
+@pytest.fixture()
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def catalogue(tmp_path):
+    """An empty catalogue, whose connections are closed after the test."""
+    executor.start()
+    catalogue = InkCatalogue(logging.getLogger("test"), str(tmp_path / "inks.db"))
+    catalogue.create_tables()
+    yield catalogue
+    executor.shutdown()
+    connections.close_all()
+
+
+def name(ink):
+    """Get the name of an ink, or None."""
+    return None if ink is None else ink.name
+
+
+def test_fixture_catalogue_is_imported(loop, catalogue):
+    """Every ink in the file should be imported, with all of its details."""
+    result = loop.run_until_complete(catalogue.import_file(FIXTURE))
+
+    assert result == (12, 0, 0, 0)
+    assert catalogue.size == 12
+
+    ink = catalogue.lookup("diamine oxblood")
+    assert ink.id == "101"
+    assert ink.url == "https://example.com/diamine-oxblood.jpg"
+    assert ink.alternates == [ "https://example.com/diamine-oxblood-2.jpg" ]
+    assert ink.submitter == "ink fan"
+    assert catalogue.lookup("sailor yama-dori").review == "https://example.com/review/yama-dori"
+
+
+def test_names_resolve_by_exact_match_prefix_and_trigrams(loop, catalogue):
+    """Names should match exactly, then by prefix, then fuzzily, and unknown names not at all."""
+    loop.run_until_complete(catalogue.import_file(FIXTURE))
+
+    assert name(catalogue.lookup("sailor yama-dori")) == "Sailor Yama-dori"
+    assert name(catalogue.lookup("noodler's baystate")) == "Noodler's Baystate Blue"
+    assert name(catalogue.lookup("pilot iroshizuku")) == "Pilot Iroshizuku Kon-peki"
+    assert name(catalogue.lookup("diamine oxbloood")) == "Diamine Oxblood"
+    assert name(catalogue.lookup("robert oster fire & ice")) == "Robert Oster Fire and Ice"
+    assert catalogue.lookup("lam") is None
+    assert catalogue.lookup("completely unknown ink") is None
+
+
+def test_lookups_are_fast(loop, catalogue):
+    """Local lookups should take well under a millisecond."""
+    loop.run_until_complete(catalogue.import_file(FIXTURE))
+    names = [ "diamine oxblood", "pilot iroshizuku", "diamine oxbloood", "completely unknown ink" ]
+
+    start = time.perf_counter()
+    for _ in range(250):
+        for ink in names:
+            catalogue.lookup(ink)
+    elapsed = (time.perf_counter() - start) / 1000
+
+    assert elapsed < 0.001
+
+
+def test_async_lookups_run_off_the_event_loop(loop, catalogue):
+    """Lookups from the event loop should be run on a database reader thread."""
+    loop.run_until_complete(catalogue.import_file(FIXTURE))
+    threads = list()
+    lookup = catalogue.lookup
+
+    def record(ink):
+        threads.append(threading.current_thread().name)
+        return lookup(ink)
+
+    catalogue.lookup = record
+    assert name(loop.run_until_complete(catalogue.lookup_async("diamine oxblood"))) == "Diamine Oxblood"
+    assert len(threads) == 1 and threads[0].startswith("db-reader")
+
+
+def test_syncs_are_incremental(loop, catalogue):
+    """Syncing should only touch inks which were added, changed or removed in the API."""
+    async def run():
+        api = StubInkAPI()
+        client = InkClient(await api.start())
+        try:
+            first = await catalogue.sync(client)
+            second = await catalogue.sync(client)
+
+            api.catalogue[0] = dict(api.catalogue[0], fullName="Diamine Oxblood Red")
+            del api.catalogue[2]
+            third = await catalogue.sync(client)
+
+            api.status = 500
+            failed = await catalogue.sync(client)
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert first == (3, 0, 0, 0)
+        assert second == (0, 0, 0, 3)
+        assert third == (0, 1, 1, 1)
+        assert failed is None
+        assert catalogue.size == 2
+        assert name(catalogue.lookup("diamine oxblood red")) == "Diamine Oxblood Red"
+
+    loop.run_until_complete(run())
+
+
+def test_broken_syncs_keep_the_catalogue(loop, catalogue):
+    """Error responses should fail the sync, and empty or far shorter ink lists shouldn't remove any inks."""
+    loop.run_until_complete(catalogue.import_file(FIXTURE))
+    entries = read_file(FIXTURE)
+    client = SimpleNamespace(list_inks=AsyncMock())
+
+    for body in ({ "error": "rate limited" }, {}, "rate limited"):
+        client.list_inks.return_value = body
+        assert loop.run_until_complete(catalogue.sync(client)) is None
+
+    client.list_inks.return_value = []
+    assert loop.run_until_complete(catalogue.sync(client)) == (0, 0, 0, 0)
+    client.list_inks.return_value = { "inks": entries[:3] }
+    assert loop.run_until_complete(catalogue.sync(client)) == (0, 0, 0, 3)
+    assert catalogue.size == 12
+    assert name(catalogue.lookup("diamine oxbloood")) == "Diamine Oxblood"
+
+    client.list_inks.return_value = { ink["id"]: ink for ink in entries[1:] }
+    assert loop.run_until_complete(catalogue.sync(client)) == (0, 0, 1, 11)
+    assert catalogue.size == 11
+
+
+def test_local_inks_skip_the_api(loop, catalogue):
+    """Inks in the catalogue should be found without asking the API, other inks still should be."""
+    async def run():
+        api = StubInkAPI()
+        inkcyclopedia = Inkcyclopedia(None)
+        inkcyclopedia.catalogue = catalogue
+        inkcyclopedia.client = InkClient(await api.start())
+        inkcyclopedia.batcher.client = inkcyclopedia.client
+        try:
+            await catalogue.import_file(FIXTURE)
+            local = await inkcyclopedia.search_inks([ "Lamy Petrol", "KWZ Honey" ])
+            remote = await inkcyclopedia.search_inks([ "Lamy Petrol", "Kon-peki" ])
+        finally:
+            await inkcyclopedia.client.close()
+            await api.stop()
+
+        assert [ ink.name for ink in local ] == [ "Lamy Petrol", "KWZ Honey" ]
+        assert [ ink.name for ink in remote ] == [ "Lamy Petrol" ]
+        assert api.searches == [ [ "kon-peki" ] ]
+
+    loop.run_until_complete(run())
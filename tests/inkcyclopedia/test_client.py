@@ -0,0 +1,118 @@
+"""Unittests for the asynchronous Ink API client."""
+
+import asyncio
+
+import aiohttp
+
+import pytest
+
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.client import parse_response
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_parse_response_skips_incomplete_inks():
+    """Only inks with a name and an image should be returned."""
+    inks = parse_response({ "found": {
+        "a": { "fullName": "Ink A", "primaryImage": "a.jpg", "alternateImages": [ "b.jpg" ] },
+        "b": { "fullName": "Ink B" },
+        "c": { "fullName": "", "primaryImage": "c.jpg" },
+    }})
+
+    assert [ ink.name for ink in inks.values() ] == [ "Ink A" ]
+    assert inks["a"].alternates == [ "b.jpg" ]
+    assert parse_response({}) == {}
+
+
+def test_loop_keeps_running_during_slow_lookups(loop):
+    """Other coroutines should keep running while a lookup waits on the API."""
+    async def run():
+        api = StubInkAPI(delay=0.5)
+        client = InkClient(await api.start())
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        try:
+            inks = await client.search([ "Diamine Oxblood", "No Such Ink" ])
+        finally:
+            task.cancel()
+            await client.close()
+            await api.stop()
+
+        assert [ ink.name for ink in inks.values() ] == [ "Diamine Oxblood" ]
+        assert inks["diamine oxblood"].submitter == "ink fan"
+        assert ticks >= 20
+
+    loop.run_until_complete(run())
+
+
+def test_slow_lookups_time_out(loop):
+    """Lookups taking longer than the timeout should be given up on."""
+    async def run():
+        api = StubInkAPI(delay=1.0)
+        client = InkClient(await api.start(), timeout=0.1)
+        start = loop.time()
+        try:
+            # Older aiohttp versions wrap the timeout in a ClientOSError on Python 3.11+.
+            with pytest.raises((asyncio.TimeoutError, aiohttp.ClientError)):
+                await client.search([ "Diamine Oxblood" ])
+        finally:
+            await client.close()
+            await api.stop()
+
+        assert loop.time() - start < 0.5
+
+    loop.run_until_complete(run())
+
+
+def test_errors_are_raised(loop):
+    """Error responses from the API should raise."""
+    async def run():
+        api = StubInkAPI()
+        api.status = 500
+        client = InkClient(await api.start())
+        try:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await client.search([ "Diamine Oxblood" ])
+        finally:
+            await client.close()
+            await api.stop()
+
+    loop.run_until_complete(run())
+
+
+def test_connections_are_reused_and_closed(loop):
+    """Lookups should share one kept-alive connection, which is closed with the client."""
+    async def run():
+        api = StubInkAPI()
+        client = InkClient(await api.start())
+        try:
+            for _ in range(5):
+                await client.search([ "Sailor Yama-dori" ])
+            session = client.session
+            assert session is not None
+
+            await client.close()
+            assert session.closed
+            assert client.session is None
+        finally:
+            await api.stop()
+
+        assert len(api.clients) == 1
+        assert len(api.searches) == 5
+
+    loop.run_until_complete(run())
@@ -0,0 +1,165 @@
+"""Unittests for the on-disk cache of Ink API lookups."""
+
+import asyncio
+import logging
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.inkcyclopedia.client import InkClient
+from mrfreeze.lib.inkcyclopedia.ink import Ink
+from mrfreeze.lib.inkcyclopedia.persistent_cache import PersistentInkCache
+from tests.inkcyclopedia.stub_server import StubInkAPI
+
+
+@pytest.fixture()
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a fresh ink database, whose connections are closed after the test."""
+    executor.start()
+    yield str(tmp_path / "inks.db")
+    executor.shutdown()
+    connections.close_all()
+
+
+def persistent_cache(dbpath, **kwargs):
+    """Create a persistent cache with its table."""
+    cache = PersistentInkCache(logging.getLogger("test"), dbpath, **kwargs)
+    cache.create_table()
+    return cache
+
+
+def using_api(url, dbpath):
+    """Create an Inkcyclopedia using the API at the given url, storing its lookups at dbpath."""
+    inkcyclopedia = Inkcyclopedia(None)
+    inkcyclopedia.client = InkClient(url)
+    inkcyclopedia.batcher.client = inkcyclopedia.client
+    inkcyclopedia.inkydb = persistent_cache(dbpath)
+    return inkcyclopedia
+
+
+def test_lookups_survive_restarts(loop, dbpath):
+    """Saved lookups, found or not, should be read back by a new cache."""
+    ink = Ink()
+    ink.id = "1"
+    ink.name = "Diamine Oxblood"
+    ink.url = "https://example.com/oxblood.jpg"
+    ink.alternates = [ "https://example.com/oxblood2.jpg" ]
+
+    first = persistent_cache(dbpath)
+    first.save("diamine oxblood", ink)
+    first.save("no such ink", None)
+    loop.run_until_complete(first.close())
+
+    second = persistent_cache(dbpath)
+    stored = loop.run_until_complete(second.load("diamine oxblood"))
+    assert stored.ink.name == "Diamine Oxblood"
+    assert stored.ink.alternates == [ "https://example.com/oxblood2.jpg" ]
+    assert 0 < second.expires_in(stored) <= second.ttl
+    assert loop.run_until_complete(second.load("no such ink")).ink is None
+    assert loop.run_until_complete(second.load("sailor yama-dori")) is None
+    assert set(second.writes.pending) == { ("used", "diamine oxblood"), ("used", "no such ink") }
+    loop.run_until_complete(second.close())
+
+
+def test_restarted_cog_is_served_locally(loop, dbpath):
+    """After a restart, inks looked up before should be answered without asking the API."""
+    async def run():
+        api = StubInkAPI()
+        url = await api.start()
+        try:
+            before = using_api(url, dbpath)
+            await before.search_inks([ "Diamine Oxblood", "No Such Ink" ])
+            await before.inkydb.close()
+            await before.client.close()
+
+            after = using_api(url, dbpath)
+            inks = await after.search_inks([ "Diamine Oxblood", "No Such Ink" ])
+            await after.inkydb.close()
+            await after.client.close()
+        finally:
+            await api.stop()
+
+        assert [ ink.name for ink in inks ] == [ "Diamine Oxblood" ]
+        assert len(api.searches) == 1
+
+    loop.run_until_complete(run())
+
+
+def test_stale_lookups_are_refreshed_most_recently_used_first(loop, dbpath):
+    """Stale lookups should still be served, and refreshed from the API in the background."""
+    async def run():
+        api = StubInkAPI()
+        url = await api.start()
+        try:
+            inkcyclopedia = using_api(url, dbpath)
+            await inkcyclopedia.search_inks([ "Diamine Oxblood" ])
+            await inkcyclopedia.search_inks([ "Sailor Yama-dori" ])
+            await inkcyclopedia.inkydb.close()
+
+            # Restart with a ttl that makes every stored lookup stale.
+            inkcyclopedia.inkydb = persistent_cache(dbpath, ttl=0)
+            inkcyclopedia.cache.clear()
+            inks = await inkcyclopedia.search_inks([ "Diamine Oxblood" ])
+            await inkcyclopedia.inkydb.writes.flush()
+
+            stale = await inkcyclopedia.inkydb.stale()
+            refreshed = await inkcyclopedia.refresh_stale()
+            await inkcyclopedia.inkydb.close()
+            await inkcyclopedia.client.close()
+        finally:
+            await api.stop()
+
+        assert [ ink.name for ink in inks ] == [ "Diamine Oxblood" ]
+        assert stale == [ "diamine oxblood", "sailor yama-dori" ]
+        assert refreshed == 2
+        assert api.searches[-1] == [ "diamine oxblood", "sailor yama-dori" ]
+
+    loop.run_until_complete(run())
+
+
+def test_unloading_closes_everything(loop, dbpath, caplog):
+    """Unloading the cog should write the stored lookups and close the client, logging what failed."""
+    bot = MagicMock()
+    bot.add_bg_task = lambda task, name: bot.bg_tasks.__setitem__(name, loop.create_task(task))
+    bot.bg_tasks = dict()
+
+    inkcyclopedia = Inkcyclopedia(bot)
+    inkcyclopedia.inkydb = persistent_cache(dbpath)
+    inkcyclopedia.inkydb.save("no such ink", None)
+    inkcyclopedia.client.session = MagicMock()
+    inkcyclopedia.client.close = AsyncMock(side_effect=RuntimeError("already closed"))
+
+    inkcyclopedia.cog_unload()
+    loop.run_until_complete(bot.bg_tasks["ink_close"])
+
+    assert not inkcyclopedia.inkydb.writes.pending
+    inkcyclopedia.client.close.assert_awaited_once()
+    assert "already closed" in caplog.text
+
+
+def test_closing_stops_the_background_tasks(loop, dbpath):
+    """Closing the cog when the bot shuts down should cancel its tasks and write the stored lookups."""
+    bot = MagicMock()
+    bot.bg_tasks = { "ink_catalogue": MagicMock(), "ink_refresh": MagicMock() }
+
+    inkcyclopedia = Inkcyclopedia(bot)
+    inkcyclopedia.inkydb = persistent_cache(dbpath)
+    inkcyclopedia.inkydb.save("no such ink", None)
+
+    loop.run_until_complete(inkcyclopedia.close())
+
+    assert not inkcyclopedia.inkydb.writes.pending
+    for task in bot.bg_tasks.values():
+        task.cancel.assert_called_once()
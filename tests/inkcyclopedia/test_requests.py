@@ -0,0 +1,26 @@
+"""Unittests for finding ink requests in messages."""
+
+from mrfreeze.cogs.inkcyclopedia import Inkcyclopedia
+
+
+def test_prefiltered_requests_match_the_regex():
+    """Skipping messages without a { should find exactly what the regex finds on its own."""
+    inkcyclopedia = Inkcyclopedia(None)
+    messages = [
+        "{Diamine Oxblood}",
+        "try {sailor yama-dori} or {KWZ Honey}",
+        "{ }",
+        "{unclosed",
+        "closed}",
+        "{°C}",
+        "20°C and {Lamy Petrol}",
+        "{{nested}}",
+        "no brackets at all",
+        "",
+    ]
+
+    for content in messages:
+        assert inkcyclopedia.find_requests(content) == inkcyclopedia.bracketmatch.findall(content)
+
+    assert inkcyclopedia.find_requests("try {sailor yama-dori} or {KWZ Honey}") == [ "sailor yama-dori", "KWZ Honey" ]
+    assert inkcyclopedia.find_requests("20°C and {Lamy Petrol}") == [ "Lamy Petrol" ]
@@ -0,0 +1,167 @@
+"""Unittests for crawling the number of pins in every channel."""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+
+from mrfreeze.lib.pins.crawler import PinCrawler
+from mrfreeze.lib.pins.index import PinIndex
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+class FakeChannel:
+    """A channel whose pins take a while to fetch, and which keeps track of how many are fetched at once."""
+
+    active = 0
+    most_active = 0
+
+    def __init__(self, channel_id, guild, num_pins, delay=0.02, errors=()):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.guild = guild
+        self.num_pins = num_pins
+        self.delay = delay
+        self.errors = list(errors)
+
+    async def pins(self):
+        FakeChannel.active += 1
+        FakeChannel.most_active = max(FakeChannel.most_active, FakeChannel.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            return [ SimpleNamespace(id=self.id * 100 + i) for i in range(self.num_pins) ]
+        finally:
+            FakeChannel.active -= 1
+
+
+def guild(guild_id):
+    """Create a guild for fake channels."""
+    return SimpleNamespace(id=guild_id, name=f"guild-{guild_id}")
+
+
+def crawler(**kwargs):
+    """Create a crawler with an index which isn't stored on disk."""
+    logger = logging.getLogger("test")
+    return PinCrawler(PinIndex(logger), logger, **kwargs)
+
+
+def counts(pins):
+    """Get the number of pins in every crawled channel."""
+    return { channel: state.count for channel, state in pins.index.states.items() }
+
+
+def http_error(status, headers=None):
+    """Create the exception discord.py raises for a failed request."""
+    response = MagicMock(status=status, reason="error", headers=headers or dict())
+    return discord.HTTPException(response, "error")
+
+
+def test_crawl_is_concurrent_but_bounded(loop):
+    """Pins should be fetched a few channels at a time, never more than concurrency."""
+    FakeChannel.active = FakeChannel.most_active = 0
+    home = guild(1)
+    channels = [ FakeChannel(i, home, i % 3) for i in range(20) ]
+    pins = crawler(concurrency=4, max_rate=0)
+
+    stats = loop.run_until_complete(pins.crawl(channels))
+
+    assert FakeChannel.most_active == 4
+    assert stats.crawled == 20 and stats.failed == 0
+    assert stats.elapsed < 20 * 0.02
+    assert counts(pins) == { i: i % 3 for i in range(20) }
+    assert pins.guild_ready(1)
+
+
+def test_guilds_are_ready_one_by_one(loop):
+    """A guild and its channels should be usable before the rest of the crawl is done."""
+    first, second = guild(1), guild(2)
+    channels = [ FakeChannel(i, first, 1) for i in range(4) ]
+    channels += [ FakeChannel(i, second, 1, delay=0.2) for i in range(4, 8) ]
+    pins = crawler(concurrency=4, max_rate=0)
+
+    async def run():
+        crawl = asyncio.ensure_future(pins.crawl(channels))
+        await asyncio.sleep(0.1)
+        during = (pins.guild_ready(1), pins.guild_ready(2))
+        crawled = (pins.ready(channels[0]), pins.index.get(4))
+        await crawl
+        return during, crawled
+
+    assert loop.run_until_complete(run()) == ((True, False), (True, None))
+    assert pins.guild_ready(2)
+    assert pins.index.get(4).messages == (400,)
+
+
+def test_new_channels_are_ready(loop):
+    """Channels which weren't listed for the crawl are ready once it has started, but nothing is before."""
+    home = guild(1)
+    pins = crawler(max_rate=0)
+    new = FakeChannel(10, home, 0)
+    assert not pins.ready(new)
+
+    loop.run_until_complete(pins.crawl([ FakeChannel(1, home, 2) ]))
+    assert pins.ready(new)
+
+
+def test_validated_channels_are_skipped(loop):
+    """Channels fetched because of a pin event while the crawl was waiting shouldn't be fetched again."""
+    home = guild(1)
+    first, second = FakeChannel(1, home, 2), FakeChannel(2, home, 2)
+    pins = crawler(concurrency=1, max_rate=0)
+    pins.index.update(second, [ 5 ])
+
+    stats = loop.run_until_complete(pins.crawl([ first, second ]))
+
+    assert stats.crawled == 1
+    assert pins.index.get(2).messages == (5,)
+    assert pins.guild_ready(1)
+
+
+def test_rate_limited_channels_are_retried(loop):
+    """A rate limited request should hold back every request and then be retried."""
+    home = guild(1)
+    limited = FakeChannel(1, home, 3, errors=[ http_error(429, { "Retry-After": "0.2" }) ])
+    others = [ FakeChannel(i, home, 1) for i in range(2, 5) ]
+    pins = crawler(concurrency=4, max_rate=0)
+
+    stats = loop.run_until_complete(pins.crawl([ limited, *others ]))
+
+    assert stats.rate_limited == 1 and stats.failed == 0
+    assert stats.elapsed >= 0.2
+    assert pins.index.get(1).count == 3
+
+
+def test_failed_channels_are_skipped(loop):
+    """A channel whose pins can't be fetched shouldn't stop the rest of the crawl."""
+    home = guild(1)
+    hidden = FakeChannel(1, home, 3, errors=[ http_error(403) ])
+    pins = crawler(max_rate=0)
+
+    stats = loop.run_until_complete(pins.crawl([ hidden, FakeChannel(2, home, 1) ]))
+
+    assert stats.failed == 1 and stats.crawled == 1
+    assert pins.guild_ready(1)
+    assert counts(pins) == { 2: 1 }
+
+
+def test_requests_are_spaced_out(loop):
+    """No more than max_rate requests should be sent per second."""
+    home = guild(1)
+    channels = [ FakeChannel(i, home, 0, delay=0) for i in range(6) ]
+    pins = crawler(concurrency=6, max_rate=50)
+
+    stats = loop.run_until_complete(pins.crawl(channels))
+
+    assert stats.elapsed >= 5 / 50
@@ -0,0 +1,114 @@
+"""Unittests for coalescing bursts of pin events."""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from mrfreeze.lib.pins.debouncer import PinDebouncer
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def channel(channel_id):
+    """Create a channel to push events for."""
+    return SimpleNamespace(id=channel_id, name=f"channel-{channel_id}")
+
+
+class Reconciler:
+    """Records when each channel is reconciled, taking delay seconds to do it."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = list()
+        self.active = 0
+        self.most_active = 0
+
+    async def __call__(self, channel):
+        self.calls.append((channel.id, asyncio.get_running_loop().time()))
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("no pins for you")
+        finally:
+            self.active -= 1
+
+
+def test_bursts_are_reconciled_once_per_channel(loop):
+    """Events in quick succession should result in one reconciliation for each channel."""
+    reconcile = Reconciler()
+    debouncer = PinDebouncer(reconcile, logging.getLogger("test"), window=0.05)
+
+    async def run():
+        for _ in range(5):
+            debouncer.push(channel(1))
+            debouncer.push(channel(2))
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+
+    loop.run_until_complete(run())
+
+    assert sorted([ channel_id for channel_id, _ in reconcile.calls ]) == [ 1, 2 ]
+    assert debouncer.stats() == (10, 2, 0, 0)
+
+
+def test_long_bursts_are_cut_off(loop):
+    """A burst which doesn't end should still be reconciled max_delay after its first event."""
+    reconcile = Reconciler()
+    debouncer = PinDebouncer(reconcile, logging.getLogger("test"), window=0.05, max_delay=0.1)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        for _ in range(10):
+            debouncer.push(channel(1))
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.1)
+        return start
+
+    start = loop.run_until_complete(run())
+
+    assert len(reconcile.calls) >= 2
+    assert reconcile.calls[0][1] - start == pytest.approx(0.1, abs=0.04)
+
+
+def test_channels_are_not_reconciled_twice_at_once(loop):
+    """A burst ending during a reconciliation should wait for it, and failures shouldn't stop later bursts."""
+    reconcile = Reconciler(delay=0.1, fail=True)
+    debouncer = PinDebouncer(reconcile, logging.getLogger("test"), window=0.01)
+
+    async def run():
+        debouncer.push(channel(1))
+        await asyncio.sleep(0.05)
+        debouncer.push(channel(1))
+        await asyncio.sleep(0.3)
+
+    loop.run_until_complete(run())
+
+    assert reconcile.most_active == 1
+    assert len(reconcile.calls) == 2
+    assert reconcile.calls[1][1] - reconcile.calls[0][1] >= 0.1
+    assert not debouncer.running
+
+
+def test_cancel_drops_waiting_events(loop):
+    """Cancelling should drop events which haven't been reconciled yet."""
+    reconcile = Reconciler()
+    debouncer = PinDebouncer(reconcile, logging.getLogger("test"), window=0.05)
+
+    async def run():
+        debouncer.push(channel(1))
+        debouncer.cancel()
+        await asyncio.sleep(0.1)
+
+    loop.run_until_complete(run())
+    assert reconcile.calls == []
@@ -0,0 +1,87 @@
+"""Unittests for the index of pins stored on disk."""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.pins.index import PinIndex
+
+
+@pytest.fixture()
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a fresh pins database, whose connections are closed after the test."""
+    executor.start()
+    yield str(tmp_path / "pins.db")
+    executor.shutdown()
+    connections.close_all()
+
+
+def channel(channel_id, guild_id=1):
+    """Create a channel to store pins for."""
+    return SimpleNamespace(id=channel_id, name=f"channel-{channel_id}", guild=SimpleNamespace(id=guild_id))
+
+
+def loaded_index(dbpath, **kwargs):
+    """Create an index and load what's stored at dbpath."""
+    index = PinIndex(logging.getLogger("test"), dbpath, **kwargs)
+    assert index.load()
+    return index
+
+
+def test_pins_survive_restarts(loop, dbpath):
+    """Stored pins should be read back by a new index, without counting as checked since the restart."""
+    async def run():
+        index = loaded_index(dbpath)
+        index.update(channel(1), [ 30, 20, 10 ])
+        index.update(channel(2), [])
+        await index.close()
+
+    loop.run_until_complete(run())
+    index = loaded_index(dbpath)
+
+    assert index.get(1).messages == (30, 20, 10)
+    assert index.get(1).count == 3
+    assert index.get(2).count == 0
+    assert index.get(3) is None
+    assert not index.validated
+
+
+def test_restarts_only_sweep_stale_channels(loop, dbpath):
+    """After a restart only channels never fetched or not checked for max_age should be swept."""
+    async def run():
+        index = loaded_index(dbpath)
+        index.update(channel(1), [ 10 ])
+        await index.close()
+
+    loop.run_until_complete(run())
+    index = loaded_index(dbpath)
+    channels = [ channel(1), channel(2), channel(3, guild_id=2) ]
+    assert index.sweep_order(channels) == channels[1:]
+
+    index.max_age = 0
+    assert index.sweep_order(channels) == [ channels[1], channels[2], channels[0] ]
+
+    # Channels fetched since the restart are never swept.
+    index.update(channel(2), [])
+    assert index.sweep_order(channels) == [ channels[2], channels[0] ]
+
+
+def test_unloaded_index_writes_nothing(dbpath):
+    """An index which hasn't been loaded should keep pins in memory only."""
+    index = PinIndex(logging.getLogger("test"), dbpath)
+    index.update(channel(1), [ 10 ])
+
+    assert index.get(1).count == 1
+    assert index.writes.depth == 0
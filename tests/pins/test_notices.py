@@ -0,0 +1,77 @@
+"""Unittests for matching pin notices with their pin events."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from mrfreeze.lib.pins.notices import PinNotices
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def notice(channel_id, pinned_id=None):
+    """Create the system message saying a message was pinned."""
+    reference = SimpleNamespace(message_id=pinned_id) if pinned_id is not None else None
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id), reference=reference)
+
+
+def test_notice_arriving_first_is_kept(loop):
+    """A notice arriving before its pin event should be found without waiting, and only once."""
+    notices = PinNotices(wait=1.0)
+    first, second = notice(1, 10), notice(1, 11)
+    notices.add(first)
+    notices.add(second)
+
+    assert loop.run_until_complete(notices.find(1, 11)) is second
+    assert notices.take(1, 11) is None
+    assert notices.take(2, 10) is None
+    assert notices.take(1, 10) is first
+
+
+def test_pin_event_waits_for_its_notice(loop):
+    """A pin event arriving before its notice should get it as soon as it shows up."""
+    notices = PinNotices(wait=1.0)
+    pinned = notice(1, 10)
+
+    async def run():
+        found = asyncio.ensure_future(notices.find(1, 10))
+        await asyncio.sleep(0.01)
+        notices.add(notice(1, 11))
+        notices.add(pinned)
+        return await found
+
+    assert loop.run_until_complete(run()) is pinned
+    assert not notices.waiters
+    assert notices.take(1, 11) is not None
+
+
+def test_notices_without_a_reference_go_to_their_channel(loop):
+    """A notice which doesn't say what was pinned should go to any pin event in its channel."""
+    notices = PinNotices(wait=1.0)
+    anonymous = notice(1)
+
+    async def run():
+        found = asyncio.ensure_future(notices.find(1, 10))
+        await asyncio.sleep(0.01)
+        notices.add(anonymous)
+        return await found
+
+    assert loop.run_until_complete(run()) is anonymous
+
+
+def test_missing_and_old_notices(loop):
+    """Pin events should give up on notices which never arrive, and old notices should be forgotten."""
+    notices = PinNotices(ttl=0.05, wait=0.05)
+    assert loop.run_until_complete(notices.find(1, 10)) is None
+    assert not notices.waiters
+
+    notices.add(notice(1, 10))
+    loop.run_until_complete(asyncio.sleep(0.1))
+    assert notices.take(1, 10) is None
@@ -0,0 +1,192 @@
+"""Unittests for announcing pins in the PinHandler cog."""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+
+from mrfreeze.cogs.pin_handling import PinHandler
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib.pins.index import PinIndex
+from mrfreeze.lib.pins.index import PinState
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to a fresh pins database, whose connections are closed after the test."""
+    executor.start()
+    yield str(tmp_path / "pins.db")
+    executor.shutdown()
+    connections.close_all()
+
+
+def message(message_id):
+    """Create a message which can be pinned."""
+    author = SimpleNamespace(display_name="penguin", avatar_url="", mention="@penguin")
+    return SimpleNamespace(
+        id=message_id,
+        author=author,
+        content=f"message {message_id}",
+        attachments=[],
+        jump_url=f"https://discord.com/channels/1/1/{message_id}")
+
+
+def channel(pinned):
+    """Create a channel with the given messages pinned, newest first."""
+    return SimpleNamespace(
+        id=1,
+        name="general",
+        guild=SimpleNamespace(id=1),
+        pins=AsyncMock(return_value=[ message(i) for i in pinned ]),
+        send=AsyncMock(),
+        delete_messages=AsyncMock())
+
+
+def notice(channel, pinned_id):
+    """Create the system message saying a message was pinned."""
+    return SimpleNamespace(
+        channel=channel,
+        reference=SimpleNamespace(message_id=pinned_id),
+        author=SimpleNamespace(mention="@mod"))
+
+
+def pin_handler(dbpath):
+    """Create a PinHandler storing its pins at dbpath, with pin notices it doesn't wait long for."""
+    handler = PinHandler(MagicMock(listener_block_check=lambda channel: False))
+    handler.debouncer.window = handler.debouncer.max_delay = 0.05
+    handler.index = PinIndex(logging.getLogger("test"), dbpath)
+    handler.index.load()
+    handler.crawler.index = handler.index
+    handler.notices.wait = 0.05
+    return handler
+
+
+def announced(channel):
+    """Get who pinned the messages announced in each post in a channel, and their IDs."""
+    posts = list()
+    for call in channel.send.call_args_list:
+        embed = call.kwargs["embed"]
+        if embed.fields:
+            messages = [ int(field.value.split()[1]) for field in embed.fields ]
+        else:
+            messages = [ int(embed.description.split()[-1]) ]
+        posts.append((call.args[0].split(" by ")[1].rstrip(":\n"), messages))
+    return posts
+
+
+def test_new_pins_are_announced_with_their_pinner(loop, dbpath):
+    """Every newly pinned message should be announced in the order it was pinned, replacing its notice."""
+    handler = pin_handler(dbpath)
+    general = channel([ 3, 2, 1 ])
+    handler.index.update(general, [ 1 ])
+    pin_notice = notice(general, 3)
+
+    async def run():
+        handler.notices.add(pin_notice)
+        await handler.reconcile(general)
+        await handler.index.close()
+
+    loop.run_until_complete(run())
+
+    # Message 2 has no notice, so nobody knows who pinned it.
+    assert announced(general) == [ ("Some mod, @mod", [ 2, 3 ]) ]
+    general.delete_messages.assert_awaited_once_with([ pin_notice ])
+    assert handler.index.get(1).messages == (3, 2, 1)
+    general.pins.assert_awaited_once()
+
+
+def test_unpin_and_pin_is_announced(loop, dbpath):
+    """A pin removed and another added before the event should still be announced, the count being unchanged."""
+    handler = pin_handler(dbpath)
+    general = channel([ 3, 1 ])
+    handler.index.update(general, [ 2, 1 ])
+
+    async def run():
+        await handler.reconcile(general)
+        await handler.index.close()
+
+    loop.run_until_complete(run())
+    assert announced(general) == [ ("Some mod", [ 3 ]) ]
+
+
+def test_pins_added_while_offline_are_not_announced(loop, dbpath):
+    """The first event after a restart should only announce the newest pin, not everything pinned while offline."""
+    handler = pin_handler(dbpath)
+    general = channel([ 4, 3, 2, 1 ])
+    handler.index.states[1] = PinState(1, (1,), 0.0)
+    pin_notice = notice(general, 4)
+
+    async def run():
+        handler.notices.add(pin_notice)
+        await handler.reconcile(general)
+        await handler.index.close()
+
+    loop.run_until_complete(run())
+
+    assert announced(general) == [ ("@mod", [ 4 ]) ]
+    assert handler.index.get(1).messages == (4, 3, 2, 1)
+    assert 1 in handler.index.validated
+
+
+def test_removed_pins_are_not_announced(loop, dbpath):
+    """Unpinning a message should only update the index."""
+    handler = pin_handler(dbpath)
+    general = channel([ 1 ])
+    handler.index.update(general, [ 2, 1 ])
+
+    async def run():
+        await handler.reconcile(general)
+        await handler.index.close()
+
+    loop.run_until_complete(run())
+    general.send.assert_not_awaited()
+    assert handler.index.get(1).messages == (1,)
+
+
+def test_pin_storms_are_reconciled_once(loop, dbpath):
+    """A burst of pin events in a channel should fetch its pins once, and announce every new pin in one post."""
+    handler = pin_handler(dbpath)
+    general = channel([ 5, 4, 3, 2, 1 ])
+    handler.index.update(general, [ 1 ])
+
+    async def run():
+        for pinned_id in range(2, 6):
+            handler.notices.add(notice(general, pinned_id))
+            await handler.on_guild_channel_pins_update(general, None)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        await handler.index.close()
+
+    loop.run_until_complete(run())
+
+    general.pins.assert_awaited_once()
+    assert announced(general) == [ ("@mod", [ 2, 3, 4, 5 ]) ]
+    assert handler.debouncer.stats().events == 4
+    assert handler.debouncer.stats().reconciliations == 1
+
+
+def test_closing_stops_the_sweep_and_writes_the_pins(loop, dbpath):
+    """Closing the cog should cancel the sweep and wait for the stored pins to be written to disk."""
+    handler = pin_handler(dbpath)
+    sweep = MagicMock()
+    handler.bot.bg_tasks = { "pin_sweep": sweep }
+    handler.index.update(channel([ 2, 1 ]), [ 2, 1 ])
+
+    loop.run_until_complete(handler.close())
+
+    sweep.cancel.assert_called_once()
+    assert not handler.index.writes.pending
+    stored = PinIndex(logging.getLogger("test"), dbpath)
+    assert stored.load() and stored.get(1).messages == (2, 1)
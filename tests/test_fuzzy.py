@@ -0,0 +1,92 @@
+"""Unittests for fuzzy string matching."""
+
+import random
+import string
+
+from mrfreeze.lib import default
+from mrfreeze.lib.fuzzy import BKTree
+from mrfreeze.lib.fuzzy import closest
+from mrfreeze.lib.fuzzy import edit_distance
+
+
+def reference_distance(a, b):
+    """Levenshtein distance the textbook way, with a full matrix."""
+    matrix = [ [ 0 ] * (len(b) + 1) for _ in range(len(a) + 1) ]
+    for i in range(len(a) + 1):
+        matrix[i][0] = i
+    for j in range(len(b) + 1):
+        matrix[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            matrix[i][j] = min(matrix[i - 1][j] + 1, matrix[i][j - 1] + 1, matrix[i - 1][j - 1] + cost)
+    return matrix[len(a)][len(b)]
+
+
+def random_words(count, seed=0):
+    """Create some random lowercase words."""
+    rng = random.Random(seed)
+    return [ "".join(rng.choices(string.ascii_lowercase[:8], k=rng.randint(0, 9))) for _ in range(count) ]
+
+
+def test_edit_distance():
+    """Distances should be right, including the first and last characters and empty strings."""
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("sitting", "kitten") == 3
+    assert edit_distance("antarctica", "antarctica") == 0
+    assert edit_distance("antartica", "antarctica") == 1
+    assert edit_distance("", "abc") == 3
+    assert edit_distance("abc", "") == 3
+    assert edit_distance("a", "b") == 1
+
+    words = random_words(60)
+    for a in words:
+        for b in words:
+            assert edit_distance(a, b) == reference_distance(a, b)
+
+
+def test_edit_distance_cutoff():
+    """Distances over the limit should be reported as limit + 1."""
+    words = random_words(60, seed=1)
+    for a in words:
+        for b in words:
+            for limit in range(4):
+                assert edit_distance(a, b, limit) == min(reference_distance(a, b), limit + 1)
+
+
+def test_word_distance_is_fixed():
+    """The old word distance ignored the first characters and only ever set a single cell."""
+    assert default.word_distance("cat", "bat") == 1
+    assert default.word_distance("kitten", "sitting") == 3
+    assert default.get_closest_match([ "europe", "asia", "africa" ], "eurpoe") == "europe"
+
+
+def test_closest():
+    """The closest candidate should be found, preferring the first of equally close ones."""
+    assert closest([ "asia", "europe", "africa" ], "afrika") == ("africa", 1)
+    assert closest([ "ab", "ba" ], "aa") == ("ab", 1)
+    assert closest([], "anything") is None
+
+
+def test_bk_tree_matches_brute_force():
+    """The tree should find the same words and distances as comparing with every word."""
+    words = random_words(500, seed=2)
+    tree = BKTree(words)
+    assert len(tree) == len(set(words))
+
+    for query in random_words(50, seed=3):
+        distances = { word: reference_distance(query, word) for word in set(words) }
+        expected = sorted(word for word, distance in distances.items() if distance <= 2)
+        assert sorted(word for word, _ in tree.search(query, 2)) == expected
+
+        match = tree.closest(query)
+        assert match[1] == min(distances.values())
+        assert distances[match[0]] == match[1]
+
+
+def test_bk_tree_max_distance():
+    """Nothing should be found if no word is close enough."""
+    tree = BKTree([ "europe", "asia" ])
+    assert tree.closest("eurpoe", max_distance=2) == ("europe", 2)
+    assert tree.closest("australia", max_distance=2) is None
+    assert BKTree().closest("anything") is None
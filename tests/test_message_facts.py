@@ -0,0 +1,68 @@
+"""Unittests for the shared message pre-processing."""
+
+from types import SimpleNamespace
+
+from discord import MessageType
+
+from mrfreeze.database.guild_settings import MutedFeature
+from mrfreeze.lib.message_facts import MessageFacts
+from mrfreeze.lib.message_facts import MessageFilter
+from mrfreeze.lib.message_facts import MessagePipeline
+from mrfreeze.lib.message_facts import message_listener
+
+
+def facts(content, bot=False, muted=0, command=None, message_type=MessageType.default):
+    """Create the MessageFacts of a message with the given content."""
+    message = SimpleNamespace(
+        content=content,
+        type=message_type,
+        author=SimpleNamespace(bot=bot),
+        guild=SimpleNamespace(id=1))
+    ctx = None if bot else SimpleNamespace(command=command)
+    return MessageFacts(message, ctx, muted)
+
+
+def test_facts_are_worked_out_from_the_message():
+    """Digits, braces and commands should be detected."""
+    message_facts = facts("{ink} 10", command="ink")
+
+    assert message_facts.has_digits
+    assert message_facts.has_brace
+    assert message_facts.is_command
+    assert not facts("hello").has_digits
+
+
+def test_filters_skip_unwanted_messages():
+    """Listeners should only get messages that pass all of their filters."""
+    temperatures = MessageFilter(blocked_by=MutedFeature.TEMPCONVERTER, has_digits=True)
+
+    assert temperatures.matches(facts("it's 10 c"))
+    assert not temperatures.matches(facts("it's hot"))
+    assert not temperatures.matches(facts("it's 10 c", bot=True))
+    assert not temperatures.matches(facts("it's 10 c", muted=MutedFeature.TEMPCONVERTER))
+    assert temperatures.matches(facts("it's 10 c", muted=MutedFeature.INKCYCLOPEDIA))
+    assert MessageFilter(commands=True).matches(facts("!help", command="help"))
+    assert not MessageFilter(commands=True).matches(facts("help"))
+    assert MessageFilter(pin_notice=True).matches(facts("", message_type=MessageType.pins_add))
+    assert not MessageFilter(pin_notice=True).matches(facts("pinned it"))
+
+
+def test_cog_listeners_are_subscribed_and_unsubscribed():
+    """Decorated methods of a cog should be subscribed with their filters."""
+    class Cog:
+        @message_listener(has_brace=True)
+        async def braces(self, facts):
+            pass
+
+        async def not_a_listener(self, facts):
+            pass
+
+    cog = Cog()
+    pipeline = MessagePipeline()
+    pipeline.subscribe_cog(cog)
+
+    assert pipeline.matching(facts("{ink}")) == [ cog.braces ]
+    assert pipeline.matching(facts("ink")) == []
+
+    pipeline.unsubscribe_cog(cog)
+    assert pipeline.listeners == []
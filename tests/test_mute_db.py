@@ -0,0 +1,203 @@
+"""Unittests for storing mutes in the mutes database."""
+
+import asyncio
+import datetime
+import logging
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.async_helpers import run_transaction
+from mrfreeze.database.connections import connections
+from mrfreeze.lib import dbfunctions
+from mrfreeze.lib.banish import mute_db
+from mrfreeze.lib.time import parse_timedelta
+
+minute = 60
+logger = logging.getLogger("test")
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def bot(tmp_path):
+    """A bot keeping its mutes database in tmp_path, with an empty mute index."""
+    executor.start()
+    bot = MagicMock()
+    bot.db_prefix = str(tmp_path)
+    bot.db_connect = dbfunctions.db_connect
+    bot.db_create = dbfunctions.db_create
+    bot.db_time = dbfunctions.db_time
+    bot.parse_timedelta = parse_timedelta
+
+    mute_db.mute_index.load([])
+    yield bot
+
+    mute_db.mute_index.load([])
+    executor.shutdown()
+    connections.close_all()
+
+
+def member(user_id, server_id=1):
+    """Create a member of a server."""
+    guild = SimpleNamespace(id=server_id, name=f"server-{server_id}")
+    return SimpleNamespace(id=user_id, guild=guild, name=f"user-{user_id}", discriminator="0001")
+
+
+def in_minutes(minutes):
+    """Get the (local) time the given number of minutes from now."""
+    return datetime.datetime.now() + datetime.timedelta(minutes=minutes)
+
+
+def stored_until(bot, user_id, server_id=1):
+    """Get the end date of a mute as stored in the database."""
+    query = mute_db.db_execute(mute_db.db_path(bot), mute_db.select_until_sql, (user_id, server_id))
+    return query.output[0][0]
+
+
+def test_prolonged_mutes_are_extended(loop, bot):
+    """Prolonging a timed mute should add the new mute's time to the old end date, otherwise it's replaced."""
+    mute_db.create_table(bot, logger)
+    first = mute_db.to_epoch(in_minutes(10))
+
+    async def run():
+        await mute_db.mdb_add(bot, member(1), logger, end_date=in_minutes(10))
+        await mute_db.mdb_add(bot, member(1), logger, end_date=in_minutes(5), voluntary=True)
+        await mute_db.mdb_add(bot, member(2), logger, end_date=in_minutes(10))
+        await mute_db.mdb_add(bot, member(2), logger, end_date=in_minutes(5), prolong=False)
+
+    loop.run_until_complete(run())
+
+    assert stored_until(bot, 1) == pytest.approx(first + 5 * minute, abs=2)
+    assert mute_db.mute_index.get(1, 1).until == stored_until(bot, 1)
+    assert mute_db.mute_index.get(1, 1).voluntary
+    assert stored_until(bot, 2) == pytest.approx(first - 5 * minute, abs=2)
+
+
+def test_prolonged_mutes_stop_at_max_until(loop, bot):
+    """Prolonging a mute should never push its end date past the latest one we can store."""
+    mute_db.create_table(bot, logger)
+    run_transaction(mute_db.db_path(bot), lambda conn: conn.execute(
+        "INSERT INTO mutes VALUES (?, ?, ?, ?)", (1, 1, False, mute_db.max_until - minute)))
+
+    loop.run_until_complete(mute_db.mdb_add(bot, member(1), logger, end_date=in_minutes(60)))
+
+    assert stored_until(bot, 1) == mute_db.max_until
+    assert mute_db.from_epoch(stored_until(bot, 1)) is not None
+
+
+def test_indefinite_mutes_replace_timed_ones(loop, bot):
+    """If either the old or the new mute is indefinite, the new one should replace the old one."""
+    mute_db.create_table(bot, logger)
+    later = mute_db.to_epoch(in_minutes(5))
+
+    async def run():
+        await mute_db.mdb_add(bot, member(1), logger, end_date=in_minutes(10))
+        await mute_db.mdb_add(bot, member(1), logger, end_date=None)
+        await mute_db.mdb_add(bot, member(2), logger, end_date=None)
+        await mute_db.mdb_add(bot, member(2), logger, end_date=in_minutes(5))
+
+    loop.run_until_complete(run())
+
+    assert stored_until(bot, 1) is None
+    assert mute_db.mute_index.get(1, 1).until is None
+    assert stored_until(bot, 2) == pytest.approx(later, abs=2)
+
+
+def test_many_mutes_are_added_at_once(loop, bot):
+    """Adding several members at once should add or prolong every one of their mutes."""
+    mute_db.create_table(bot, logger)
+    first = mute_db.to_epoch(in_minutes(10))
+    members = [ member(1), member(2), member(2, server_id=2) ]
+
+    async def run():
+        await mute_db.mdb_add(bot, member(1), logger, end_date=in_minutes(10))
+        return await mute_db.mdb_add_many(bot, members, logger, end_date=in_minutes(30))
+
+    assert loop.run_until_complete(run())
+
+    assert stored_until(bot, 1) == pytest.approx(first + 30 * minute, abs=2)
+    assert stored_until(bot, 2) == pytest.approx(first + 20 * minute, abs=2)
+    assert stored_until(bot, 2, server_id=2) == stored_until(bot, 2)
+    assert { key: entry.until for key, entry in mute_db.mute_index.mutes.items() } == {
+        (1, 1): stored_until(bot, 1),
+        (1, 2): stored_until(bot, 2),
+        (2, 2): stored_until(bot, 2, server_id=2),
+    }
+    assert loop.run_until_complete(mute_db.mdb_add_many(bot, [], logger))
+
+
+def test_epochs_convert_both_ways():
+    """End dates should survive the round trip, and dates too late to store are cut off at max_until."""
+    date = datetime.datetime(2020, 3, 15, 14, 30, 15)
+    assert mute_db.from_epoch(mute_db.to_epoch(date)) == date
+    assert mute_db.to_epoch(datetime.datetime.max) == mute_db.max_until
+    assert mute_db.from_epoch(mute_db.max_until * 2) == mute_db.from_epoch(mute_db.max_until)
+    assert mute_db.from_epoch(None) is None
+
+
+def test_baseline_tables_are_migrated_once(bot, caplog):
+    """End dates stored as date strings should be converted to epochs, and only the first time."""
+    baseline = """CREATE TABLE mutes (
+        id          integer NOT NULL,
+        server      integer NOT NULL,
+        voluntary   boolean NOT NULL,
+        until       date,
+        CONSTRAINT  server_user PRIMARY KEY (id, server));"""
+    rows = [ (1, 1, False, "2020-01-01 12:00:00"), (2, 1, True, None), (3, 2, False, "2038-06-15 08:30:00") ]
+
+    def create(conn):
+        conn.execute(baseline)
+        conn.executemany("INSERT INTO mutes VALUES (?, ?, ?, ?)", rows)
+
+    run_transaction(mute_db.db_path(bot), create)
+    caplog.set_level(logging.INFO)
+    mute_db.create_table(bot, logger)
+
+    assert "migrated 2 end dates" in caplog.text
+    assert stored_until(bot, 1) == mute_db.to_epoch(datetime.datetime(2020, 1, 1, 12))
+    assert stored_until(bot, 2) is None
+    assert stored_until(bot, 3, server_id=2) == mute_db.to_epoch(datetime.datetime(2038, 6, 15, 8, 30))
+
+    query = mute_db.db_execute(mute_db.db_path(bot), mute_db.select_all_sql, tuple())
+    assert sorted([ (uid, server, bool(voluntary)) for uid, server, voluntary, _ in query.output ]) == [
+        (1, 1, False), (2, 1, True), (3, 2, False) ]
+    assert run_transaction(mute_db.db_path(bot), lambda conn: conn.execute("PRAGMA user_version").fetchone()) == (1,)
+
+    # Anything still in the table after the first migration is left alone.
+    caplog.clear()
+    run_transaction(mute_db.db_path(bot), lambda conn: conn.execute(
+        "UPDATE mutes SET until = ? WHERE id = 1", ("2020-01-01 12:00:00",)))
+    mute_db.migrate_table(bot, logger)
+
+    assert "migrated" not in caplog.text
+    assert stored_until(bot, 1) == "2020-01-01 12:00:00"
+
+
+def test_due_mutes_are_fetched_by_range(loop, bot):
+    """Only timed mutes which have ended should be due, optionally in a single server."""
+    mute_db.create_table(bot, logger)
+    now = 1577880000
+    rows = [
+        (1, 1, False, now - minute),
+        (2, 1, False, now),
+        (3, 1, False, now + minute),
+        (4, 1, True, None),
+        (5, 2, False, now - minute),
+    ]
+    run_transaction(mute_db.db_path(bot), lambda conn: conn.executemany("INSERT INTO mutes VALUES (?, ?, ?, ?)", rows))
+
+    due = loop.run_until_complete(mute_db.mdb_fetch_due(bot, now))
+    assert sorted([ (entry.server, entry.user, entry.until) for entry in due ]) == [
+        (1, 1, now - minute), (1, 2, now), (2, 5, now - minute) ]
+
+    due = loop.run_until_complete(mute_db.mdb_fetch_due(bot, now, SimpleNamespace(id=2)))
+    assert [ entry.user for entry in due ] == [ 5 ]
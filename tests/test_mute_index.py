@@ -0,0 +1,63 @@
+"""Unittests for the in-memory mute index."""
+
+from mrfreeze.lib.banish.mute_index import MuteEntry
+from mrfreeze.lib.banish.mute_index import MuteIndex
+
+now = 1577880000
+minute = 60
+
+
+def test_get_returns_latest_mute_for_user():
+    """Adding a mute for an already muted user should replace the old mute."""
+    index = MuteIndex()
+    index.add(MuteEntry(server=1, user=2, voluntary=False, until=now))
+    index.add(MuteEntry(server=1, user=2, voluntary=True, until=now + minute))
+
+    entry = index.get(1, 2)
+
+    assert entry.until == now + minute
+    assert entry.voluntary
+    assert len(index) == 1
+
+
+def test_due_returns_only_ended_mutes_and_filters_by_server():
+    """Only mutes which have ended should be due, and they can be filtered by server."""
+    index = MuteIndex()
+    index.load([
+        MuteEntry(server=1, user=1, voluntary=False, until=now - minute),
+        MuteEntry(server=1, user=2, voluntary=False, until=now + minute),
+        MuteEntry(server=2, user=3, voluntary=False, until=now - minute),
+        MuteEntry(server=2, user=4, voluntary=False, until=None),
+    ])
+
+    assert { e.user for e in index.due(now) } == { 1, 3 }
+    assert [ e.user for e in index.due(now, server=2) ] == [ 3 ]
+
+
+def test_due_mutes_stay_due_until_removed():
+    """Due mutes should keep showing up until they're removed from the index."""
+    index = MuteIndex()
+    index.add(MuteEntry(server=1, user=1, voluntary=False, until=now - minute))
+
+    assert len(index.due(now)) == 1
+    assert len(index.due(now)) == 1
+
+    index.remove(1, 1)
+
+    assert index.due(now) == []
+    assert index.server_mutes(1) == []
+
+
+def test_next_expiry_skips_replaced_and_removed_mutes():
+    """Replaced and removed mutes should not count towards the next expiry."""
+    index = MuteIndex()
+    index.add(MuteEntry(server=1, user=1, voluntary=False, until=now))
+    index.add(MuteEntry(server=1, user=2, voluntary=False, until=now + minute))
+    index.add(MuteEntry(server=1, user=1, voluntary=False, until=now + 3 * minute))
+    assert index.next_expiry() == now + minute
+
+    index.remove(1, 2)
+    assert index.next_expiry() == now + 3 * minute
+
+    index.add(MuteEntry(server=1, user=1, voluntary=False, until=None))
+    assert index.next_expiry() is None
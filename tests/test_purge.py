@@ -0,0 +1,221 @@
+"""Unittests for purging large numbers of messages."""
+
+import asyncio
+import datetime
+import re
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+
+from mrfreeze.cogs.moderation import describe_purge
+from mrfreeze.lib import purge as purge_module
+from mrfreeze.lib.purge import BULK_DELETE_AGE
+from mrfreeze.lib.purge import BULK_DELETE_LIMIT
+from mrfreeze.lib.purge import Purge
+from mrfreeze.lib.purge import PurgeFilter
+from mrfreeze.lib.purge import parse_purge_args
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def message(age, author=1, content="spam", pinned=False):
+    """Create a message sent age ago."""
+    sent = datetime.datetime.utcnow() - age
+    return SimpleNamespace(
+        id=discord.utils.time_snowflake(sent),
+        created_at=sent,
+        author=SimpleNamespace(id=author),
+        content=content,
+        pinned=pinned,
+        delete=AsyncMock())
+
+
+class FakeChannel:
+    """A channel streaming its messages newest first, and counting the pages fetched."""
+
+    def __init__(self, messages, page=100):
+        self.messages = sorted(messages, key=lambda message: message.id, reverse=True)
+        self.page = page
+        self.pages = 0
+        self.bulk_deletes = list()
+        self.history_args = None
+
+    def history(self, limit=100, before=None, after=None, oldest_first=None):
+        self.history_args = (limit, before, after, oldest_first)
+        return self.stream(limit, after)
+
+    async def stream(self, limit, after):
+        minimum = discord.utils.time_snowflake(after) if after is not None else 0
+        for i, msg in enumerate(self.messages):
+            if (limit is not None and i >= limit) or msg.id <= minimum:
+                return
+            if i % self.page == 0:
+                self.pages += 1
+                await asyncio.sleep(0)
+            yield msg
+
+    async def delete_messages(self, messages):
+        assert len(messages) <= BULK_DELETE_LIMIT
+        self.bulk_deletes.append(len(messages))
+
+
+def test_parse_purge_args():
+    """Counts, time windows in either form, regexes and authors should all be picked up."""
+    purge_filter = parse_purge_args([ "500", "/free (nitro|robux)/", "2", "hours" ], [ 7 ])
+    assert purge_filter.limit == 500
+    assert purge_filter.authors == { 7 }
+    assert purge_filter.pattern.search("FREE NITRO here")
+
+    window = datetime.datetime.utcnow() - purge_filter.after
+    assert window == pytest.approx(datetime.timedelta(hours=2), abs=datetime.timedelta(seconds=5))
+
+    window = datetime.datetime.utcnow() - parse_purge_args([ "30m" ]).after
+    assert window == pytest.approx(datetime.timedelta(minutes=30), abs=datetime.timedelta(seconds=5))
+
+    assert parse_purge_args([ "-5" ]).limit == -5
+    assert parse_purge_args([ "<@7>" ]) == PurgeFilter()
+    with pytest.raises(re.error):
+        parse_purge_args([ "/(unclosed/" ])
+
+
+def test_filter_matches():
+    """Pinned messages are never deleted, and authors and patterns have to match."""
+    purge_filter = PurgeFilter(authors=frozenset([ 1 ]), pattern=re.compile("spam"))
+    age = datetime.timedelta(minutes=1)
+
+    assert purge_filter.matches(message(age))
+    assert not purge_filter.matches(message(age, pinned=True))
+    assert not purge_filter.matches(message(age, author=2))
+    assert not purge_filter.matches(message(age, content="ham"))
+
+
+def test_large_purge_is_deleted_in_chunks(loop):
+    """Thousands of messages should be streamed and deleted 100 at a time."""
+    messages = [ message(datetime.timedelta(seconds=i)) for i in range(2500) ]
+    channel = FakeChannel(messages)
+
+    progress = loop.run_until_complete(Purge(channel, PurgeFilter(limit=2050)).run())
+
+    assert channel.bulk_deletes == [ 100 ] * 20 + [ 50 ]
+    assert channel.pages == 21
+    assert channel.history_args[3] is False
+    assert progress.scanned == 2050 and progress.deleted == 2050
+    assert progress.done and not progress.cancelled
+
+
+def test_old_messages_are_deleted_one_by_one(loop):
+    """Messages older than two weeks can't be bulk deleted, they should be deleted individually."""
+    recent = [ message(datetime.timedelta(days=1, seconds=i)) for i in range(150) ]
+    old = [ message(datetime.timedelta(days=20, seconds=i)) for i in range(5) ]
+    others = [ message(datetime.timedelta(days=21, seconds=i), author=2) for i in range(5) ]
+    channel = FakeChannel(recent + old + others)
+
+    progress = loop.run_until_complete(Purge(channel, PurgeFilter(authors=frozenset([ 1 ]))).run())
+
+    assert channel.bulk_deletes == [ 100, 50 ]
+    assert all(msg.delete.await_count == 1 for msg in old)
+    assert not any(msg.delete.await_count for msg in recent + others)
+    assert progress.scanned == 160
+    assert progress.deleted == 155 and progress.old_deleted == 5 and progress.old_waiting == 0
+
+
+def test_messages_getting_too_old_are_deleted_one_by_one(loop, monkeypatch):
+    """Messages which become too old for bulk deletes while the purge is running should be deleted individually."""
+    recent = [ message(datetime.timedelta(days=1, seconds=i)) for i in range(50) ]
+    ageing = [ message(datetime.timedelta(days=13, hours=23, minutes=50, seconds=i)) for i in range(100) ]
+    channel = FakeChannel(recent + ageing)
+    history = channel.history
+    clock = [ datetime.datetime.utcnow() ]
+
+    async def slow_history(**kwargs):
+        # Every message takes a minute to look through.
+        async for msg in history(**kwargs):
+            yield msg
+            clock[0] += datetime.timedelta(minutes=1)
+
+    channel.history = slow_history
+    monkeypatch.setattr(purge_module, "oldest_bulk", lambda: discord.utils.time_snowflake(clock[0] - BULK_DELETE_AGE))
+    progress = loop.run_until_complete(Purge(channel, PurgeFilter()).run())
+
+    # The first 100 were young enough when collected, but half of them weren't by the time they were sent.
+    assert channel.bulk_deletes == [ 50 ]
+    assert all(msg.delete.await_count == 1 for msg in ageing)
+    assert progress.deleted == 150 and progress.old_deleted == 100 and progress.failed == 0
+
+
+def test_time_window(loop):
+    """Only messages inside the time window should be looked through."""
+    messages = [ message(datetime.timedelta(minutes=i)) for i in range(120) ]
+    channel = FakeChannel(messages)
+    after = datetime.datetime.utcnow() - datetime.timedelta(minutes=30, seconds=30)
+
+    progress = loop.run_until_complete(Purge(channel, PurgeFilter(after=after)).run())
+    assert progress.scanned == 31
+    assert channel.bulk_deletes == [ 31 ]
+
+
+def test_purge_can_be_cancelled(loop):
+    """A cancelled purge should stop after the request in progress."""
+    messages = [ message(datetime.timedelta(seconds=i)) for i in range(1000) ]
+    channel = FakeChannel(messages)
+    purge = Purge(channel, PurgeFilter(limit=1000))
+
+    async def delete_messages(batch):
+        channel.bulk_deletes.append(len(batch))
+        purge.cancel()
+
+    channel.delete_messages = delete_messages
+    progress = loop.run_until_complete(purge.run())
+
+    assert channel.bulk_deletes == [ 100 ]
+    assert progress.cancelled and progress.deleted == 100
+    assert progress.scanned == 100
+    assert describe_purge(progress).startswith("`Purge cancelled: deleted 100")
+
+
+def test_cancelled_purges_leave_old_messages_behind(loop):
+    """Old messages still waiting when the purge is cancelled won't be deleted, so they aren't still to go."""
+    old = [ message(datetime.timedelta(days=20, seconds=i)) for i in range(5) ]
+    channel = FakeChannel(old)
+    purge = Purge(channel, PurgeFilter())
+
+    async def delete():
+        purge.cancel()
+
+    for msg in old:
+        msg.delete.side_effect = delete
+    progress = loop.run_until_complete(purge.run())
+
+    assert progress.cancelled and progress.old_deleted == 1 and progress.old_waiting == 4
+    assert "4 older than two weeks left behind" in describe_purge(progress)
+    assert "still to go" not in describe_purge(progress)
+
+
+def test_failed_deletes_are_counted(loop):
+    """Failed bulk deletes should be counted and skipped, but missing privileges should stop the purge."""
+    messages = [ message(datetime.timedelta(seconds=i)) for i in range(150) ]
+    channel = FakeChannel(messages)
+    response = MagicMock(status=500, reason="error")
+    channel.delete_messages = AsyncMock(side_effect=[ discord.HTTPException(response, "error"), None ])
+
+    progress = loop.run_until_complete(Purge(channel, PurgeFilter()).run())
+    assert progress.failed == 100 and progress.deleted == 50
+
+    response = MagicMock(status=403, reason="forbidden")
+    channel.delete_messages = AsyncMock(side_effect=discord.Forbidden(response, "forbidden"))
+    purge = Purge(channel, PurgeFilter())
+    with pytest.raises(discord.Forbidden):
+        loop.run_until_complete(purge.run())
+
+    progress = purge.progress()
+    assert progress.done and progress.error == "Forbidden"
+    assert describe_purge(progress).startswith("`Purge failed: deleted 0")
@@ -0,0 +1,65 @@
+"""Unittests for resolving what users type into regions."""
+
+from mrfreeze.lib.region import ANTARCTICA
+from mrfreeze.lib.region import resolver
+
+
+def region(text):
+    """Get the name of the region resolved from text, or None."""
+    match = resolver.resolve(text)
+    return None if match is None else match.region
+
+
+def test_aliases_resolve_to_their_regions():
+    """Every alias should be found, in any case and surrounded by other words."""
+    assert region("europe") == "Europe"
+    assert region("I live in the United Kingdom") == "Europe"
+    assert region("USA") == "North America"
+    assert region("new zealand!") == "Oceania"
+    assert region("middle-east") == "Middle East"
+    assert region("narnia") is None
+
+
+def test_only_whole_words_match():
+    """Short aliases shouldn't match inside other words, like they used to."""
+    assert region("australia") == "Oceania"
+    assert region("russia") == "Europe"
+    assert region("argentina") == "South America"
+    assert region("china") == "Asia"
+
+
+def test_longest_alias_wins():
+    """The most specific alias should be preferred."""
+    assert region("south america") == "South America"
+    assert region("north america") == "North America"
+
+
+def test_typos_are_tolerated():
+    """Longer aliases should match with a typo or two, short ones shouldn't."""
+    assert region("eurpoe") == "Europe"
+    assert region("austrlia") == "Oceania"
+    assert region("nort america") == "North America"
+    assert region("i'm from swedn") == "Europe"
+    assert region("ua") is None
+
+
+def test_antarctica_takes_priority():
+    """Any spelling of Antarctica should win over other regions, and report how it was spelled."""
+    match = resolver.resolve("europe or antarctica")
+    assert match.region == ANTARCTICA
+    assert match.text == "antarctica"
+
+    assert resolver.resolve("antartica").text == "antartica"
+    assert resolver.resolve("antarcticaa").region == ANTARCTICA
+    assert resolver.resolve("antarcticaa").text == "antarcticaa"
+
+
+def test_misspelt_antarctica_beats_other_regions():
+    """A misspelt Antarctica should still win over other regions spelled correctly."""
+    match = resolver.resolve("europe or antarcticaa")
+    assert match.region == ANTARCTICA
+    assert match.text == "antarcticaa"
+
+    assert region("from sweden, going to antartica") == ANTARCTICA
+    assert region("europe or eurpoe") == "Europe"
+    assert resolver.resolve("europe or eurpoe").distance == 0
@@ -0,0 +1,197 @@
+"""Unittests for the scheduler unbanishing everyone whose time is up."""
+
+import asyncio
+import datetime
+import logging
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+
+from mrfreeze.database.async_helpers import executor
+from mrfreeze.database.connections import connections
+from mrfreeze.lib import dbfunctions
+from mrfreeze.lib.banish import mute_db
+from mrfreeze.lib.banish.mute_index import MuteEntry
+from mrfreeze.lib.banish.unbanish_loop import UnbanishScheduler
+from mrfreeze.lib.time import parse_timedelta
+
+minute = 60
+logger = logging.getLogger("test")
+
+
+@pytest.fixture
+def loop():
+    """Create a loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def bot(tmp_path):
+    """A bot keeping its mutes database in tmp_path, with an empty mute index."""
+    executor.start()
+    bot = MagicMock()
+    bot.db_prefix = str(tmp_path)
+    bot.db_connect = dbfunctions.db_connect
+    bot.db_create = dbfunctions.db_create
+    bot.db_time = dbfunctions.db_time
+    bot.parse_timedelta = parse_timedelta
+    bot.wait_until_ready = AsyncMock()
+    bot.is_closed = MagicMock(return_value=False)
+    bot.get_mute_role = AsyncMock(return_value="antarctica")
+    bot.get_mute_channel = AsyncMock(return_value=MagicMock(send=AsyncMock()))
+    bot.settings.get_mute_interval = MagicMock(return_value=None)
+    bot.get_guild = MagicMock(return_value=None)
+
+    mute_db.create_table(bot, logger)
+    mute_db.mute_index.load([])
+    yield bot
+
+    mute_db.mute_index.load([])
+    mute_db.mute_index.listeners.clear()
+    executor.shutdown()
+    connections.close_all()
+
+
+def scheduler(bot, interval=5 * minute):
+    """Create an unbanish scheduler retrying every interval seconds."""
+    return UnbanishScheduler(SimpleNamespace(bot=bot, logger=logger, default_mute_interval=interval))
+
+
+def server(server_id):
+    """Create a server whose members have to be fetched."""
+    return SimpleNamespace(
+        id=server_id,
+        name=f"server-{server_id}",
+        get_member=lambda user_id: None,
+        fetch_member=AsyncMock())
+
+
+def member(guild, user_id):
+    """Create a member of a server, in Antarctica."""
+    return SimpleNamespace(
+        id=user_id,
+        guild=guild,
+        name=f"user-{user_id}",
+        discriminator="0001",
+        mention=f"@user-{user_id}",
+        roles=[ "antarctica" ],
+        remove_roles=AsyncMock())
+
+
+def error(exception, status):
+    """Create a discord HTTP exception with the given status."""
+    return exception(MagicMock(status=status, reason="error"), "error")
+
+
+def mutes_in_db(bot):
+    """Get the (server, user) of every mute in the database."""
+    query = mute_db.db_execute(mute_db.db_path(bot), mute_db.select_all_sql, tuple())
+    return { (server, user) for user, server, _, _ in query.output }
+
+
+def test_sleep_time(bot):
+    """The scheduler should sleep until the first mute ends, shorter if a server's mute interval is shorter."""
+    now = time.time()
+    unbanish = scheduler(bot)
+    assert unbanish.sleep_time(now) is None
+
+    mute_db.mute_index.load([
+        MuteEntry(server=1, user=1, voluntary=False, until=int(now) + 10 * minute),
+        MuteEntry(server=1, user=2, voluntary=False, until=None),
+    ])
+    assert unbanish.sleep_time(now) == pytest.approx(10 * minute, abs=1)
+
+    bot.get_guild.return_value = server(1)
+    bot.settings.get_mute_interval.return_value = 2 * minute
+    assert unbanish.sleep_time(now) == 2 * minute
+
+    # Overdue mutes are retried every default_mute_interval seconds.
+    bot.settings.get_mute_interval.return_value = None
+    mute_db.mute_index.add(MuteEntry(server=1, user=3, voluntary=False, until=int(now) - minute))
+    assert unbanish.sleep_time(now) == 5 * minute
+
+
+def test_sooner_mutes_wake_the_scheduler(bot):
+    """Only timed mutes ending before the next planned run should wake the scheduler up."""
+    unbanish = scheduler(bot)
+    unbanish.wakeup = asyncio.Event()
+    unbanish.next_run = time.time() + 10 * minute
+
+    mute_db.mute_index.add(MuteEntry(server=1, user=1, voluntary=False, until=None))
+    mute_db.mute_index.add(MuteEntry(server=1, user=2, voluntary=False, until=int(time.time()) + 20 * minute))
+    assert not unbanish.wakeup.is_set()
+
+    mute_db.mute_index.add(MuteEntry(server=1, user=3, voluntary=False, until=int(time.time()) + minute))
+    assert unbanish.wakeup.is_set()
+
+
+def test_added_mutes_are_unbanished_once_due(loop, bot):
+    """A sleeping scheduler should be woken up by a mute that's already due, and unbanish it."""
+    guild = server(1)
+    muted = member(guild, 1)
+    guild.fetch_member.return_value = muted
+    bot.get_guild.return_value = guild
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(scheduler(bot).run())
+        await asyncio.sleep(0.1)
+        await mute_db.mdb_add(bot, muted, logger, end_date=datetime.datetime.now() - datetime.timedelta(minutes=1))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.wait([ task ])
+
+    loop.run_until_complete(run())
+
+    muted.remove_roles.assert_awaited_once_with("antarctica")
+    assert mutes_in_db(bot) == set()
+    assert len(mute_db.mute_index) == 0
+
+
+def test_unreachable_mutes_are_dropped(loop, bot):
+    """Mutes in servers the bot has left or of members who have left should be dropped, others retried."""
+    known = server(1)
+    bot.get_guild.side_effect = lambda server_id: known if server_id == 1 else None
+    fetched = member(known, 3)
+    failures = { 1: error(discord.NotFound, 404), 2: error(discord.HTTPException, 500) }
+
+    async def fetch_member(user_id):
+        if user_id in failures:
+            raise failures[user_id]
+        return fetched
+
+    known.fetch_member.side_effect = fetch_member
+    ended = datetime.datetime.now() - datetime.timedelta(minutes=1)
+    unbanish = scheduler(bot)
+
+    async def run():
+        members = [ member(known, 1), member(known, 2), fetched ]
+        await mute_db.mdb_add_many(bot, members, logger, end_date=ended)
+        await mute_db.mdb_add(bot, member(server(2), 4), logger, end_date=ended)
+
+        task = asyncio.get_running_loop().create_task(unbanish.run())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.wait([ task ])
+
+    loop.run_until_complete(run())
+
+    assert mutes_in_db(bot) == { (1, 2) }
+    assert set(mute_db.mute_index.mutes) == { (1, 2) }
+    fetched.remove_roles.assert_awaited_once()
+    assert unbanish.next_run == pytest.approx(time.time() + 5 * minute, abs=1)
+
+
+def test_stopped_schedulers_stop_listening(bot):
+    """A stopped scheduler shouldn't be woken up by new mutes, or kept alive by the mute index."""
+    unbanish = scheduler(bot)
+    other = scheduler(bot)
+    unbanish.stop()
+    unbanish.stop()
+
+    assert mute_db.mute_index.listeners == [ other.mute_added ]